@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LMS.settings')
 
 application = get_asgi_application()
+
+# As in LMS/wsgi.py, load the ML models before the first request. Serving
+# this application also turns on the notification event stream
+# (notification/live.py); under WSGI pages poll the unread count instead.
+from ml.predictions import warmup  # noqa: E402
+
+warmup()
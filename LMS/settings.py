@@ -110,6 +110,40 @@ if DATABASE_URL and dj_database_url:
         conn_health_checks=True,
     )
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Memberships, counters and analytics are cached. Set CACHE_DIR so that all
+# gunicorn workers share one file-based cache; otherwise each process keeps
+# its own in-memory cache, and unread notification counts (which other
+# processes change) are not cached.
+
+CACHE_DIR = os.environ.get('CACHE_DIR')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    } if CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# ML inference server
+#
+# Path of the Unix socket `manage.py run_inference_server` listens on. When
+# set, web workers score through that process instead of loading the models
+# themselves, and fall back to in-process inference while it is down.
+
+ML_INFERENCE_SOCKET = os.environ.get('ML_INFERENCE_SOCKET')
+
+# Notifications
+#
+# Classes with at least this many members store each notification once for
+# the class, merged into members' inboxes when read, instead of one row per
+# member.
+
+NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS = int(os.environ.get('NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS', 200))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
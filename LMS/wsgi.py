@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LMS.settings')
 
 application = get_wsgi_application()
+
+# Load the ML models before the first request. With gunicorn's preload_app
+# (gunicorn.conf.py) this runs once in the master and the forked workers
+# share the memory-mapped model arrays.
+from ml.predictions import warmup  # noqa: E402
+
+warmup()
@@ -1,7 +1,29 @@
 from django.db import models
+from django.db.models import BooleanField, Count, ExpressionWrapper, Prefetch, Q
+from django.utils import timezone
 from classes.models import ClassRoom
 from users.models import CustomUser
 
+class AssignmentQuerySet(models.QuerySet):
+    def for_feed(self, user):
+        """
+        Resolve the per-user status used by assignment listings in a fixed
+        number of queries: one for the assignments (with classroom, author,
+        overdue/owner flags and submission count) and one for the user's own
+        submissions.
+        """
+        return self.select_related('classroom', 'created_by').annotate(
+            is_overdue=ExpressionWrapper(Q(deadline__lt=timezone.now()), output_field=BooleanField()),
+            is_owner=ExpressionWrapper(Q(classroom__owner=user), output_field=BooleanField()),
+            submission_count=Count('submissions', distinct=True),
+        ).prefetch_related(
+            Prefetch(
+                'submissions',
+                queryset=Submission.objects.filter(student=user),
+                to_attr='user_submissions',
+            )
+        )
+
 class Assignment(models.Model):
     classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=255)
@@ -11,9 +33,17 @@ class Assignment(models.Model):
     file = models.FileField(upload_to='assignments/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AssignmentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title} ({self.classroom.name})"
 
+    @property
+    def user_submission(self):
+        """The requesting user's submission, when loaded through ``for_feed``."""
+        submissions = getattr(self, 'user_submissions', None)
+        return submissions[0] if submissions else None
+
 class Submission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, limit_choices_to={'user_type': 'normal'})
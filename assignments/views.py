@@ -8,7 +8,8 @@ import json
 from datetime import datetime, timedelta
 import calendar
 from .models import Assignment, Submission
-from classes.models import ClassRoom, ClassMembership
+from classes.models import ClassRoom
+from classes.scope import classroom_scope
 from notification.models import Notification
 
 @login_required
@@ -16,24 +17,9 @@ def assignment(request):
     """Display all assignments for the user's classes."""
     owned_classes = ClassRoom.objects.filter(owner=request.user)
     
-    joined_memberships = ClassMembership.objects.filter(user=request.user)
-    joined_classes = ClassRoom.objects.filter(id__in=joined_memberships.values_list('classroom_id', flat=True))
-    
-    all_user_classes = (owned_classes | joined_classes).distinct()
-    assignments = Assignment.objects.filter(classroom__in=all_user_classes).order_by('-created_at')
-    
-    for assignment in assignments:
-        assignment.is_overdue = timezone.now() > assignment.deadline
-        assignment.is_owner = assignment.classroom.owner == request.user
-        
-        if not assignment.is_owner:
-            try:
-                assignment.user_submission = Submission.objects.get(
-                    assignment=assignment, 
-                    student=request.user
-                )
-            except Submission.DoesNotExist:
-                assignment.user_submission = None
+    assignments = Assignment.objects.filter(
+        classroom_id__in=classroom_scope(request).classroom_ids
+    ).for_feed(request.user).order_by('-created_at')
     
     context = {
         'assignments': assignments,
@@ -47,28 +33,14 @@ def class_assignments(request, class_id):
     """View assignments for a specific class."""
     classroom = get_object_or_404(ClassRoom, id=class_id)
     
-    is_owner = classroom.owner == request.user
-    is_member = ClassMembership.objects.filter(user=request.user, classroom=classroom).exists()
-    
-    if not (is_owner or is_member):
+    if not classroom_scope(request).has_access(classroom):
         messages.error(request, "You don't have access to this class.")
         return redirect('dashboard')
     
-    assignments = Assignment.objects.filter(classroom=classroom).order_by('-created_at')
-    
-    # Add submission status for each assignment
-    for assignment in assignments:
-        assignment.is_overdue = timezone.now() > assignment.deadline
-        assignment.is_owner = assignment.classroom.owner == request.user
-        
-        if not assignment.is_owner:
-            try:
-                assignment.user_submission = Submission.objects.get(
-                    assignment=assignment, 
-                    student=request.user
-                )
-            except Submission.DoesNotExist:
-                assignment.user_submission = None
+    # Submission status for each assignment is resolved by for_feed
+    assignments = Assignment.objects.filter(
+        classroom=classroom
+    ).for_feed(request.user).order_by('-created_at')
     
     context = {
         'assignments': assignments,
@@ -135,7 +107,7 @@ def create_assignment(request):
                 content_object=assignment
             )
             
-            messages.success(request, f'Assignment "{title}" created successfully! {notifications_sent} students notified.')
+            messages.success(request, f'Assignment "{title}" created successfully! Notifying {notifications_sent} students.')
             
             # Redirect back to class assignments if created from class page
             if class_id:
@@ -159,19 +131,14 @@ def create_assignment(request):
 
 @login_required
 def assignment_detail(request, assignment_id):
-    assignment = get_object_or_404(Assignment, id=assignment_id)
+    assignment = get_object_or_404(Assignment.objects.select_related('classroom'), id=assignment_id)
     
     # Check if user has access to this assignment
-    owned_classes = ClassRoom.objects.filter(owner=request.user)
-    joined_memberships = ClassMembership.objects.filter(user=request.user)
-    joined_classes = ClassRoom.objects.filter(id__in=joined_memberships.values_list('classroom_id', flat=True))
-    all_user_classes = (owned_classes | joined_classes).distinct()
-    
-    if assignment.classroom not in all_user_classes:
+    if not classroom_scope(request).has_access(assignment.classroom_id):
         messages.error(request, 'You do not have access to this assignment.')
         return redirect('assignment')
     
-    is_owner = assignment.classroom.owner == request.user
+    is_owner = assignment.classroom.owner_id == request.user.id
     user_submission = None
     is_overdue = timezone.now() > assignment.deadline
     
@@ -230,10 +197,7 @@ def assignment_detail(request, assignment_id):
 def assignment_calendar(request):
     """Calendar view showing assignment deadlines and submission dates"""
     # Get user's classes
-    owned_classes = ClassRoom.objects.filter(owner=request.user)
-    joined_memberships = ClassMembership.objects.filter(user=request.user)
-    joined_classes = ClassRoom.objects.filter(id__in=joined_memberships.values_list('classroom_id', flat=True))
-    all_user_classes = (owned_classes | joined_classes).distinct()
+    user_class_ids = classroom_scope(request).classroom_ids
     
     # Get current month and year from request, default to current date
     today = timezone.now().date()
@@ -242,18 +206,18 @@ def assignment_calendar(request):
     
     # Get assignments for the specified month
     assignments = Assignment.objects.filter(
-        classroom__in=all_user_classes,
+        classroom_id__in=user_class_ids,
         deadline__year=year,
         deadline__month=month
-    ).order_by('deadline')
+    ).select_related('classroom').order_by('deadline')
     
     # Get submissions for the user in the specified month
     submissions = Submission.objects.filter(
         student=request.user,
-        assignment__classroom__in=all_user_classes,
+        assignment__classroom_id__in=user_class_ids,
         submitted_at__year=year,
         submitted_at__month=month
-    ).order_by('submitted_at')
+    ).select_related('assignment__classroom').order_by('submitted_at')
     
     # Create calendar events
     events = []
@@ -0,0 +1,88 @@
+"""Resolve which classrooms a user can see, and in which role."""
+from django.core.cache import cache
+from .models import ClassRoom, ClassMembership
+
+SCOPE_CACHE_TIMEOUT = 60 * 10
+ROLE_PRECEDENCE = [role for role, _ in ClassMembership.ROLE_CHOICES]
+
+
+def _cache_key(user_id):
+    return f'classes:scope:{user_id}'
+
+
+class ClassroomScope:
+    """Classroom ids a user belongs to, mapped to their role in each."""
+
+    def __init__(self, roles):
+        self.roles = roles
+        self.classroom_ids = frozenset(roles)
+
+    def __contains__(self, classroom):
+        return self.has_access(classroom)
+
+    def __len__(self):
+        return len(self.roles)
+
+    def role_for(self, classroom):
+        return self.roles.get(getattr(classroom, 'pk', classroom))
+
+    def has_access(self, classroom):
+        return getattr(classroom, 'pk', classroom) in self.classroom_ids
+
+    def is_owner(self, classroom):
+        return self.role_for(classroom) == 'owner'
+
+    def is_staff_of(self, classroom):
+        """Owners and sub-owners both manage the class."""
+        return self.role_for(classroom) in ('owner', 'sub_owner')
+
+    def ids_with_role(self, *roles):
+        return [classroom_id for classroom_id, role in self.roles.items() if role in roles]
+
+    def classrooms(self):
+        return ClassRoom.objects.filter(id__in=self.classroom_ids)
+
+
+def _resolve_roles(user_id):
+    """Build the classroom id -> role map for a user in two queries."""
+    roles = {}
+
+    def grant(classroom_id, role):
+        current = roles.get(classroom_id)
+        if current is None or ROLE_PRECEDENCE.index(role) < ROLE_PRECEDENCE.index(current):
+            roles[classroom_id] = role
+
+    memberships = ClassMembership.objects.filter(user_id=user_id).values_list('classroom_id', 'role')
+    for classroom_id, role in memberships:
+        grant(classroom_id, role)
+
+    for classroom_id in ClassRoom.objects.filter(owner_id=user_id).values_list('id', flat=True):
+        grant(classroom_id, 'owner')
+
+    return roles
+
+
+def get_classroom_scope(user):
+    """Return the cached ClassroomScope for a user."""
+    if not user.is_authenticated:
+        return ClassroomScope({})
+
+    key = _cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = _resolve_roles(user.pk)
+        cache.set(key, roles, SCOPE_CACHE_TIMEOUT)
+    return ClassroomScope(roles)
+
+
+def classroom_scope(request):
+    """Return the ClassroomScope for the requesting user, resolved once per request."""
+    scope = getattr(request, '_classroom_scope', None)
+    if scope is None:
+        scope = get_classroom_scope(request.user)
+        request._classroom_scope = scope
+    return scope
+
+
+def invalidate_classroom_scope(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids if user_id])
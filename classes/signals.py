@@ -0,0 +1,39 @@
+"""Keep cached classroom scopes in step with membership changes."""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import ClassRoom, ClassMembership
+from .scope import invalidate_classroom_scope
+
+
+@receiver(post_save, sender=ClassMembership)
+@receiver(post_delete, sender=ClassMembership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_classroom_scope(instance.user_id)
+
+
+@receiver(pre_save, sender=ClassRoom)
+def remember_classroom_owner(sender, instance, **kwargs):
+    """Record the previous owner so a handover invalidates both sides."""
+    instance._previous_owner_id = None
+    if instance.pk:
+        instance._previous_owner_id = (
+            ClassRoom.objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+@receiver(pre_delete, sender=ClassRoom)
+def remember_classroom_members(sender, instance, **kwargs):
+    """Record the members before the cascade removes their memberships."""
+    instance._member_ids = list(
+        ClassMembership.objects.filter(classroom=instance).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ClassRoom)
+@receiver(post_delete, sender=ClassRoom)
+def classroom_changed(sender, instance, **kwargs):
+    invalidate_classroom_scope(
+        instance.owner_id,
+        getattr(instance, '_previous_owner_id', None),
+        *getattr(instance, '_member_ids', ()),
+    )
@@ -1,3 +1,68 @@
+from django.core.cache import cache
 from django.test import TestCase
+from users.models import CustomUser
+from .models import ClassMembership, ClassRoom
+from .scope import get_classroom_scope
 
-# Create your tests here.
+
+class ClassroomScopeTests(TestCase):
+    """The cached scope is dropped whenever the classrooms a user can see change."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+
+    def scope(self, user):
+        # Resolve twice so the second call is served from the cache.
+        get_classroom_scope(user)
+        return get_classroom_scope(user)
+
+    def test_owner_sees_own_classroom(self):
+        scope = self.scope(self.teacher)
+        self.assertTrue(scope.is_owner(self.classroom))
+        self.assertFalse(self.scope(self.student).has_access(self.classroom))
+
+    def test_scope_is_served_from_cache(self):
+        self.scope(self.student)
+        with self.assertNumQueries(0):
+            get_classroom_scope(self.student)
+
+    def test_join_and_leave_invalidate(self):
+        self.assertNotIn(self.classroom, self.scope(self.student))
+        membership = ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        self.assertEqual(self.scope(self.student).role_for(self.classroom), 'participant')
+        membership.delete()
+        self.assertNotIn(self.classroom, self.scope(self.student))
+
+    def test_create_invalidates_owner(self):
+        self.scope(self.teacher)
+        other = ClassRoom.objects.create(name='Physics', owner=self.teacher, invite_code='physics')
+        self.assertTrue(self.scope(self.teacher).is_owner(other))
+
+    def test_owner_handover_invalidates_both_sides(self):
+        self.scope(self.teacher)
+        self.scope(self.student)
+        self.classroom.owner = self.student
+        self.classroom.save()
+        self.assertNotIn(self.classroom, self.scope(self.teacher))
+        self.assertTrue(self.scope(self.student).is_owner(self.classroom))
+
+    def test_delete_invalidates_members(self):
+        ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        self.assertIn(self.classroom, self.scope(self.student))
+        self.assertIn(self.classroom, self.scope(self.teacher))
+        classroom_id = self.classroom.id
+        self.classroom.delete()
+        self.assertNotIn(classroom_id, self.scope(self.student))
+        self.assertNotIn(classroom_id, self.scope(self.teacher))
+
+    def test_sub_owner_role_comes_from_membership(self):
+        self.classroom.sub_owner = self.student
+        self.classroom.save()
+        self.assertNotIn(self.classroom, self.scope(self.student))
+        ClassMembership.objects.create(user=self.student, classroom=self.classroom, role='sub_owner')
+        scope = self.scope(self.student)
+        self.assertTrue(scope.is_staff_of(self.classroom))
+        self.assertFalse(scope.is_owner(self.classroom))
@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from .models import ClassRoom, ClassMembership
+from .scope import classroom_scope
 from django.contrib.auth.decorators import login_required
 import uuid
 
@@ -30,7 +31,7 @@ def join_class(request):
         invite_code = request.POST.get('invite_code')
         try:
             classroom = ClassRoom.objects.get(invite_code=invite_code)
-            if classroom.owner == request.user or ClassMembership.objects.filter(user=request.user, classroom=classroom).exists():
+            if classroom_scope(request).has_access(classroom):
                 messages.info(request, "You are already a member of this class.")
             else:
                 ClassMembership.objects.create(user=request.user, classroom=classroom)
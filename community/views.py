@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.contrib import messages
 from .models import Post
 from classes.models import ClassRoom
 from django.contrib.auth.decorators import login_required
@@ -19,7 +20,7 @@ def post_announcement(request, class_id):
         notification_title = f"New Announcement in {classroom.name}"
         notification_message = f"A new announcement has been posted: {content[:100]}{'...' if len(content) > 100 else ''}"
         
-        Notification.create_notifications_for_class(
+        notifications_sent = Notification.create_notifications_for_class(
             classroom=classroom,
             sender=request.user,
             notification_type='announcement',
@@ -28,6 +29,8 @@ def post_announcement(request, class_id):
             content_object=post
         )
         
+        messages.success(request, f'Announcement posted successfully! Notifying {notifications_sent} students.')
+        
         return redirect('class_detail', class_id=class_id)
     return redirect('class_detail', class_id=class_id)
 
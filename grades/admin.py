@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Grade
+from .models import Grade, GradeStatistics
 
 @admin.register(Grade)
 class GradeAdmin(admin.ModelAdmin):
@@ -35,3 +35,10 @@ class GradeAdmin(admin.ModelAdmin):
         if not change:  # New grade
             obj.marked_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(GradeStatistics)
+class GradeStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('classroom', 'assignment', 'count', 'passed_count', 'average', 'updated_at')
+    list_filter = ('classroom',)
+    readonly_fields = ('count', 'passed_count', 'percentage_sum', 'percentage_sum_sq', 'letter_counts', 'updated_at')
@@ -0,0 +1,130 @@
+"""Batch grade writes: JSON batches from the grading page and CSV imports."""
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from classes.models import ClassMembership
+from ml.feature_store import schedule_snapshot_refresh
+from .models import Grade
+from . import stats
+
+IMPORT_CHUNK_SIZE = 500
+TOTAL_MARKS = Decimal(100)
+
+
+def _parse_marks(value):
+    try:
+        marks = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('Invalid marks value')
+    if not marks.is_finite() or marks < 0 or marks > TOTAL_MARKS:
+        raise ValueError('Marks must be between 0 and 100')
+    return marks.quantize(Decimal('0.01'))
+
+
+def _participants(classroom):
+    """Map both student id and username to the student id for class participants."""
+    lookup = {}
+    members = ClassMembership.objects.filter(
+        classroom=classroom, role='participant'
+    ).values_list('user_id', 'user__username')
+    for user_id, username in members:
+        lookup[str(user_id)] = user_id
+        lookup[username] = user_id
+    return lookup
+
+
+def upsert_grades(classroom, assignment, rows, marked_by, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create or update grades for one assignment from ``(row_number, student, marks)``
+    tuples, where ``student`` is a student id or username and ``marks`` is a
+    percentage.
+
+    Every row is validated; invalid rows are reported and skipped without
+    aborting the rest. Valid rows are written with bulk_create/bulk_update
+    in a single transaction, ``chunk_size`` rows at a time.
+    """
+    participants = _participants(classroom)
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    seen = set()
+    rows = iter(rows)
+
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            valid = {}
+            for row_number, student, marks in chunk:
+                student_id = participants.get(str(student).strip())
+                if student_id is None:
+                    result['errors'].append({'row': row_number, 'student': student, 'error': 'Student is not a participant of this class'})
+                    continue
+                if student_id in seen:
+                    result['errors'].append({'row': row_number, 'student': student, 'error': 'Duplicate row for this student'})
+                    continue
+                try:
+                    valid[student_id] = _parse_marks(marks)
+                except ValueError as e:
+                    result['errors'].append({'row': row_number, 'student': student, 'error': str(e)})
+                    continue
+                seen.add(student_id)
+
+            existing = {
+                grade.student_id: grade
+                for grade in Grade.objects.filter(
+                    classroom=classroom, assignment=assignment, student_id__in=valid
+                )
+            }
+            now = timezone.now()
+            to_create, to_update, replaced = [], [], []
+            for student_id, marks in valid.items():
+                grade = existing.get(student_id)
+                if grade is None:
+                    grade = Grade(classroom=classroom, assignment=assignment, student_id=student_id)
+                    to_create.append(grade)
+                else:
+                    to_update.append(grade)
+                    replaced.append(stats.loaded_contribution(grade))
+                grade.marks_obtained = marks
+                grade.total_marks = TOTAL_MARKS
+                grade.marked_by = marked_by
+                grade.updated_at = now
+                grade.calculate_grade()
+
+            Grade.objects.bulk_create(to_create)
+            Grade.objects.bulk_update(
+                to_update,
+                ['marks_obtained', 'total_marks', 'marked_by', 'grade', 'is_passed', 'updated_at'],
+            )
+            # Bulk writes skip the Grade signals, so fold them into the statistics here
+            stats.apply_changes(
+                removed=replaced,
+                added=[stats.contribution(grade) for grade in to_create + to_update],
+            )
+            stats.invalidate_student_statistics(*valid)
+            schedule_snapshot_refresh(classroom.id, valid)
+            result['created'] += len(to_create)
+            result['updated'] += len(to_update)
+
+    return result
+
+
+def read_grade_csv(lines):
+    """
+    Stream ``(row_number, student, marks)`` tuples from CSV text lines with a
+    ``student`` column (id or username) and a ``marks`` (or ``percentage``)
+    column. Rows with missing columns are yielded with blank values so that
+    they are reported as errors rather than dropped.
+    """
+    reader = csv.DictReader(lines)
+    fields = [field.strip().lower() for field in reader.fieldnames or []]
+    if 'student' not in fields or not {'marks', 'percentage'} & set(fields):
+        raise ValueError("CSV must have a 'student' column and a 'marks' column")
+    reader.fieldnames = fields
+    marks_field = 'marks' if 'marks' in fields else 'percentage'
+
+    for row in reader:
+        yield reader.line_num, row.get('student') or '', row.get(marks_field) or ''
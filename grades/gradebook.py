@@ -0,0 +1,133 @@
+"""Class gradebook: every participant against every assignment."""
+import numpy as np
+from django.core.paginator import Paginator
+from classes.models import ClassMembership
+from assignments.models import Assignment, Submission
+from .models import Grade, letter_grade
+
+
+def _masked_mean(values, mask, axis):
+    """Mean of ``values`` where ``mask`` is set, NaN where nothing is set."""
+    counts = mask.sum(axis=axis)
+    sums = np.where(mask, values, 0.0).sum(axis=axis)
+    means = np.full(counts.shape, np.nan)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    return means, counts
+
+
+def _display(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+class Gradebook:
+    """
+    Dense students x assignments matrix of grade percentages for a classroom.
+
+    The matrix is loaded in four queries (participants, assignments, grades,
+    submissions) whatever the class size. Ungraded cells hold NaN.
+    """
+
+    def __init__(self, classroom):
+        self.classroom = classroom
+        memberships = ClassMembership.objects.filter(
+            classroom=classroom, role='participant'
+        ).select_related('user').order_by('user__username')
+        self.students = [membership.user for membership in memberships]
+        self.assignments = list(Assignment.objects.filter(classroom=classroom).order_by('created_at'))
+
+        row_of = {student.id: i for i, student in enumerate(self.students)}
+        col_of = {assignment.id: j for j, assignment in enumerate(self.assignments)}
+        shape = (len(self.students), len(self.assignments))
+
+        self.percentages = np.full(shape, np.nan)
+        grade_rows = Grade.objects.filter(
+            classroom=classroom, assignment__isnull=False
+        ).values_list('student_id', 'assignment_id', 'marks_obtained', 'total_marks', 'grade', 'is_passed')
+        cells = []
+        # Letters and pass flags as stored on the grades (computed in Decimal),
+        # so cells agree with Grade at edges the float percentage would cross
+        self.letters = {}
+        self.passed = np.zeros(shape, dtype=bool)
+        for student_id, assignment_id, marks, total, grade, is_passed in grade_rows:
+            if student_id in row_of and assignment_id in col_of:
+                i, j = row_of[student_id], col_of[assignment_id]
+                percentage = float(marks) / float(total) * 100
+                cells.append((i, j, percentage))
+                self.letters[i, j] = grade or letter_grade(percentage)
+                self.passed[i, j] = is_passed
+        if cells:
+            rows, cols, values = np.array(cells).T
+            self.percentages[rows.astype(int), cols.astype(int)] = values
+
+        self.submitted = np.zeros(shape, dtype=bool)
+        submission_rows = Submission.objects.filter(
+            assignment__classroom=classroom
+        ).values_list('student_id', 'assignment_id')
+        cells = [
+            (row_of[student_id], col_of[assignment_id])
+            for student_id, assignment_id in submission_rows
+            if student_id in row_of and assignment_id in col_of
+        ]
+        if cells:
+            rows, cols = np.array(cells).T
+            self.submitted[rows, cols] = True
+
+        self.graded = ~np.isnan(self.percentages)
+        self.student_averages, self.student_graded = _masked_mean(self.percentages, self.graded, axis=1)
+        self.assignment_averages, self.assignment_graded = _masked_mean(self.percentages, self.graded, axis=0)
+
+    @property
+    def class_average(self):
+        if not self.graded.any():
+            return None
+        return round(float(self.percentages[self.graded].mean()), 2)
+
+    def assignment_summaries(self):
+        """Per-column aggregates over the whole class."""
+        lowest = np.where(self.graded, self.percentages, np.inf).min(axis=0, initial=np.inf)
+        highest = np.where(self.graded, self.percentages, -np.inf).max(axis=0, initial=-np.inf)
+        submissions = self.submitted.sum(axis=0)
+        passes = self.passed.sum(axis=0)
+
+        summaries = []
+        for j, assignment in enumerate(self.assignments):
+            graded = int(self.assignment_graded[j])
+            summaries.append({
+                'assignment': assignment,
+                'average': _display(self.assignment_averages[j]),
+                'lowest': round(float(lowest[j]), 2) if graded else None,
+                'highest': round(float(highest[j]), 2) if graded else None,
+                'graded': graded,
+                'submissions': int(submissions[j]),
+                'pass_rate': round(float(passes[j]) / graded * 100, 1) if graded else None,
+            })
+        return summaries
+
+    def rows(self, indices):
+        """Render the given student rows with their cells and per-row aggregates."""
+        submitted_counts = self.submitted.sum(axis=1)
+        rows = []
+        for i in indices:
+            average = _display(self.student_averages[i])
+            cells = []
+            for j in range(len(self.assignments)):
+                cells.append({
+                    'percentage': _display(self.percentages[i, j]),
+                    'letter': self.letters.get((i, j)),
+                    'submitted': bool(self.submitted[i, j]),
+                })
+            rows.append({
+                'student': self.students[i],
+                'cells': cells,
+                'average': average,
+                'letter': letter_grade(float(self.student_averages[i])) if average is not None else None,
+                'graded': int(self.student_graded[i]),
+                'submitted': int(submitted_counts[i]),
+            })
+        return rows
+
+    def page(self, number, per_page=50):
+        """Paginate students; the page's object_list holds rendered rows."""
+        page = Paginator(range(len(self.students)), per_page).get_page(number)
+        page.object_list = self.rows(page.object_list)
+        return page
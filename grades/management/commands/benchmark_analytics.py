@@ -0,0 +1,81 @@
+"""Management command to benchmark the student analytics path."""
+import json
+import os
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from ml.benchmark import (
+    DEFAULT_ASSIGNMENTS, DEFAULT_REPEAT, DEFAULT_SIZES, compare_reports, run_benchmarks,
+)
+
+class Command(BaseCommand):
+    help = 'Seed classrooms of several sizes in a test database and benchmark student analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=DEFAULT_SIZES,
+            help='Classroom sizes (number of students) to benchmark'
+        )
+        parser.add_argument(
+            '--assignments',
+            type=int,
+            default=DEFAULT_ASSIGNMENTS,
+            help='Assignments per classroom'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='Timed runs per measurement'
+        )
+        parser.add_argument(
+            '--output',
+            help='JSON file to write the results to (default: ml/benchmarks/<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier results file to compare median latencies with'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'ml', 'benchmarks', f"analytics-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+
+        # Seed into a throwaway test database, never the real one
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmarks(
+                sizes=sorted(set(options['sizes'])),
+                n_assignments=options['assignments'],
+                repeat=options['repeat'],
+                log=self.stdout.write,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for result in report['results']:
+            analytics = result['student_analytics']
+            self.stdout.write(
+                f"{result['students']:>6} students: get_student_analytics "
+                f"{analytics['latency_ms']['median']:.2f} ms median, "
+                f"{analytics['latency_ms']['p95']:.2f} ms p95, {analytics['queries']} queries; "
+                f"class analytics {result['classroom_analytics']['latency_ms']['median']:.2f} ms"
+            )
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                before = json.load(f)
+            self.stdout.write(f"Compared with {options['compare']} (after / before):")
+            for students, metric, was, now, ratio in compare_reports(before, report):
+                self.stdout.write(f'  {students:>6} {metric}: {was:.3f} -> {now:.3f} ms ({ratio}x)')
+
+        self.stdout.write(self.style.SUCCESS(f'Benchmark results written to {output}'))
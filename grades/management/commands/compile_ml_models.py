@@ -0,0 +1,49 @@
+"""Management command to compile the trained ML models for NumPy inference."""
+import os
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+from ml.compiled import COMPILED_FILE, load_compiled, source_digest
+from ml.registry import MODEL_FILES, MODELS_DIR
+from ml.scripts.train_models import export_compiled_models, verification_matrix, verify_compiled_models
+
+class Command(BaseCommand):
+    help = 'Compile the trained models to NumPy arrays and verify them against scikit-learn'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only verify the existing compiled models, without exporting them again'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=5000,
+            help='Number of random feature rows to verify on'
+        )
+
+    def handle(self, *args, **options):
+        X = verification_matrix(n_random=options['rows'])
+
+        if options['check']:
+            path = os.path.join(MODELS_DIR, COMPILED_FILE)
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist; run compile_ml_models first')
+            compiled = load_compiled(path)
+            if compiled.pop('source') != source_digest(MODELS_DIR):
+                raise CommandError('Compiled models were exported from different pickles')
+            models = {name: joblib.load(os.path.join(MODELS_DIR, filename)) for name, filename in MODEL_FILES.items()}
+            report = verify_compiled_models(models, compiled, X)
+        else:
+            try:
+                report = export_compiled_models(MODELS_DIR, X)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        for key, value in report.items():
+            self.stdout.write(f'  {key}: {value}')
+        if not report['matches']:
+            raise CommandError('Compiled models do not match scikit-learn')
+        self.stdout.write(
+            self.style.SUCCESS(f'Compiled models match scikit-learn on {report["rows"]} rows.')
+        )
@@ -0,0 +1,46 @@
+"""Management command to import assignment grades from a CSV file."""
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from assignments.models import Assignment
+from grades.bulk import upsert_grades, read_grade_csv
+
+class Command(BaseCommand):
+    help = 'Import grades for an assignment from a CSV with student and marks columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_id', type=int, help='Assignment to grade')
+        parser.add_argument('csv_path', help='CSV file with student (username or id) and marks columns')
+        parser.add_argument(
+            '--marked-by',
+            help='Username recorded as the grader (defaults to the class owner)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            assignment = Assignment.objects.select_related('classroom__owner').get(id=options['assignment_id'])
+        except Assignment.DoesNotExist:
+            raise CommandError(f"Assignment {options['assignment_id']} does not exist")
+
+        marked_by = assignment.classroom.owner
+        if options['marked_by']:
+            try:
+                marked_by = get_user_model().objects.get(username=options['marked_by'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['marked_by']} does not exist")
+
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                result = upsert_grades(assignment.classroom, assignment, read_grade_csv(f), marked_by=marked_by)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not import grades: {e}')
+
+        for error in result['errors']:
+            self.stdout.write(
+                self.style.WARNING(f"Row {error['row']} ({error['student']}): {error['error']}")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported grades for {assignment.title}: {result['created']} created, "
+                f"{result['updated']} updated, {len(result['errors'])} skipped."
+            )
+        )
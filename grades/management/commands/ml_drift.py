@@ -0,0 +1,91 @@
+"""Management command to report drift of the live ML features from the training data."""
+import json
+import os
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from ml.drift import (
+    BASE_DIR, DEFAULT_WINDOW_DAYS, RETENTION_DAYS, build_reference, collect_batch_counts, drift_monitor, drift_report,
+    load_reference, prune_histograms, record_counts, save_reference,
+)
+from ml.features import FEATURE_NAMES
+from ml.registry import MODELS_DIR
+
+class Command(BaseCommand):
+    help = 'Compare live feature histograms with the reference saved at training time (PSI and KS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_WINDOW_DAYS,
+            help='Number of recent days of histograms to compare'
+        )
+        parser.add_argument(
+            '--source',
+            choices=['serving', 'batch', 'all'],
+            default='serving',
+            help='Compare the histograms of served predictions, of the batch job, or both'
+        )
+        parser.add_argument(
+            '--collect',
+            action='store_true',
+            help='First histogram the current features of every classroom as today\'s batch counts'
+        )
+        parser.add_argument(
+            '--build-reference',
+            action='store_true',
+            help='Rebuild the reference histograms from ml/data/training_data.csv'
+        )
+        parser.add_argument(
+            '--prune',
+            type=int,
+            metavar='DAYS',
+            nargs='?',
+            const=RETENTION_DAYS,
+            help=f'Delete histograms older than DAYS days (default {RETENTION_DAYS})'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['build_reference']:
+            data = pd.read_csv(os.path.join(BASE_DIR, 'ml', 'data', 'training_data.csv'), usecols=FEATURE_NAMES)
+            reference = build_reference(data[FEATURE_NAMES].to_numpy())
+            save_reference(reference, MODELS_DIR)
+            self.stdout.write(f'Saved reference {reference["id"]} from {reference["samples"]} training rows')
+
+        reference = load_reference(MODELS_DIR)
+        if reference is None:
+            raise CommandError('The models have no reference histograms; retrain them or use --build-reference')
+
+        if options['collect']:
+            counts, rows = collect_batch_counts(reference)
+            record_counts(counts, reference['id'], source='batch', replace=True)
+            self.stdout.write(f'Recorded the features of {rows} students')
+
+        if options['prune'] is not None:
+            self.stdout.write(f'Deleted {prune_histograms(options["prune"])} old histograms')
+
+        drift_monitor.flush()
+        report = drift_report(options['days'], None if options['source'] == 'all' else options['source'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f'Reference {report["reference"]["id"]} ({report["reference"]["samples"]} training rows), '
+            f'{report["source"]} features over the last {report["window_days"]} days'
+        )
+        for feature in report['features']:
+            if feature['samples']:
+                line = (
+                    f'  {feature["feature"]:<18} {feature["samples"]:>8} rows  PSI {feature["psi"]:.4f}  '
+                    f'KS {feature["ks"]:.4f} (critical {feature["ks_critical"]:.4f})  {feature["status"]}'
+                )
+            else:
+                line = f'  {feature["feature"]:<18} no data'
+            style = {'moderate': self.style.WARNING, 'significant': self.style.ERROR}.get(feature['status'])
+            self.stdout.write(style(line) if style else line)
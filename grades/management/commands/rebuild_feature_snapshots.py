@@ -0,0 +1,25 @@
+"""Management command to recompute the stored analytics features."""
+from django.core.management.base import BaseCommand
+from classes.models import ClassRoom
+from ml.feature_store import rebuild_feature_snapshots
+
+class Command(BaseCommand):
+    help = 'Recompute student feature snapshots from grades and submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--classroom',
+            type=int,
+            action='append',
+            help='Only rebuild this classroom (may be given more than once)'
+        )
+
+    def handle(self, *args, **options):
+        classrooms = ClassRoom.objects.order_by('id')
+        if options['classroom']:
+            classrooms = classrooms.filter(id__in=options['classroom'])
+
+        rows = rebuild_feature_snapshots(classrooms.iterator())
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rows} student feature snapshots.')
+        )
@@ -0,0 +1,25 @@
+"""Management command to recompute the materialized grade statistics."""
+from django.core.management.base import BaseCommand
+from classes.models import ClassRoom
+from grades.stats import rebuild_statistics
+
+class Command(BaseCommand):
+    help = 'Recompute class and assignment grade statistics from the Grade table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--classroom',
+            type=int,
+            action='append',
+            help='Only rebuild this classroom (may be given more than once)'
+        )
+
+    def handle(self, *args, **options):
+        classrooms = None
+        if options['classroom']:
+            classrooms = ClassRoom.objects.filter(id__in=options['classroom'])
+
+        rows = rebuild_statistics(classrooms)
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rows} grade statistics rows.')
+        )
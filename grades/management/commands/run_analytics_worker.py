@@ -0,0 +1,59 @@
+"""Management command to precompute student analytics from the job queue."""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from ml.analytics_queue import BATCH_SIZE, LOCK_SECONDS, POLL_SECONDS, enqueue_stale, run_worker
+
+class Command(BaseCommand):
+    help = 'Process queued student analytics recomputes, batched per classroom'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no jobs are due instead of waiting for more'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Maximum number of students of one classroom scored together'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=POLL_SECONDS,
+            help='Seconds to wait between checks of an empty queue'
+        )
+        parser.add_argument(
+            '--lock-seconds',
+            type=int,
+            default=LOCK_SECONDS,
+            help='Seconds before jobs claimed by a stopped worker can be claimed again'
+        )
+        parser.add_argument(
+            '--enqueue-stale',
+            type=float,
+            metavar='HOURS',
+            nargs='?',
+            const=0,
+            help='First queue every participant without analytics from the current models '
+                 '(or, given HOURS, with analytics older than that)'
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_stale'] is not None:
+            max_age = timedelta(hours=options['enqueue_stale']) if options['enqueue_stale'] else None
+            self.stdout.write(f'Queued {enqueue_stale(max_age)} students')
+
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        try:
+            processed = run_worker(
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                lock_seconds=options['lock_seconds'],
+                log=log,
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Computed analytics for {processed} students.'))
@@ -0,0 +1,64 @@
+"""Management command to serve ML predictions to the web workers over a Unix socket."""
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ml.inference import BATCH_WORKERS, MAX_BATCH_ROWS, MAX_WAIT_SECONDS, InferenceServer
+from ml.predictions import load_local_models
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = 'Run the inference server that scores batched predictions for all web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=settings.ML_INFERENCE_SOCKET,
+            help='Unix socket path to listen on (default: ML_INFERENCE_SOCKET)'
+        )
+        parser.add_argument(
+            '--max-batch-rows',
+            type=int,
+            default=MAX_BATCH_ROWS,
+            help='Maximum number of rows scored in one batch'
+        )
+        parser.add_argument(
+            '--max-wait-ms',
+            type=float,
+            default=MAX_WAIT_SECONDS * 1000,
+            help='How long a request waits for others to join its batch'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=BATCH_WORKERS,
+            help='Number of batches scored at the same time'
+        )
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Set ML_INFERENCE_SOCKET or pass --socket')
+        models = load_local_models()
+        if not models:
+            raise CommandError('ML models not available')
+
+        server = InferenceServer(
+            options['socket'],
+            max_batch_rows=options['max_batch_rows'],
+            max_wait=options['max_wait_ms'] / 1000,
+            workers=options['workers'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Serving models {models["version"]} ({models["engine"]}) on {options["socket"]}'
+        ))
+        # Remove the socket file on a plain kill as well
+        signal.signal(signal.SIGTERM, _stop)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
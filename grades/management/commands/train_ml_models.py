@@ -1,35 +1,119 @@
 """Management command to train ML models."""
-import os
+import time
 from django.core.management.base import BaseCommand
-from django.conf import settings
 
 class Command(BaseCommand):
     help = 'Train ML models for student analytics'
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=['synthetic', 'lms'],
+            default='synthetic',
+            help='Train on generated data or on the history of completed classrooms'
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to read LMS training data from (e.g. a local copy of production)'
+        )
+        parser.add_argument(
+            '--cutoff',
+            type=float,
+            default=0.5,
+            help='Share of each classroom\'s assignments that LMS features are computed from'
+        )
         parser.add_argument(
             '--samples',
             type=int,
             default=2000,
             help='Number of synthetic samples to generate for training'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic data'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100000,
+            help='Number of samples generated, or database rows fetched, at a time'
+        )
+        parser.add_argument(
+            '--parallel',
+            action='store_true',
+            help='Train the risk and grade models at the same time in separate processes'
+        )
+        parser.add_argument(
+            '--search',
+            action='store_true',
+            help='Run a cross-validated hyperparameter search before training'
+        )
+        parser.add_argument(
+            '--search-budget',
+            type=float,
+            default=300,
+            help='Wall-clock budget in seconds for the hyperparameter search'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes used by the hyperparameter search (default: all cores)'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Starting ML model training...')
         
         try:
-            # Import the training script
-            import sys
-            ml_scripts_path = os.path.join(settings.BASE_DIR, 'ml', 'scripts')
-            sys.path.append(ml_scripts_path)
-            
-            from train_models import train_and_save_models
-            
-            samples = options['samples']
-            self.stdout.write(f'Training models with {samples} samples...')
-            
-            # Train the models
-            train_and_save_models(samples=samples)
+            from ml.scripts.train_models import fit_and_save_models, train_and_save_models
+
+            training_options = {
+                'parallel': options['parallel'],
+                'search': options['search'],
+                'search_budget': options['search_budget'],
+                'workers': options['workers'],
+            }
+
+            if options['source'] == 'lms':
+                from ml.training_data import export_training_data, load_training_data
+
+                self.stdout.write(f"Exporting training data from the '{options['database']}' database...")
+                started = time.perf_counter()
+                manifest = export_training_data(
+                    using=options['database'],
+                    cutoff=options['cutoff'],
+                    chunk_size=options['chunk_size'],
+                )
+                export_seconds = round(time.perf_counter() - started, 3)
+                if not manifest['rows']:
+                    raise ValueError('No completed classrooms with graded students to train on')
+                self.stdout.write(f"Training models with {manifest['rows']} LMS rows...")
+
+                started = time.perf_counter()
+                data = load_training_data()
+                metadata = fit_and_save_models(
+                    data,
+                    extra_metadata={'source': 'lms', 'cutoff': options['cutoff']},
+                    timings={'export': export_seconds, 'load': round(time.perf_counter() - started, 3)},
+                    **training_options,
+                )
+            else:
+                samples = options['samples']
+                self.stdout.write(f'Training models with {samples} samples...')
+
+                # Train the models
+                metadata = train_and_save_models(
+                    samples=samples,
+                    seed=options['seed'],
+                    chunk_size=options['chunk_size'],
+                    **training_options,
+                )
+
+            for stage, seconds in metadata['timings'].items():
+                self.stdout.write(f'  {stage}: {seconds:.2f}s')
             
             self.stdout.write(
                 self.style.SUCCESS('Successfully trained and saved ML models!')
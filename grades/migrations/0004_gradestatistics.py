@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+
+def populate_statistics(apps, schema_editor):
+    # A frozen copy of grades.stats.rebuild_statistics. The duplication is
+    # deliberate: migrations must keep working against the historical models
+    # whatever later happens to the app code, so they can't import it.
+    Grade = apps.get_model('grades', 'Grade')
+    GradeStatistics = apps.get_model('grades', 'GradeStatistics')
+
+    percentage = Cast('marks_obtained', FloatField()) * 100.0 / Cast('total_marks', FloatField())
+    totals = {}
+    for group in (('classroom_id',), ('classroom_id', 'assignment_id')):
+        scoped = Grade.objects.all() if len(group) == 1 else Grade.objects.filter(assignment__isnull=False)
+        rows = scoped.values(*group).annotate(
+            n=Count('id'),
+            passed=Count('id', filter=Q(is_passed=True)),
+            total=Sum(percentage),
+            total_sq=Sum(percentage * percentage),
+        ).order_by()
+        for row in rows:
+            key = (row['classroom_id'], row.get('assignment_id'))
+            totals[key] = GradeStatistics(
+                classroom_id=key[0],
+                assignment_id=key[1],
+                count=row['n'],
+                passed_count=row['passed'],
+                percentage_sum=row['total'] or 0.0,
+                percentage_sum_sq=row['total_sq'] or 0.0,
+                letter_counts={},
+            )
+        letters = scoped.values(*group, 'grade').annotate(n=Count('id')).order_by()
+        for row in letters:
+            key = (row['classroom_id'], row.get('assignment_id'))
+            totals[key].letter_counts[row['grade']] = row['n']
+
+    GradeStatistics.objects.bulk_create(totals.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0002_assignment_file'),
+        ('classes', '0006_remove_classroom_slug'),
+        ('grades', '0003_delete_studentanalytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('passed_count', models.PositiveIntegerField(default=0)),
+                ('percentage_sum', models.FloatField(default=0)),
+                ('percentage_sum_sq', models.FloatField(default=0)),
+                ('letter_counts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grade_statistics', to='assignments.assignment')),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_statistics', to='classes.classroom')),
+            ],
+            options={
+                'verbose_name_plural': 'grade statistics',
+                'constraints': [models.UniqueConstraint(fields=('classroom', 'assignment'), name='unique_assignment_grade_statistics'), models.UniqueConstraint(condition=models.Q(('assignment__isnull', True)), fields=('classroom',), name='unique_classroom_grade_statistics')],
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0005_studentfeaturesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('serving', 'Serving'), ('batch', 'Batch')], default='serving', max_length=10)),
+                ('feature', models.CharField(max_length=50)),
+                ('reference', models.CharField(max_length=12)),
+                ('counts', models.JSONField(default=list)),
+                ('total', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-day', 'source', 'feature'],
+                'unique_together': {('day', 'source', 'feature', 'reference')},
+            },
+        ),
+    ]
@@ -1,8 +1,31 @@
+from decimal import Decimal
 from django.db import models
 from classes.models import ClassRoom
 from users.models import CustomUser
 from assignments.models import Assignment
 
+# Lower bound (percentage) for each letter grade, highest first.
+GRADE_BANDS = [
+    (90, 'A+'),
+    (80, 'A'),
+    (70, 'B+'),
+    (60, 'B'),
+    (50, 'C+'),
+    (40, 'C'),
+    (30, 'D'),
+    (0, 'F'),
+]
+PASS_PERCENTAGE = 40  # 40% is passing grade
+
+
+def letter_grade(percentage):
+    """Return the letter grade for a percentage."""
+    for lower_bound, letter in GRADE_BANDS:
+        if percentage >= lower_bound:
+            return letter
+    return 'F'
+
+
 class Grade(models.Model):
     GRADE_CHOICES = [
         ('A+', 'A+ (90-100)'),
@@ -33,33 +56,181 @@ class Grade(models.Model):
         unique_together = ['classroom', 'student', 'assignment']
         ordering = ['-graded_at']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to the class statistics
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
-        # Auto-calculate grade and pass/fail status
-        percentage = (self.marks_obtained / self.total_marks) * 100
-        
-        if percentage >= 90:
-            self.grade = 'A+'
-        elif percentage >= 80:
-            self.grade = 'A'
-        elif percentage >= 70:
-            self.grade = 'B+'
-        elif percentage >= 60:
-            self.grade = 'B'
-        elif percentage >= 50:
-            self.grade = 'C+'
-        elif percentage >= 40:
-            self.grade = 'C'
-        elif percentage >= 30:
-            self.grade = 'D'
-        else:
-            self.grade = 'F'
-            
-        self.is_passed = percentage >= 40  # 40% is passing grade
+        self.calculate_grade()
         super().save(*args, **kwargs)
 
+    def calculate_grade(self):
+        """Auto-calculate grade and pass/fail status (also used before bulk writes)."""
+        percentage = Decimal(str(self.marks_obtained)) / Decimal(str(self.total_marks)) * 100
+        self.grade = letter_grade(percentage)
+        self.is_passed = percentage >= PASS_PERCENTAGE
+
     def get_percentage(self):
         return round((self.marks_obtained / self.total_marks) * 100, 2)
 
     def __str__(self):
         assignment_name = f" - {self.assignment.title}" if self.assignment else ""
         return f"{self.student.username} - {self.classroom.name}{assignment_name}: {self.grade} ({self.get_percentage()}%)"
+
+
+class GradeStatistics(models.Model):
+    """
+    Running grade totals for a classroom (assignment is null) or for one of
+    its assignments, kept up to date as grades are written.
+    """
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='grade_statistics')
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, null=True, blank=True, related_name='grade_statistics')
+
+    count = models.PositiveIntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+    percentage_sum = models.FloatField(default=0)
+    percentage_sum_sq = models.FloatField(default=0)
+    letter_counts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'grade statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['classroom', 'assignment'], name='unique_assignment_grade_statistics'),
+            models.UniqueConstraint(
+                fields=['classroom'],
+                condition=models.Q(assignment__isnull=True),
+                name='unique_classroom_grade_statistics',
+            ),
+        ]
+
+    @property
+    def failed_count(self):
+        return self.count - self.passed_count
+
+    @property
+    def average(self):
+        return round(self.percentage_sum / self.count, 2) if self.count else 0
+
+    @property
+    def std_dev(self):
+        if not self.count:
+            return 0
+        mean = self.percentage_sum / self.count
+        return round(max(self.percentage_sum_sq / self.count - mean * mean, 0) ** 0.5, 2)
+
+    @property
+    def pass_rate(self):
+        return (self.passed_count / self.count * 100) if self.count else 0
+
+    @property
+    def distribution(self):
+        """Letter counts in band order, omitting empty letters."""
+        return {
+            letter: self.letter_counts[letter]
+            for _, letter in GRADE_BANDS
+            if self.letter_counts.get(letter)
+        }
+
+    def __str__(self):
+        scope = self.assignment.title if self.assignment else 'All assignments'
+        return f"{self.classroom.name} - {scope}: {self.count} grades, avg {self.average}%"
+
+
+class StudentFeatureSnapshot(models.Model):
+    """
+    Raw per-(student, classroom) counts behind the analytics features, kept
+    current as grades, submissions and assignments change. Time-dependent
+    features (days since last submission) are derived when read.
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='feature_snapshots')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='feature_snapshots')
+
+    assignment_count = models.PositiveIntegerField(default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    submitted_count = models.PositiveIntegerField(default=0)
+    on_time_count = models.PositiveIntegerField(default=0)
+    last_submission_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'classroom']
+
+    def __str__(self):
+        return f"Features for {self.student.username} in {self.classroom.name}"
+
+
+
+class FeatureHistogram(models.Model):
+    """
+    One day of one ML feature's values counted into the reference bins
+    saved with the models (see ml.drift), from served predictions or from
+    the batch job.
+    """
+    SOURCE_CHOICES = [
+        ('serving', 'Serving'),
+        ('batch', 'Batch'),
+    ]
+
+    day = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='serving')
+    feature = models.CharField(max_length=50)
+    reference = models.CharField(max_length=12)
+    counts = models.JSONField(default=list)
+    total = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['day', 'source', 'feature', 'reference']
+        ordering = ['-day', 'source', 'feature']
+
+    def __str__(self):
+        return f"{self.feature} ({self.source}) on {self.day}"
+
+
+class StudentAnalytics(models.Model):
+    """
+    Precomputed ML analytics (risk, predicted grade, trend) for a student in
+    a classroom, written by the analytics worker (see ml.analytics_queue).
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='analytics')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='student_analytics')
+    analytics = models.JSONField(default=dict)
+    model_version = models.CharField(max_length=64, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['student', 'classroom']
+        verbose_name_plural = 'Student analytics'
+
+    def __str__(self):
+        return f"Analytics for {self.student.username} in {self.classroom.name}"
+
+
+class AnalyticsJob(models.Model):
+    """
+    A pending recompute of one student's analytics in a classroom. There is
+    at most one job per pair: enqueueing again only moves ``enqueued_at``,
+    which tells the worker the job changed while it was being processed.
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='analytics_jobs')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='analytics_jobs')
+    enqueued_at = models.DateTimeField()
+    available_at = models.DateTimeField()
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ['student', 'classroom']
+        indexes = [
+            models.Index(fields=['available_at'], name='grades_analyticsjob_due'),
+        ]
+
+    def __str__(self):
+        return f"Analytics job for {self.student.username} in {self.classroom.name}"
@@ -0,0 +1,47 @@
+"""Keep derived grade data in step with Grade, Submission, Assignment and membership writes."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from assignments.models import Assignment, Submission
+from classes.models import ClassMembership
+from ml.feature_store import schedule_snapshot_refresh
+from .models import Grade
+from . import stats
+
+
+@receiver(post_save, sender=Grade)
+def grade_saved(sender, instance, created, **kwargs):
+    removed = [] if created else [stats.loaded_contribution(instance)]
+    stats.apply_changes(removed=removed, added=[stats.contribution(instance)])
+    stats.invalidate_student_statistics(instance.student_id)
+    schedule_snapshot_refresh(instance.classroom_id, [instance.student_id])
+    instance._loaded_values = dict(instance.__dict__)
+
+
+@receiver(post_delete, sender=Grade)
+def grade_deleted(sender, instance, **kwargs):
+    previous = stats.loaded_contribution(instance) or stats.contribution(instance)
+    stats.apply_changes(removed=[previous])
+    stats.invalidate_student_statistics(instance.student_id)
+    schedule_snapshot_refresh(instance.classroom_id, [instance.student_id])
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def submission_changed(sender, instance, **kwargs):
+    classroom_id = Assignment.objects.filter(id=instance.assignment_id).values_list('classroom_id', flat=True).first()
+    if classroom_id:
+        schedule_snapshot_refresh(classroom_id, [instance.student_id])
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def assignment_changed(sender, instance, **kwargs):
+    # Assignment counts and on-time status change for the whole class
+    schedule_snapshot_refresh(instance.classroom_id)
+
+
+@receiver(post_save, sender=ClassMembership)
+def membership_created(sender, instance, created, **kwargs):
+    # Store the new participant's snapshot now rather than on the first read
+    if created and instance.role == 'participant':
+        schedule_snapshot_refresh(instance.classroom_id, [instance.user_id])
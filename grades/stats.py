@@ -0,0 +1,173 @@
+"""Grade statistics: incremental class and assignment totals, cached per-student aggregates."""
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, Q, Sum
+from django.db.models.functions import Cast
+from notification.pubsub import cache_is_shared
+from .models import GRADE_BANDS, Grade, GradeStatistics
+
+STUDENT_STATS_CACHE_TIMEOUT = 60 * 60
+# Invalidation only reaches this process's cache, so entries held by other
+# workers must expire on their own
+STUDENT_STATS_LOCAL_CACHE_TIMEOUT = 30
+
+
+def _percentage():
+    return Cast('marks_obtained', FloatField()) * 100.0 / Cast('total_marks', FloatField())
+
+
+def contribution(grade, values=None):
+    """
+    What a grade adds to the statistics: (classroom_id, assignment_id,
+    percentage, letter, passed). ``values`` overrides the instance's current
+    fields, e.g. with the values it was loaded with.
+    """
+    values = values if values is not None else grade.__dict__
+    try:
+        percentage = float(values['marks_obtained']) / float(values['total_marks']) * 100
+        return (values['classroom_id'], values['assignment_id'], percentage, values['grade'], values['is_passed'])
+    except (KeyError, TypeError, ZeroDivisionError):
+        return None
+
+
+def loaded_contribution(grade):
+    """The contribution of a grade as it was read from the database, if known."""
+    loaded = getattr(grade, '_loaded_values', None)
+    return contribution(grade, loaded) if loaded else None
+
+
+def apply_changes(removed=(), added=()):
+    """Fold removed/added contributions into the class and assignment rows."""
+    deltas = defaultdict(lambda: {'count': 0, 'passed': 0, 'sum': 0.0, 'sum_sq': 0.0, 'letters': defaultdict(int)})
+    for sign, contributions in ((-1, removed), (1, added)):
+        for item in contributions:
+            if item is None:
+                continue
+            classroom_id, assignment_id, percentage, letter, passed = item
+            keys = [(classroom_id, None)]
+            if assignment_id is not None:
+                keys.append((classroom_id, assignment_id))
+            for key in keys:
+                delta = deltas[key]
+                delta['count'] += sign
+                delta['passed'] += sign if passed else 0
+                delta['sum'] += sign * percentage
+                delta['sum_sq'] += sign * percentage * percentage
+                delta['letters'][letter] += sign
+
+    # Rows are created up front, so two writers adding the first grade of a
+    # class or assignment don't race to insert the same row
+    GradeStatistics.objects.bulk_create(
+        [
+            GradeStatistics(classroom_id=classroom_id, assignment_id=assignment_id)
+            for (classroom_id, assignment_id), delta in deltas.items()
+            if delta['count'] > 0
+        ],
+        ignore_conflicts=True,
+    )
+    with transaction.atomic():
+        for (classroom_id, assignment_id), delta in deltas.items():
+            stats = GradeStatistics.objects.select_for_update().filter(
+                classroom_id=classroom_id, assignment_id=assignment_id
+            ).first()
+            if stats is None:
+                # Nothing to subtract from (e.g. the row was cascaded away)
+                continue
+
+            stats.count = max(stats.count + delta['count'], 0)
+            stats.passed_count = max(stats.passed_count + delta['passed'], 0)
+            stats.percentage_sum += delta['sum']
+            stats.percentage_sum_sq += delta['sum_sq']
+            letters = dict(stats.letter_counts)
+            for letter, change in delta['letters'].items():
+                letters[letter] = max(letters.get(letter, 0) + change, 0)
+            stats.letter_counts = {letter: n for letter, n in letters.items() if n}
+            if not stats.count:
+                stats.percentage_sum = stats.percentage_sum_sq = 0.0
+            stats.save()
+
+
+def rebuild_statistics(classrooms=None):
+    """Recompute statistics from the Grade table, for all or some classrooms."""
+    grades = Grade.objects.all()
+    existing = GradeStatistics.objects.all()
+    if classrooms is not None:
+        grades = grades.filter(classroom__in=classrooms)
+        existing = existing.filter(classroom__in=classrooms)
+
+    percentage = _percentage()
+    totals = {}
+    for group in (('classroom_id',), ('classroom_id', 'assignment_id')):
+        scoped = grades if len(group) == 1 else grades.filter(assignment__isnull=False)
+        rows = scoped.values(*group).annotate(
+            n=Count('id'),
+            passed=Count('id', filter=Q(is_passed=True)),
+            total=Sum(percentage),
+            total_sq=Sum(percentage * percentage),
+        ).order_by()
+        for row in rows:
+            key = (row['classroom_id'], row.get('assignment_id'))
+            totals[key] = GradeStatistics(
+                classroom_id=key[0],
+                assignment_id=key[1],
+                count=row['n'],
+                passed_count=row['passed'],
+                percentage_sum=row['total'] or 0.0,
+                percentage_sum_sq=row['total_sq'] or 0.0,
+                letter_counts={},
+            )
+        letters = scoped.values(*group, 'grade').annotate(n=Count('id')).order_by()
+        for row in letters:
+            key = (row['classroom_id'], row.get('assignment_id'))
+            totals[key].letter_counts[row['grade']] = row['n']
+
+    with transaction.atomic():
+        existing.delete()
+        GradeStatistics.objects.bulk_create(totals.values())
+    return len(totals)
+
+
+def _student_cache_key(student_id):
+    return f'grades:student-stats:{student_id}'
+
+
+def student_statistics(student):
+    """
+    Overall grade statistics for a student, computed with a single aggregate
+    query and cached until one of the student's grades changes (or briefly,
+    when the cache is local to the process).
+    """
+    key = _student_cache_key(student.pk)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    letters = [letter for _, letter in GRADE_BANDS]
+    totals = Grade.objects.filter(student=student).aggregate(
+        total=Count('id'),
+        passed=Count('id', filter=Q(is_passed=True)),
+        average=Avg(_percentage()),
+        **{f'letter_{i}': Count('id', filter=Q(grade=letter)) for i, letter in enumerate(letters)},
+    )
+    total = totals['total']
+    result = {
+        'total_grades': total,
+        'passed_grades': totals['passed'],
+        'failed_grades': total - totals['passed'],
+        'pass_rate': (totals['passed'] / total * 100) if total > 0 else 0,
+        'average_percentage': round(totals['average'] or 0, 2),
+        'grade_distribution': {
+            letter: totals[f'letter_{i}']
+            for i, letter in enumerate(letters)
+            if totals[f'letter_{i}']
+        },
+    }
+    timeout = STUDENT_STATS_CACHE_TIMEOUT if cache_is_shared() else STUDENT_STATS_LOCAL_CACHE_TIMEOUT
+    cache.set(key, result, timeout)
+    return result
+
+
+def invalidate_student_statistics(*student_ids):
+    cache.delete_many([_student_cache_key(student_id) for student_id in student_ids])
+
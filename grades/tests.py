@@ -1,3 +1,780 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from assignments.models import Assignment, Submission
+from classes.models import ClassMembership, ClassRoom
+from users.models import CustomUser
+from .bulk import read_grade_csv, upsert_grades
+from .gradebook import Gradebook
+from ml import analytics_queue, registry
+from ml.benchmark import seed_classroom
+from ml.compiled import COMPILED_FILE, load_compiled, mmap_npz
+from ml.feature_store import load_feature_counts
+from ml.features import NO_SUBMISSION_DAYS, collect_classroom_features, compute_feature_counts, feature_dict
+from ml.inference import InferenceClient, InferenceError, InferenceServer
+from ml.prediction_cache import PredictionCache, prediction_cache
+from ml.predictions import (
+    RISK_LEVELS, get_student_analytics, grade_scores_batch, load_local_models, predict_batch, predict_grade_batch,
+    predict_risk_batch, risk_indices_batch,
+)
+from .models import AnalyticsJob, Grade, GradeStatistics, StudentAnalytics, StudentFeatureSnapshot
+from . import stats
+from .stats import rebuild_statistics, student_statistics
 
-# Create your tests here.
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        self.assignment = Assignment.objects.create(
+            classroom=self.classroom, title='Essay', created_by=self.teacher,
+            deadline=timezone.now() + timedelta(days=1),
+        )
+
+    def test_cell_letter_matches_stored_grade_at_band_edge(self):
+        # 89.996% is displayed as 90.0 but is an A, not an A+
+        grade = Grade.objects.create(
+            classroom=self.classroom, student=self.student, assignment=self.assignment, marked_by=self.teacher,
+            marks_obtained=Decimal('899.95'), total_marks=Decimal('999.99'),
+        )
+        self.assertEqual(grade.grade, 'A')
+
+        row = Gradebook(self.classroom).rows([0])[0]
+        self.assertEqual(row['cells'][0]['percentage'], 90.0)
+        self.assertEqual(row['cells'][0]['letter'], 'A')
+        self.assertEqual(row['letter'], 'A')
+
+    def test_pass_rate_matches_stored_pass_at_edge(self):
+        # 2.26 / 5.65 is exactly 40% in Decimal but 39.999...% in float
+        grade = Grade.objects.create(
+            classroom=self.classroom, student=self.student, assignment=self.assignment, marked_by=self.teacher,
+            marks_obtained=Decimal('2.26'), total_marks=Decimal('5.65'),
+        )
+        self.assertTrue(grade.is_passed)
+
+        gradebook = Gradebook(self.classroom)
+        self.assertTrue(gradebook.passed[0, 0])
+        self.assertEqual(gradebook.assignment_summaries()[0]['pass_rate'], 100.0)
+
+
+class BulkGradeTests(TestCase):
+    """Grade batches and CSV imports validate every row and write in bulk."""
+
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(3)]
+        self.outsider = CustomUser.objects.create_user('outsider', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        for student in self.students:
+            ClassMembership.objects.create(user=student, classroom=self.classroom)
+        self.assignment = Assignment.objects.create(
+            classroom=self.classroom, title='Essay', created_by=self.teacher,
+            deadline=timezone.now() + timedelta(days=1),
+        )
+
+    def marks(self):
+        return dict(
+            Grade.objects.filter(assignment=self.assignment).values_list('student__username', 'marks_obtained')
+        )
+
+    def test_upsert_creates_updates_and_reports_errors(self):
+        Grade.objects.create(
+            classroom=self.classroom, student=self.students[0], assignment=self.assignment,
+            marked_by=self.teacher, marks_obtained=30,
+        )
+        rows = [
+            (1, 'student0', '75'),
+            (2, str(self.students[1].id), '39.5'),
+            (3, 'outsider', '50'),
+            (4, 'student1', '60'),
+            (5, 'student2', '101'),
+            (6, 'student2', 'abc'),
+        ]
+        result = upsert_grades(self.classroom, self.assignment, rows, marked_by=self.teacher, chunk_size=2)
+
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in result['errors']], [3, 4, 5, 6])
+        self.assertEqual(self.marks(), {'student0': Decimal('75.00'), 'student1': Decimal('39.50')})
+        grade = Grade.objects.get(student=self.students[1])
+        self.assertFalse(grade.is_passed)
+
+        statistics = GradeStatistics.objects.get(assignment=self.assignment)
+        self.assertEqual((statistics.count, statistics.passed_count), (2, 1))
+        totals = (round(statistics.percentage_sum, 6), round(statistics.percentage_sum_sq, 6))
+        rebuild_statistics()
+        statistics = GradeStatistics.objects.get(assignment=self.assignment)
+        self.assertEqual((round(statistics.percentage_sum, 6), round(statistics.percentage_sum_sq, 6)), totals)
+
+    def test_read_grade_csv(self):
+        lines = ['Student , Percentage\n', 'student0,80\n', 'student1\n', ',55\n']
+        self.assertEqual(list(read_grade_csv(lines)), [(2, 'student0', '80'), (3, 'student1', ''), (4, '', '55')])
+        with self.assertRaises(ValueError):
+            list(read_grade_csv(['name,marks\n', 'student0,80\n']))
+
+    def test_import_grades_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('student,marks\nstudent0,90\nstudent1,45\nnobody,20\n')
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_grades', self.assignment.id, f.name, stdout=out)
+
+        self.assertEqual(self.marks(), {'student0': Decimal('90.00'), 'student1': Decimal('45.00')})
+        self.assertIn('2 created, 0 updated, 1 skipped', out.getvalue())
+        self.assertTrue(Grade.objects.filter(marked_by=self.teacher).exists())
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_bulk_and_import_endpoints(self):
+        self.client.force_login(self.teacher)
+        response = self.client.post(
+            reverse('grades:assign_grades_bulk', args=[self.classroom.id, self.assignment.id]),
+            data=json.dumps({'grades': [{'student_id': self.students[0].id, 'percentage': 88}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'success': True, 'created': 1, 'updated': 0, 'errors': []})
+
+        upload = SimpleUploadedFile('grades.csv', b'student,marks\nstudent0,91\nstudent2,40\n', content_type='text/csv')
+        response = self.client.post(
+            reverse('grades:import_grades', args=[self.classroom.id, self.assignment.id]),
+            {'grades_file': upload},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.marks(), {'student0': Decimal('91.00'), 'student2': Decimal('40.00')})
+
+        self.client.force_login(self.students[0])
+        response = self.client.post(
+            reverse('grades:assign_grades_bulk', args=[self.classroom.id, self.assignment.id]),
+            data=json.dumps({'grades': []}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class IncrementalStatisticsTests(TestCase):
+    """The running totals kept by the Grade signals must match a full rebuild."""
+
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(3)]
+        self.classrooms = [
+            ClassRoom.objects.create(name=f'Class {i}', owner=self.teacher, invite_code=f'class{i}')
+            for i in range(2)
+        ]
+        self.assignments = [
+            Assignment.objects.create(
+                classroom=classroom, title=f'Assignment {j}', created_by=self.teacher,
+                deadline=timezone.now() + timedelta(days=1),
+            )
+            for classroom in self.classrooms for j in range(2)
+        ]
+
+    def grade(self, student, assignment, marks):
+        return Grade.objects.create(
+            classroom=assignment.classroom, student=student, assignment=assignment,
+            marked_by=self.teacher, marks_obtained=marks,
+        )
+
+    def snapshot(self):
+        return {
+            (row.classroom_id, row.assignment_id): (
+                row.count, row.passed_count, round(row.percentage_sum, 6), round(row.percentage_sum_sq, 6),
+                {letter: n for letter, n in row.letter_counts.items() if n},
+            )
+            for row in GradeStatistics.objects.all()
+            if row.count
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_statistics()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_create(self):
+        for i, student in enumerate(self.students):
+            for assignment in self.assignments:
+                self.grade(student, assignment, 25 + i * 20)
+        self.assertMatchesRebuild()
+
+    def test_update(self):
+        grade = self.grade(self.students[0], self.assignments[0], 35)
+        self.grade(self.students[1], self.assignments[0], 70)
+        # Crosses the pass mark and a letter band
+        grade = Grade.objects.get(id=grade.id)
+        grade.marks_obtained = 85
+        grade.save()
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        grade = self.grade(self.students[0], self.assignments[0], 55)
+        self.grade(self.students[1], self.assignments[1], 92)
+        Grade.objects.get(id=grade.id).delete()
+        self.assertMatchesRebuild()
+
+    def test_reassign_to_other_assignment_and_classroom(self):
+        grade = self.grade(self.students[0], self.assignments[0], 64)
+        self.grade(self.students[1], self.assignments[0], 48)
+        grade = Grade.objects.get(id=grade.id)
+        grade.assignment = self.assignments[3]
+        grade.classroom = self.assignments[3].classroom
+        grade.save()
+        self.assertMatchesRebuild()
+
+        grade.assignment = None
+        grade.save()
+        self.assertMatchesRebuild()
+
+
+class StudentStatisticsTests(TestCase):
+    """Cached per-student aggregates are dropped when the student's grades change."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        self.assignments = [
+            Assignment.objects.create(
+                classroom=self.classroom, title=f'Assignment {j}', created_by=self.teacher,
+                deadline=timezone.now() + timedelta(days=1),
+            )
+            for j in range(2)
+        ]
+
+    def grade(self, assignment, marks):
+        return Grade.objects.create(
+            classroom=self.classroom, student=self.student, assignment=assignment,
+            marked_by=self.teacher, marks_obtained=marks,
+        )
+
+    def test_cached_until_grades_change(self):
+        grade = self.grade(self.assignments[0], 80)
+        self.assertEqual(student_statistics(self.student)['total_grades'], 1)
+        with self.assertNumQueries(0):
+            student_statistics(self.student)
+
+        self.grade(self.assignments[1], 30)
+        self.assertEqual(student_statistics(self.student)['passed_grades'], 1)
+
+        grade.marks_obtained = 20
+        grade.save()
+        self.assertEqual(student_statistics(self.student)['passed_grades'], 0)
+
+        grade.delete()
+        self.assertEqual(student_statistics(self.student)['total_grades'], 1)
+
+        upsert_grades(self.classroom, self.assignments[0], [(1, 'student', '95')], marked_by=self.teacher)
+        self.assertEqual(student_statistics(self.student)['grade_distribution'], {'A+': 1, 'D': 1})
+
+    def test_short_timeout_without_shared_cache(self):
+        with mock.patch.object(stats.cache, 'set') as cache_set:
+            student_statistics(self.student)
+        self.assertEqual(cache_set.call_args.args[2], stats.STUDENT_STATS_LOCAL_CACHE_TIMEOUT)
+
+        with mock.patch.object(stats, 'cache_is_shared', lambda: True), \
+                mock.patch.object(stats.cache, 'set') as cache_set:
+            student_statistics(self.student)
+        self.assertEqual(cache_set.call_args.args[2], stats.STUDENT_STATS_CACHE_TIMEOUT)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """The registry loads the models once and swaps them when the files change."""
+
+    def setUp(self):
+        self.models_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.models_dir)
+        for name in os.listdir(registry.MODELS_DIR):
+            shutil.copy2(os.path.join(registry.MODELS_DIR, name), self.models_dir)
+
+    def write_metadata(self, version, mtime):
+        path = os.path.join(self.models_dir, registry.METADATA_FILE)
+        with open(path, 'w') as f:
+            json.dump({'version': version}, f)
+        os.utime(path, (mtime, mtime))
+
+    def test_reloads_when_files_change(self):
+        models = registry.ModelRegistry(self.models_dir, check_interval=0)
+        reloaded = []
+        models.on_reload(reloaded.append)
+
+        bundle = models.get()
+        self.assertIs(models.get(), bundle)
+        self.assertEqual(bundle['engine'], 'compiled')
+
+        self.write_metadata('v2', time.time() + 10)
+        new_bundle = models.get()
+        self.assertIsNot(new_bundle, bundle)
+        self.assertEqual(new_bundle['version'], 'v2')
+        self.assertNotEqual(new_bundle['fingerprint'], bundle['fingerprint'])
+        self.assertEqual(reloaded, [bundle, new_bundle])
+        self.assertEqual(models.metrics()['loads'], 2)
+
+    def test_checks_files_at_most_once_per_interval(self):
+        models = registry.ModelRegistry(self.models_dir, check_interval=3600)
+        bundle = models.get()
+        self.write_metadata('v2', time.time() + 10)
+        self.assertIs(models.get(), bundle)
+
+    def test_failed_reload_keeps_previous_models(self):
+        models = registry.ModelRegistry(self.models_dir, check_interval=0, use_compiled=False)
+        bundle = models.get()
+        self.assertEqual(bundle['engine'], 'sklearn')
+
+        with open(os.path.join(self.models_dir, 'risk_model.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        with mock.patch('builtins.print'):
+            self.assertIs(models.get(), bundle)
+        self.assertEqual(models.metrics()['reload_failures'], 1)
+
+
+def per_student_features(student, classroom):
+    """The per-student feature extraction the grouped queries replaced."""
+    grades = Grade.objects.filter(student=student, classroom=classroom)
+    submissions = Submission.objects.filter(student=student, assignment__classroom=classroom)
+    total_assignments = Assignment.objects.filter(classroom=classroom).count()
+    submitted_count = submissions.count()
+    graded_count = grades.count()
+
+    if graded_count > 0:
+        avg_score = sum(float(g.marks_obtained) / float(g.total_marks) * 100 for g in grades) / graded_count
+    else:
+        avg_score = 0
+    submission_rate = (submitted_count / total_assignments * 100) if total_assignments > 0 else 0
+    on_time_count = sum(
+        1 for submission in submissions
+        if submission.assignment.deadline and submission.assignment.deadline >= submission.submitted_at
+    )
+    on_time_rate = (on_time_count / submitted_count * 100) if submitted_count > 0 else 0
+    participation = min(100, submission_rate + (on_time_rate * 0.5))
+    latest_submission = submissions.order_by('-submitted_at').first()
+    if latest_submission:
+        days_since_last = (timezone.now() - latest_submission.submitted_at).days
+    else:
+        days_since_last = 30
+
+    return {
+        'avg_score': avg_score,
+        'submission_rate': submission_rate,
+        'on_time_rate': on_time_rate,
+        'participation': participation,
+        'assignment_count': total_assignments,
+        'days_since_last': min(days_since_last, 30),
+    }
+
+
+class ClassroomFeatureTests(TestCase):
+    """Grouped feature extraction must give the per-student numbers exactly."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(4)]
+        for student in self.students:
+            ClassMembership.objects.create(user=student, classroom=self.classroom)
+        now = timezone.now()
+        self.assignments = [
+            Assignment.objects.create(
+                classroom=self.classroom, title=f'Assignment {j}', created_by=self.teacher, deadline=deadline,
+            )
+            for j, deadline in enumerate([now - timedelta(days=10), now - timedelta(days=3), now + timedelta(days=5)])
+        ]
+
+    def submit(self, student, assignment, days_ago):
+        submission = Submission.objects.create(assignment=assignment, student=student, file='submissions/work.pdf')
+        Submission.objects.filter(id=submission.id).update(submitted_at=timezone.now() - timedelta(days=days_ago, hours=1))
+
+    def grade(self, student, assignment, marks, total=100):
+        Grade.objects.create(
+            classroom=self.classroom, student=student, assignment=assignment,
+            marked_by=self.teacher, marks_obtained=marks, total_marks=total,
+        )
+
+    def test_grouped_features_match_per_student_features(self):
+        on_time, late, mixed, absent = self.students
+        # On time for every assignment so far
+        self.submit(on_time, self.assignments[0], 12)
+        self.submit(on_time, self.assignments[1], 4)
+        self.grade(on_time, self.assignments[0], Decimal('91.5'))
+        self.grade(on_time, self.assignments[1], Decimal('17.25'), total=20)
+        # Late for both past deadlines
+        self.submit(late, self.assignments[0], 5)
+        self.submit(late, self.assignments[1], 1)
+        self.grade(late, self.assignments[0], Decimal('33.33'))
+        # One late, one early, last submission long ago
+        self.submit(mixed, self.assignments[0], 45)
+        self.submit(mixed, self.assignments[2], 40)
+        self.grade(mixed, self.assignments[2], Decimal('66.67'))
+        # ``absent`` never submits and is never graded
+
+        expected = [per_student_features(student, self.classroom) for student in self.students]
+        self.assertEqual(expected[3]['days_since_last'], NO_SUBMISSION_DAYS)
+        self.assertEqual(expected[1]['on_time_rate'], 0)
+
+        for use_store in (False, True):
+            student_ids, X = collect_classroom_features(self.classroom, use_store=use_store)
+            self.assertEqual(student_ids, [student.id for student in self.students])
+            self.assertEqual([feature_dict(row) for row in X], expected)
+
+        counts = compute_feature_counts(self.classroom.id, [self.students[1].id])
+        self.assertEqual(counts[self.students[1].id]['on_time_count'], 0)
+
+
+class FeatureStoreTests(TestCase):
+    """Snapshots are written when the underlying data changes, never when read."""
+
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(3)]
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        for student in self.students:
+            ClassMembership.objects.create(user=student, classroom=self.classroom)
+        self.assignment = Assignment.objects.create(
+            classroom=self.classroom, title='Essay', created_by=self.teacher,
+            deadline=timezone.now() + timedelta(days=1),
+        )
+        StudentFeatureSnapshot.objects.all().delete()
+        AnalyticsJob.objects.all().delete()
+
+    def grade(self, student, marks):
+        Grade.objects.create(
+            classroom=self.classroom, student=student, assignment=self.assignment,
+            marked_by=self.teacher, marks_obtained=marks,
+        )
+
+    def snapshot_ids(self):
+        return set(StudentFeatureSnapshot.objects.values_list('student_id', flat=True))
+
+    def test_refreshes_of_one_transaction_are_merged(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.grade(self.students[0], 50)
+                self.grade(self.students[1], 70)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.snapshot_ids(), {self.students[0].id, self.students[1].id})
+        self.assertEqual(StudentFeatureSnapshot.objects.get(student=self.students[1]).score_sum, 70)
+        self.assertEqual(AnalyticsJob.objects.count(), 2)
+
+    def test_rolled_back_refreshes_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ZeroDivisionError):
+                with transaction.atomic():
+                    self.grade(self.students[0], 50)
+                    1 / 0
+            with transaction.atomic():
+                self.grade(self.students[1], 70)
+        self.assertEqual(self.snapshot_ids(), {self.students[1].id})
+
+    def test_reading_missing_counts_does_not_write(self):
+        expected = compute_feature_counts(self.classroom.id, [self.students[2].id])
+        self.assertEqual(load_feature_counts(self.classroom.id, [self.students[2].id]), expected)
+        self.assertEqual(self.snapshot_ids(), set())
+
+    def test_joining_stores_a_snapshot(self):
+        newcomer = CustomUser.objects.create_user('newcomer', password=None)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            ClassMembership.objects.create(user=newcomer, classroom=self.classroom)
+        self.assertEqual(self.snapshot_ids(), {newcomer.id})
+
+
+class BatchPredictionTests(TestCase):
+    """Scoring a whole class at once gives the same results as scoring each student."""
+
+    def setUp(self):
+        cache.clear()
+        prediction_cache.clear()
+
+    def test_batch_matches_row_by_row(self):
+        # The pickled scalers were fitted on a DataFrame and warn about plain arrays
+        self.enterContext(warnings.catch_warnings())
+        warnings.filterwarnings('ignore', 'X does not have valid feature names')
+        models = registry.ModelRegistry(use_compiled=False).get()
+        rng = np.random.default_rng(0)
+        X = np.column_stack([
+            rng.uniform(0, 100, 50), rng.uniform(0, 100, 50), rng.uniform(0, 100, 50),
+            rng.uniform(0, 100, 50), rng.integers(0, 20, 50), rng.integers(0, 31, 50),
+        ])
+        levels, risk_scores = predict_risk_batch(X, models)
+        letters, grade_scores, confidences = predict_grade_batch(X, models)
+        for i in range(len(X)):
+            row = X[i:i + 1]
+            row_levels, row_risk_scores = predict_risk_batch(row, models)
+            row_letters, row_grade_scores, row_confidences = predict_grade_batch(row, models)
+            self.assertEqual((levels[i], letters[i]), (row_levels[0], row_letters[0]))
+            self.assertAlmostEqual(risk_scores[i], row_risk_scores[0])
+            self.assertAlmostEqual(grade_scores[i], row_grade_scores[0])
+            self.assertAlmostEqual(confidences[i], row_confidences[0])
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_risk_overview_lists_every_student(self):
+        classroom, student_ids = seed_classroom(12, 6)
+        url = reverse('grades:class_risk', args=[classroom.id])
+        self.client.force_login(classroom.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        rows = response.context['rows']
+        self.assertEqual(sorted(row['student'].id for row in rows), sorted(student_ids))
+        order = [(-RISK_LEVELS.index(row['risk_analysis']['risk_level']), -row['risk_analysis']['risk_score']) for row in rows]
+        self.assertEqual(order, sorted(order))
+        prediction_cache.clear()
+        for row in rows[:3]:
+            single = get_student_analytics(row['student'], classroom)
+            self.assertEqual(single['risk_analysis'], row['risk_analysis'])
+            self.assertEqual(single['grade_analysis'], row['grade_analysis'])
+
+        self.client.force_login(CustomUser.objects.get(id=student_ids[0]))
+        self.assertRedirects(
+            self.client.get(url), reverse('class_detail', args=[classroom.id]), fetch_redirect_response=False
+        )
+
+
+class PredictionCacheTests(SimpleTestCase):
+    """Per-row prediction results are kept in an LRU with a time-to-live."""
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        cache = PredictionCache(ttl=10)
+        with mock.patch('ml.prediction_cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with mock.patch('ml.prediction_cache.time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('ml.prediction_cache.time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_keys_depend_on_fingerprint_and_rounded_features(self):
+        X = np.array([[0.0, 1.0], [-0.0, 1.0 + 1e-9], [0.0, 2.0]])
+        keys = PredictionCache.keys('f1', X)
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+        self.assertNotEqual(keys[0], PredictionCache.keys('f2', X)[0])
+
+    def test_cached_rows_are_not_scored_again(self):
+        prediction_cache.clear()
+        self.addCleanup(prediction_cache.clear)
+        X = np.array([[70.0, 80.0, 90.0, 100.0, 5.0, 2.0]])
+        first = predict_batch(X)
+        with mock.patch('ml.predictions._score_local') as score_local:
+            self.assertEqual(predict_batch(X), first)
+        score_local.assert_not_called()
+
+    def test_cleared_when_models_reload(self):
+        self.addCleanup(registry.registry.clear)
+        prediction_cache.set('key', 'value')
+        registry.registry.clear()
+        registry.registry.get()
+        self.assertIsNone(prediction_cache.get('key'))
+
+
+def is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+class CompiledModelTests(SimpleTestCase):
+    """The compiled models are memory-mapped from the export and score like the pickles."""
+
+    path = os.path.join(registry.MODELS_DIR, COMPILED_FILE)
+
+    def test_arrays_are_mapped_read_only(self):
+        mapped = mmap_npz(self.path)
+        with np.load(self.path) as archive:
+            self.assertEqual(set(mapped), set(archive.files))
+            for name in archive.files:
+                np.testing.assert_array_equal(mapped[name], archive[name])
+        self.assertTrue(is_memory_mapped(mapped['risk_threshold']))
+        self.assertFalse(mapped['risk_threshold'].flags.writeable)
+
+        models = load_compiled(self.path)
+        self.assertTrue(is_memory_mapped(models['risk_model'].trees.children))
+
+    def test_mapped_and_loaded_models_score_alike(self):
+        rng = np.random.default_rng(1)
+        X = rng.uniform(0, 100, (200, 6))
+        mapped, loaded = load_compiled(self.path), load_compiled(self.path, mmap=False)
+        for name, method in (('risk', 'predict_proba'), ('grade', 'predict')):
+            X_scaled = mapped[f'{name}_scaler'].transform(X)
+            np.testing.assert_array_equal(X_scaled, loaded[f'{name}_scaler'].transform(X))
+            np.testing.assert_array_equal(
+                getattr(mapped[f'{name}_model'], method)(X_scaled),
+                getattr(loaded[f'{name}_model'], method)(X_scaled),
+            )
+
+    def test_compressed_export_is_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, COMPILED_FILE)
+            np.savez_compressed(path, values=np.arange(10))
+            with self.assertRaises(ValueError):
+                mmap_npz(path)
+
+
+class InferenceServerTests(SimpleTestCase):
+    """The inference server scores requests in shared batches over a Unix socket."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A long wait so concurrent requests end up in the same batch
+        self.server = InferenceServer(os.path.join(directory, 'inference.sock'), max_wait=0.2)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = InferenceClient(self.server.path)
+
+    def test_request_with_wrong_columns_is_rejected_alone(self):
+        X = np.array([[70.0, 80.0, 90.0, 100.0, 5.0, 2.0], [20.0, 30.0, 10.0, 35.0, 5.0, 30.0]])
+        results = {}
+
+        def predict(name, X):
+            try:
+                results[name] = self.client.predict(X)
+            except InferenceError as e:
+                results[name] = e
+
+        threads = [
+            threading.Thread(target=predict, args=('good', X)),
+            threading.Thread(target=predict, args=('bad', X[:, :5])),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsInstance(results['bad'], InferenceError)
+        self.assertIn('expected 6 feature columns, got 5', str(results['bad']))
+        fingerprint, risk_index, risk_scores, grade_scores = results['good']
+        models = load_local_models()
+        self.assertEqual(fingerprint, models['fingerprint'])
+        expected_index, expected_scores = risk_indices_batch(X, models)
+        np.testing.assert_array_equal(risk_index, expected_index)
+        np.testing.assert_allclose(risk_scores, expected_scores)
+        np.testing.assert_allclose(grade_scores, grade_scores_batch(X, models))
+
+        # The connection that sent the bad request keeps working
+        self.assertTrue(self.client.available())
+        self.assertEqual(len(self.client.predict(X)[1]), 2)
+
+
+def fake_analytics(classroom_id, student_ids):
+    return {student_id: {'performance_trend': 'Stable'} for student_id in student_ids}
+
+
+@mock.patch.object(analytics_queue, 'model_version', lambda: 'v1')
+class AnalyticsQueueTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(4)]
+        self.classrooms = [
+            ClassRoom.objects.create(name=f'Class {i}', owner=self.teacher, invite_code=f'class{i}')
+            for i in range(2)
+        ]
+        analytics_queue.enqueue_analytics(self.classrooms[0].id, [student.id for student in self.students])
+        analytics_queue.enqueue_analytics(self.classrooms[1].id, [self.students[0].id])
+
+    def test_claim_takes_one_classroom_up_to_batch_size(self):
+        classroom_id, jobs, _ = analytics_queue.claim_jobs('worker-a', batch_size=3)
+        self.assertEqual(classroom_id, self.classrooms[0].id)
+        self.assertEqual(len(jobs), 3)
+
+        # Claimed jobs are skipped by other workers until their lock expires
+        _, other_jobs, _ = analytics_queue.claim_jobs('worker-b', batch_size=10)
+        self.assertFalse({job_id for job_id, _ in jobs} & {job_id for job_id, _ in other_jobs})
+
+        AnalyticsJob.objects.filter(claimed_by='worker-a').update(locked_until=timezone.now() - timedelta(seconds=1))
+        _, reclaimed, _ = analytics_queue.claim_jobs('worker-c', batch_size=10)
+        self.assertEqual({job_id for job_id, _ in reclaimed}, {job_id for job_id, _ in jobs})
+
+    def test_claim_returns_only_the_jobs_it_claimed(self):
+        # A batch left claimed by an earlier, failed iteration of the same worker
+        _, stale, _ = analytics_queue.claim_jobs('worker-a', batch_size=2)
+        classroom_id, jobs, _ = analytics_queue.claim_jobs('worker-a', batch_size=10)
+        self.assertEqual(classroom_id, self.classrooms[0].id)
+        self.assertEqual(len(jobs), 2)
+        self.assertFalse({job_id for job_id, _ in stale} & {job_id for job_id, _ in jobs})
+
+    @mock.patch.object(analytics_queue, 'get_classroom_analytics', side_effect=fake_analytics)
+    def test_run_worker_releases_claims_after_an_error(self, _):
+        class Stop(Exception):
+            pass
+
+        def claim_then_fail(worker_id, batch_size, lock_seconds, log):
+            analytics_queue.claim_jobs(worker_id, batch_size, lock_seconds)
+            raise OperationalError('gone')
+
+        with mock.patch.object(analytics_queue, '_work_once', side_effect=claim_then_fail), \
+                mock.patch.object(analytics_queue.time, 'sleep', side_effect=Stop):
+            with self.assertRaises(Stop):
+                analytics_queue.run_worker(poll_interval=0)
+        self.assertFalse(AnalyticsJob.objects.exclude(claimed_by='').exists())
+        # The released jobs are picked up by the next pass right away
+        self.assertEqual(analytics_queue.run_worker(once=True), 5)
+
+    @mock.patch.object(analytics_queue, 'get_classroom_analytics', side_effect=fake_analytics)
+    def test_process_stores_analytics_and_deletes_jobs(self, _):
+        classroom_id, jobs, claimed_at = analytics_queue.claim_jobs('worker-a')
+        # Enqueued again while being processed: kept for another pass
+        analytics_queue.enqueue_analytics(classroom_id, [self.students[0].id])
+
+        self.assertEqual(analytics_queue.process_jobs('worker-a', classroom_id, jobs, claimed_at), len(jobs))
+        self.assertEqual(StudentAnalytics.objects.filter(classroom_id=classroom_id, model_version='v1').count(), 4)
+        remaining = AnalyticsJob.objects.filter(classroom_id=classroom_id)
+        self.assertEqual(list(remaining.values_list('student_id', 'claimed_by')), [(self.students[0].id, '')])
+
+    @mock.patch.object(analytics_queue, 'get_classroom_analytics', side_effect=RuntimeError('no models'))
+    def test_failed_batch_is_retried_later_up_to_max_attempts(self, _):
+        classroom_id, jobs, claimed_at = analytics_queue.claim_jobs('worker-a')
+        self.assertEqual(analytics_queue.process_jobs('worker-a', classroom_id, jobs, claimed_at), 0)
+
+        failed = AnalyticsJob.objects.filter(classroom_id=classroom_id)
+        self.assertTrue(all(job.attempts == 1 and job.last_error and not job.claimed_by for job in failed))
+        self.assertEqual(analytics_queue.claim_jobs('worker-b')[0], self.classrooms[1].id)
+
+        failed.update(available_at=timezone.now(), attempts=analytics_queue.MAX_ATTEMPTS)
+        AnalyticsJob.objects.filter(classroom=self.classrooms[1]).delete()
+        self.assertIsNone(analytics_queue.claim_jobs('worker-c'))
+
+    @mock.patch.object(analytics_queue, 'get_classroom_analytics', side_effect=fake_analytics)
+    def test_run_worker_once_drains_the_queue(self, _):
+        self.assertEqual(analytics_queue.run_worker(once=True), 5)
+        self.assertFalse(AnalyticsJob.objects.exists())
+        self.assertEqual(StudentAnalytics.objects.count(), 5)
+
+    def test_run_worker_survives_database_errors(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(analytics_queue, 'claim_jobs', side_effect=[OperationalError('gone'), None]) as claim, \
+                mock.patch.object(analytics_queue.time, 'sleep', side_effect=[None, Stop]):
+            with self.assertRaises(Stop):
+                analytics_queue.run_worker(poll_interval=0)
+        self.assertEqual(claim.call_count, 2)
@@ -5,7 +5,13 @@ app_name = 'grades'
 
 urlpatterns = [
     path('manage/<int:class_id>/', views.manage_grades, name='manage_grades'),
+    path('gradebook/<int:class_id>/', views.gradebook, name='gradebook'),
     path('assign/<int:class_id>/<int:assignment_id>/', views.assign_grade, name='assign_grade'),
+    path('assign-bulk/<int:class_id>/<int:assignment_id>/', views.assign_grades_bulk, name='assign_grades_bulk'),
+    path('import/<int:class_id>/<int:assignment_id>/', views.import_grades, name='import_grades'),
     path('my-grades/', views.student_grades, name='student_grades'),
     path('summary/<int:class_id>/', views.class_grades_summary, name='class_summary'),
+    path('risk/<int:class_id>/', views.class_risk_overview, name='class_risk'),
+    path('ml/metrics/', views.ml_model_metrics, name='ml_model_metrics'),
+    path('ml/drift/', views.ml_feature_drift, name='ml_feature_drift'),
 ]
\ No newline at end of file
@@ -1,12 +1,19 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Count, Avg, Q
-from classes.models import ClassRoom
+from classes.models import ClassRoom, ClassMembership
 from assignments.models import Assignment, Submission
-from .models import Grade
+from .models import Grade, GradeStatistics
+from .gradebook import Gradebook
+from .bulk import upsert_grades, read_grade_csv
+from .stats import student_statistics
 from django.http import JsonResponse
+from django.urls import reverse
+import io
+import json
 
 @login_required
 def manage_grades(request, class_id):
@@ -32,11 +39,12 @@ def manage_grades(request, class_id):
         submissions = Submission.objects.filter(assignment=selected_assignment).select_related('student').order_by('student__username')
         
         # Add grade information to submissions
+        grades_by_student = {
+            grade.student_id: grade
+            for grade in Grade.objects.filter(assignment=selected_assignment)
+        }
         for submission in submissions:
-            try:
-                submission.grade = Grade.objects.get(student=submission.student, assignment=selected_assignment)
-            except Grade.DoesNotExist:
-                submission.grade = None
+            submission.grade = grades_by_student.get(submission.student_id)
     
     context = {
         'classroom': classroom,
@@ -47,6 +55,30 @@ def manage_grades(request, class_id):
     
     return render(request, 'grades/manage_grades.html', context)
 
+@login_required
+def gradebook(request, class_id):
+    """Whole-class gradebook: every participant against every assignment"""
+    classroom = get_object_or_404(ClassRoom, id=class_id)
+    
+    # Check if user is the class owner
+    if request.user != classroom.owner:
+        messages.error(request, "You don't have permission to view this gradebook.")
+        return redirect('class_detail', class_id=class_id)
+    
+    book = Gradebook(classroom)
+    page_obj = book.page(request.GET.get('page'))
+    
+    context = {
+        'classroom': classroom,
+        'assignments': book.assignments,
+        'assignment_summaries': book.assignment_summaries(),
+        'page_obj': page_obj,
+        'total_students': len(book.students),
+        'class_average': book.class_average,
+    }
+    
+    return render(request, 'grades/gradebook.html', context)
+
 @login_required
 def assign_grade(request, class_id, assignment_id):
     """AJAX view to assign grade to a student"""
@@ -95,6 +127,62 @@ def assign_grade(request, class_id, assignment_id):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
 
+@login_required
+def assign_grades_bulk(request, class_id, assignment_id):
+    """AJAX view to assign grades to many students in one request"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    classroom = get_object_or_404(ClassRoom, id=class_id)
+    assignment = get_object_or_404(Assignment, id=assignment_id, classroom=classroom)
+    
+    # Check if user is the class owner
+    if request.user != classroom.owner:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    try:
+        entries = json.loads(request.body)['grades']
+        rows = [
+            (index, entry.get('student_id', ''), entry.get('percentage', ''))
+            for index, entry in enumerate(entries, start=1)
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Expected {"grades": [{"student_id": ..., "percentage": ...}]}'}, status=400)
+    
+    result = upsert_grades(classroom, assignment, rows, marked_by=request.user)
+    return JsonResponse({'success': True, **result})
+
+@login_required
+def import_grades(request, class_id, assignment_id):
+    """Upload a CSV of student,marks rows for an assignment"""
+    classroom = get_object_or_404(ClassRoom, id=class_id)
+    assignment = get_object_or_404(Assignment, id=assignment_id, classroom=classroom)
+    
+    # Check if user is the class owner
+    if request.user != classroom.owner:
+        messages.error(request, "You don't have permission to manage grades for this class.")
+        return redirect('class_detail', class_id=class_id)
+    
+    redirect_url = f"{reverse('grades:manage_grades', args=[class_id])}?assignment_id={assignment_id}"
+    upload = request.FILES.get('grades_file')
+    if request.method != 'POST' or not upload:
+        messages.error(request, 'Please select a CSV file to import.')
+        return redirect(redirect_url)
+    
+    try:
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+        result = upsert_grades(classroom, assignment, read_grade_csv(lines), marked_by=request.user)
+    except (ValueError, UnicodeDecodeError) as e:
+        messages.error(request, f'Could not import grades: {e}')
+        return redirect(redirect_url)
+    
+    messages.success(request, f"Imported grades: {result['created']} created, {result['updated']} updated.")
+    for error in result['errors'][:20]:
+        messages.warning(request, f"Row {error['row']} ({error['student']}): {error['error']}")
+    if len(result['errors']) > 20:
+        messages.warning(request, f"{len(result['errors']) - 20} more rows were skipped.")
+    return redirect(redirect_url)
+
 @login_required
 def student_grades(request):
     """View for students to see their grades"""
@@ -108,51 +196,24 @@ def student_grades(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Calculate statistics
-    total_grades = grades.count()
-    passed_grades = grades.filter(is_passed=True).count()
-    average_percentage = 0
-    if total_grades > 0:
-        total_percentage = sum([grade.get_percentage() for grade in grades])
-        average_percentage = round(total_percentage / total_grades, 2)
-    
-    # Get grade distribution
-    grade_distribution = {}
-    for grade in grades:
-        letter = grade.grade
-        grade_distribution[letter] = grade_distribution.get(letter, 0) + 1
-    
-    # ML Analytics - Get analytics for each classroom
+    # Statistics come from one aggregate query, cached per student
+    statistics = student_statistics(request.user)
+    
+    # ML Analytics - precomputed by the analytics worker for each classroom
     ml_analytics = {}
     try:
-        from ml.predictions import get_student_analytics
-        from classes.models import ClassMembership
+        from ml.analytics_queue import student_analytics
         
         # Get all classrooms where student is enrolled
-        memberships = ClassMembership.objects.filter(user=request.user, role='participant')
-        
-        for membership in memberships:
-            try:
-                analytics = get_student_analytics(request.user, membership.classroom)
-                ml_analytics[membership.classroom.id] = analytics
-            except Exception as e:
-                print(f"ML Analytics error for {membership.classroom.name}: {e}")
-                ml_analytics[membership.classroom.id] = {
-                    'error': 'Analytics unavailable',
-                    'performance_trend': 'Unknown'
-                }
+        memberships = ClassMembership.objects.filter(user=request.user, role='participant').select_related('classroom')
+        ml_analytics = student_analytics(request.user, [membership.classroom for membership in memberships])
     except Exception as e:
         print(f"ML Analytics module error: {e}")
         ml_analytics = {}
     
     context = {
         'page_obj': page_obj,
-        'total_grades': total_grades,
-        'passed_grades': passed_grades,
-        'failed_grades': total_grades - passed_grades,
-        'pass_rate': (passed_grades / total_grades * 100) if total_grades > 0 else 0,
-        'average_percentage': average_percentage,
-        'grade_distribution': grade_distribution,
+        **statistics,
         'ml_analytics': ml_analytics,
     }
     
@@ -168,45 +229,108 @@ def class_grades_summary(request, class_id):
         messages.error(request, "You don't have permission to view this page.")
         return redirect('class_detail', class_id=class_id)
     
-    # Get all grades for assignments in this class
-    grades = Grade.objects.filter(classroom=classroom).select_related(
-        'student', 'assignment', 'marked_by'
-    ).order_by('-graded_at')
-    
-    # Get assignments for this class
-    assignments = Assignment.objects.filter(classroom=classroom).order_by('-created_at')
+    # Running totals are maintained by grades.stats, so this reads O(1) rows
+    class_stats = GradeStatistics.objects.filter(
+        classroom=classroom, assignment__isnull=True
+    ).first() or GradeStatistics(classroom=classroom)
+    assignment_stats = {
+        stats.assignment_id: stats
+        for stats in GradeStatistics.objects.filter(classroom=classroom, assignment__isnull=False)
+    }
     
-    # Add submission and grade counts manually
+    # Get assignments for this class with submission and grade counts
+    assignments = Assignment.objects.filter(classroom=classroom).annotate(
+        total_submissions=Count('submissions')
+    ).order_by('-created_at')
     for assignment in assignments:
-        assignment.total_submissions = assignment.submissions.count()
-        assignment.total_grades = Grade.objects.filter(assignment=assignment).count()
+        stats = assignment_stats.get(assignment.id)
+        assignment.total_grades = stats.count if stats else 0
+    
+    recent_grades = Grade.objects.filter(classroom=classroom).select_related(
+        'student', 'assignment', 'marked_by'
+    ).order_by('-graded_at')[:10]
     
-    # Calculate class statistics
     total_students = classroom.classmembership_set.filter(role='participant').count()
-    total_grades = grades.count()
-    passed_grades = grades.filter(is_passed=True).count()
-    average_percentage = 0
-    if total_grades > 0:
-        total_percentage = sum([grade.get_percentage() for grade in grades])
-        average_percentage = round(total_percentage / total_grades, 2)
-    
-    # Grade distribution for the class
-    grade_distribution = {}
-    for grade in grades:
-        letter = grade.grade
-        grade_distribution[letter] = grade_distribution.get(letter, 0) + 1
     
     context = {
         'classroom': classroom,
         'assignments': assignments,
         'total_students': total_students,
-        'total_grades': total_grades,
-        'passed_grades': passed_grades,
-        'failed_grades': total_grades - passed_grades,
-        'pass_rate': (passed_grades / total_grades * 100) if total_grades > 0 else 0,
-        'average_percentage': average_percentage,
-        'grade_distribution': grade_distribution,
-        'recent_grades': grades[:10],  # Last 10 grades
+        'total_grades': class_stats.count,
+        'passed_grades': class_stats.passed_count,
+        'failed_grades': class_stats.failed_count,
+        'pass_rate': class_stats.pass_rate,
+        'average_percentage': class_stats.average,
+        'grade_distribution': class_stats.distribution,
+        'recent_grades': recent_grades,  # Last 10 grades
     }
     
     return render(request, 'grades/class_summary.html', context)
+
+@login_required
+def class_risk_overview(request, class_id):
+    """View for class owners to see ML risk and grade predictions for every student"""
+    classroom = get_object_or_404(ClassRoom, id=class_id)
+    
+    # Check if user is the class owner
+    if request.user != classroom.owner:
+        messages.error(request, "You don't have permission to view this page.")
+        return redirect('class_detail', class_id=class_id)
+    
+    from ml.predictions import RISK_LEVELS, get_classroom_analytics
+    
+    memberships = ClassMembership.objects.filter(
+        classroom=classroom, role='participant'
+    ).select_related('user').order_by('user__username')
+    students = {membership.user_id: membership.user for membership in memberships}
+    analytics = get_classroom_analytics(classroom, list(students))
+    
+    # Highest risk first, then highest risk score
+    risk_order = {level: index for index, level in enumerate(RISK_LEVELS)}
+    rows = sorted(
+        ({'student': students[student_id], **result} for student_id, result in analytics.items()),
+        key=lambda row: (
+            -risk_order.get(row['risk_analysis']['risk_level'], 0),
+            -row['risk_analysis']['risk_score'],
+        ),
+    )
+    risk_counts = {level: 0 for level in reversed(RISK_LEVELS)}
+    for row in rows:
+        risk_counts[row['risk_analysis']['risk_level']] += 1
+    
+    context = {
+        'classroom': classroom,
+        'rows': rows,
+        'risk_counts': risk_counts,
+    }
+    
+    return render(request, 'grades/class_risk.html', context)
+
+@staff_member_required
+def ml_model_metrics(request):
+    """Staff-only JSON view of the loaded ML model version and load timings"""
+    from ml.predictions import load_models, model_metrics
+    
+    load_models()
+    return JsonResponse(model_metrics())
+
+@staff_member_required
+def ml_feature_drift(request):
+    """Staff-only page comparing live ML feature histograms with the training reference"""
+    from ml.drift import DEFAULT_WINDOW_DAYS, drift_monitor, drift_report
+
+    try:
+        days = max(1, int(request.GET.get('days', DEFAULT_WINDOW_DAYS)))
+    except ValueError:
+        days = DEFAULT_WINDOW_DAYS
+    source = request.GET.get('source', 'serving')
+    if source not in ('serving', 'batch', 'all'):
+        source = 'serving'
+
+    drift_monitor.flush()
+    context = {
+        'report': drift_report(days, None if source == 'all' else source),
+        'days': days,
+        'source': source,
+    }
+    return render(request, 'grades/ml_drift.html', context)
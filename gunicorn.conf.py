@@ -0,0 +1,57 @@
+"""Gunicorn settings, read automatically when gunicorn starts in the project root."""
+import os
+import subprocess
+import sys
+import threading
+
+# Import the application, and warm up the ML models (see LMS/wsgi.py), in the
+# master before forking so the workers share those pages instead of each
+# loading its own copy. The number of workers comes from WEB_CONCURRENCY.
+preload_app = True
+
+# The background workers run next to the web workers in the same container,
+# started and stopped with the master: the analytics worker (see
+# ml/analytics_queue.py) and the notification worker (see
+# notification/fanout.py). Set ANALYTICS_WORKER=0 or NOTIFICATION_WORKER=0
+# when one runs elsewhere. The master checks on them every few seconds and
+# restarts any that exited.
+BACKGROUND_WORKERS = {
+    'ANALYTICS_WORKER': 'run_analytics_worker',
+    'NOTIFICATION_WORKER': 'run_notification_worker',
+}
+SUPERVISE_SECONDS = 5
+_background_workers = {}
+_stopping = threading.Event()
+_supervisor = None
+
+
+def _start(command):
+    return subprocess.Popen([sys.executable, 'manage.py', command])
+
+
+def _supervise(server):
+    while not _stopping.wait(SUPERVISE_SECONDS):
+        for command, worker in list(_background_workers.items()):
+            if worker.poll() is not None and not _stopping.is_set():
+                server.log.error('Background worker %s exited, restarting', command)
+                _background_workers[command] = _start(command)
+
+
+def when_ready(server):
+    global _supervisor
+    for env, command in BACKGROUND_WORKERS.items():
+        if os.environ.get(env, '1') != '0':
+            _background_workers[command] = _start(command)
+    if _background_workers:
+        _supervisor = threading.Thread(target=_supervise, args=(server,), name='background-workers', daemon=True)
+        _supervisor.start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _supervisor is not None:
+        _supervisor.join()
+    for worker in _background_workers.values():
+        worker.terminate()
+    for worker in _background_workers.values():
+        worker.wait(timeout=30)
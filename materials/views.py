@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.contrib import messages
 from .models import Material
 from classes.models import ClassRoom
 from django.contrib.auth.decorators import login_required
@@ -21,7 +22,7 @@ def upload_material(request, class_id):
         notification_title = f"New Material: {title}"
         notification_message = f"A new material '{title}' has been uploaded to {classroom.name}"
         
-        Notification.create_notifications_for_class(
+        notifications_sent = Notification.create_notifications_for_class(
             classroom=classroom,
             sender=request.user,
             notification_type='material',
@@ -30,6 +31,8 @@ def upload_material(request, class_id):
             content_object=material
         )
         
+        messages.success(request, f'Material "{title}" uploaded successfully! Notifying {notifications_sent} students.')
+        
         return redirect('class_detail', class_id=class_id)
     return redirect('class_detail', class_id=class_id)
 
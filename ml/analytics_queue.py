@@ -0,0 +1,264 @@
+"""
+Database-backed queue of student analytics recomputes.
+
+Grade, submission and assignment writes enqueue an ``AnalyticsJob`` per
+affected (student, classroom) once their feature snapshots are refreshed.
+``run_worker`` claims due jobs one classroom at a time, scores the claimed
+students with one batched model call and stores the results in
+``StudentAnalytics``, which the student grades page reads. Jobs are claimed
+with a conditional UPDATE and a lock expiry, so several workers can share the
+queue and a crashed worker's jobs are picked up again.
+"""
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from ml.predictions import get_classroom_analytics, load_models
+
+BATCH_SIZE = 500
+LOCK_SECONDS = 300
+POLL_SECONDS = 2.0
+MAX_ATTEMPTS = 5
+RETRY_SECONDS = 30
+ENQUEUE_CHUNK_SIZE = 1000
+
+
+def model_version():
+    """Fingerprint of the models in service, or '' when there are none."""
+    models = load_models()
+    return models['fingerprint'] if models else ''
+
+
+def enqueue_analytics(classroom_id, student_ids):
+    """
+    Queue a recompute for each student of the classroom. A job already
+    queued for the pair is made due now; if a worker holds it, the worker
+    will leave it queued for another pass.
+    """
+    from grades.models import AnalyticsJob
+
+    now = timezone.now()
+    AnalyticsJob.objects.bulk_create(
+        [
+            AnalyticsJob(student_id=student_id, classroom_id=classroom_id, enqueued_at=now, available_at=now)
+            for student_id in student_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'classroom'],
+        update_fields=['enqueued_at', 'available_at', 'attempts', 'last_error'],
+        batch_size=ENQUEUE_CHUNK_SIZE,
+    )
+
+
+def enqueue_stale(max_age=None):
+    """
+    Queue every participant whose stored analytics are missing, were computed
+    by other models, or (with ``max_age``) are older than that timedelta.
+    Returns the number of jobs queued.
+    """
+    from classes.models import ClassMembership
+    from grades.models import StudentAnalytics
+
+    fresh = StudentAnalytics.objects.filter(
+        student_id=OuterRef('user_id'), classroom_id=OuterRef('classroom_id'), model_version=model_version(),
+    )
+    if max_age is not None:
+        fresh = fresh.filter(computed_at__gte=timezone.now() - max_age)
+    pairs = (
+        ClassMembership.objects.filter(role='participant')
+        .filter(~Exists(fresh))
+        .order_by('classroom_id', 'user_id')
+        .values_list('classroom_id', 'user_id')
+    )
+
+    queued, classroom_id, student_ids = 0, None, []
+    for pair_classroom_id, student_id in pairs.iterator(chunk_size=ENQUEUE_CHUNK_SIZE):
+        if pair_classroom_id != classroom_id or len(student_ids) >= ENQUEUE_CHUNK_SIZE:
+            if student_ids:
+                enqueue_analytics(classroom_id, student_ids)
+                queued += len(student_ids)
+            classroom_id, student_ids = pair_classroom_id, []
+        student_ids.append(student_id)
+    if student_ids:
+        enqueue_analytics(classroom_id, student_ids)
+        queued += len(student_ids)
+    return queued
+
+
+def _claimable(now):
+    from grades.models import AnalyticsJob
+
+    return AnalyticsJob.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        available_at__lte=now,
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def claim_jobs(worker_id, batch_size=BATCH_SIZE, lock_seconds=LOCK_SECONDS):
+    """
+    Claim up to ``batch_size`` due jobs of the classroom with the oldest due
+    job. Returns ``(classroom_id, jobs, claimed_at)``, with ``jobs`` a list of
+    ``(job_id, student_id)``, or None when nothing is due.
+    """
+    from grades.models import AnalyticsJob
+
+    now = timezone.now()
+    classroom_id = _claimable(now).order_by('available_at').values_list('classroom_id', flat=True).first()
+    if classroom_id is None:
+        return None
+    ids = list(
+        _claimable(now).filter(classroom_id=classroom_id)
+        .order_by('available_at').values_list('id', flat=True)[:batch_size]
+    )
+    # Another worker may have claimed some of them since; the lock condition
+    # makes the UPDATE skip those
+    _claimable(now).filter(id__in=ids).update(
+        claimed_by=worker_id, locked_until=now + timedelta(seconds=lock_seconds)
+    )
+    # Only rows picked above: claims this worker left behind after an error
+    # are not part of this batch
+    jobs = list(AnalyticsJob.objects.filter(id__in=ids, claimed_by=worker_id).values_list('id', 'student_id'))
+    return classroom_id, jobs, now
+
+
+def release_claims(worker_id):
+    """Put every job held by the worker back in the queue."""
+    from grades.models import AnalyticsJob
+
+    return AnalyticsJob.objects.filter(claimed_by=worker_id).update(claimed_by='', locked_until=None)
+
+
+def store_analytics(classroom_id, analytics, version, computed_at=None):
+    """Save analytics (a dict of student id -> analytics) for a classroom."""
+    from grades.models import StudentAnalytics
+
+    computed_at = computed_at or timezone.now()
+    StudentAnalytics.objects.bulk_create(
+        [
+            StudentAnalytics(
+                student_id=student_id, classroom_id=classroom_id, analytics=result,
+                model_version=version, computed_at=computed_at,
+            )
+            for student_id, result in analytics.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'classroom'],
+        update_fields=['analytics', 'model_version', 'computed_at'],
+        batch_size=ENQUEUE_CHUNK_SIZE,
+    )
+
+
+def process_jobs(worker_id, classroom_id, jobs, claimed_at):
+    """
+    Recompute and store the analytics for claimed jobs, then delete the jobs
+    that were not enqueued again while this ran and release the rest. A
+    failure puts the jobs back with a delay, up to MAX_ATTEMPTS times.
+    """
+    from grades.models import AnalyticsJob
+
+    claimed = AnalyticsJob.objects.filter(id__in=[job_id for job_id, _ in jobs], claimed_by=worker_id)
+    try:
+        version = model_version()
+        store_analytics(classroom_id, get_classroom_analytics(classroom_id, [student_id for _, student_id in jobs]), version)
+    except Exception as e:
+        print(f"Error computing analytics for classroom {classroom_id}: {e}")
+        claimed.update(
+            claimed_by='', locked_until=None, attempts=F('attempts') + 1,
+            last_error=traceback.format_exc()[-2000:],
+            available_at=timezone.now() + timedelta(seconds=RETRY_SECONDS),
+        )
+        return 0
+
+    # Features are refreshed before a job is enqueued, so a job enqueued
+    # before the claim is covered by what was just computed
+    claimed.filter(enqueued_at__lte=claimed_at).delete()
+    claimed.update(claimed_by='', locked_until=None)
+    return len(jobs)
+
+
+def _work_once(worker_id, batch_size, lock_seconds, log):
+    """Claim and process one batch; returns the analytics computed, or None when nothing is due."""
+    close_old_connections()
+    claim = claim_jobs(worker_id, batch_size, lock_seconds)
+    if claim is None:
+        return None
+    classroom_id, jobs, claimed_at = claim
+    if not jobs:
+        return 0
+    started = time.perf_counter()
+    done = process_jobs(worker_id, classroom_id, jobs, claimed_at)
+    if log:
+        log(f'Classroom {classroom_id}: {done}/{len(jobs)} students in {time.perf_counter() - started:.3f}s')
+    return done
+
+
+def run_worker(batch_size=BATCH_SIZE, poll_interval=POLL_SECONDS, once=False, lock_seconds=LOCK_SECONDS, log=None):
+    """
+    Process jobs until stopped, or with ``once`` until none are due.
+    Returns the number of analytics computed. Errors (e.g. the database
+    going away) are logged, the worker's claims released and the loop
+    retried after ``poll_interval``; with ``once`` they are raised.
+    """
+    worker_id = uuid.uuid4().hex
+    processed = 0
+    while True:
+        try:
+            done = _work_once(worker_id, batch_size, lock_seconds, log)
+        except Exception as e:
+            if once:
+                raise
+            print(f"Error in analytics worker, retrying: {e}")
+            try:
+                release_claims(worker_id)
+            except Exception:
+                # Still unreachable; the claims expire after lock_seconds
+                pass
+            time.sleep(poll_interval)
+            continue
+        if done is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        processed += done
+
+
+def student_analytics(student, classrooms):
+    """
+    Stored analytics of a student for each classroom, as a dict of classroom
+    id -> analytics. Classrooms without any are computed now and stored;
+    analytics from other models are returned as they are and queued again.
+    """
+    from grades.models import StudentAnalytics
+
+    classrooms = list(classrooms)
+    rows = StudentAnalytics.objects.filter(student=student, classroom__in=classrooms).values_list(
+        'classroom_id', 'analytics', 'model_version'
+    )
+    version = model_version()
+    results = {}
+    for classroom_id, analytics, row_version in rows:
+        results[classroom_id] = analytics
+        if row_version != version:
+            enqueue_analytics(classroom_id, [student.id])
+
+    for classroom in classrooms:
+        if classroom.id in results:
+            continue
+        try:
+            analytics = get_classroom_analytics(classroom, [student.id])
+            store_analytics(classroom.id, analytics, version)
+            results[classroom.id] = analytics[student.id]
+        except Exception as e:
+            print(f"ML Analytics error for {classroom.name}: {e}")
+            results[classroom.id] = {
+                'error': 'Analytics unavailable',
+                'performance_trend': 'Unknown'
+            }
+    return results
@@ -0,0 +1,215 @@
+"""Latency, query and memory benchmarks for the student analytics path."""
+import platform
+import os
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ml.features import collect_classroom_features
+from ml.prediction_cache import prediction_cache
+from ml.predictions import analytics_for_matrix, get_classroom_analytics, get_student_analytics, model_metrics
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+DEFAULT_ASSIGNMENTS = 10
+DEFAULT_REPEAT = 20
+
+
+def seed_classroom(n_students, n_assignments=DEFAULT_ASSIGNMENTS, seed=0):
+    """
+    Create a classroom with ``n_students`` participants, assignments with
+    deadlines around today, and submissions and grades for most of them.
+    Returns ``(classroom, student_ids)``.
+    """
+    from assignments.models import Assignment, Submission
+    from classes.models import ClassMembership, ClassRoom
+    from grades.models import Grade
+    from ml.feature_store import refresh_feature_snapshots
+    from users.models import CustomUser
+
+    rng = random.Random(seed)
+    prefix = f'bench{n_students}x{n_assignments}'
+    teacher = CustomUser.objects.create_user(f'{prefix}-teacher', password=None)
+    classroom = ClassRoom.objects.create(name=prefix, owner=teacher, invite_code=prefix[:20])
+    students = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}-{i}') for i in range(n_students)
+    ])
+    ClassMembership.objects.bulk_create([
+        ClassMembership(user=student, classroom=classroom) for student in students
+    ])
+    now = timezone.now()
+    assignments = Assignment.objects.bulk_create([
+        Assignment(classroom=classroom, title=f'Assignment {j}', created_by=teacher,
+                   deadline=now + timedelta(days=j - n_assignments // 2))
+        for j in range(n_assignments)
+    ])
+
+    submissions, grades = [], []
+    for student in students:
+        diligence = rng.random()
+        for assignment in assignments:
+            if rng.random() < 0.5 + diligence / 2:
+                submissions.append(Submission(assignment=assignment, student=student, file='benchmark.pdf'))
+                if rng.random() < 0.8:
+                    grade = Grade(classroom=classroom, student=student, assignment=assignment, marked_by=teacher,
+                                  marks_obtained=round(rng.uniform(20, 100) * (0.5 + diligence / 2), 2))
+                    grade.calculate_grade()
+                    grades.append(grade)
+    Submission.objects.bulk_create(submissions, batch_size=5000)
+    Grade.objects.bulk_create(grades, batch_size=5000)
+
+    # Bulk inserts skip the signals that keep the feature store current
+    refresh_feature_snapshots(classroom.id)
+    return classroom, [student.id for student in students]
+
+
+def timing_stats(seconds):
+    """Summary of a list of durations, in milliseconds."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        'runs': len(ms),
+        'mean': round(float(ms.mean()), 3),
+        'median': round(float(np.median(ms)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'min': round(float(ms.min()), 3),
+        'max': round(float(ms.max()), 3),
+    }
+
+
+def _timed(fn, runs, before=None):
+    durations = []
+    for _ in range(runs):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return timing_stats(durations)
+
+
+def _queries(fn):
+    with CaptureQueriesContext(connection) as queries:
+        fn()
+    return len(queries)
+
+
+def _peak_memory_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_classroom(classroom, student_ids, repeat=DEFAULT_REPEAT, seed=0):
+    """Measure every stage of the analytics path for one seeded classroom."""
+    from users.models import CustomUser
+
+    rng = random.Random(seed)
+    students = rng.choices(student_ids, k=repeat)
+    users = CustomUser.objects.in_bulk(students)
+    student_iter = iter(students * 2)
+    cold = prediction_cache.clear
+
+    def student_analytics():
+        get_student_analytics(users[next(student_iter)], classroom)
+
+    _, X_class = collect_classroom_features(classroom)
+    X_student = X_class[:1]
+    result = {
+        'students': len(student_ids),
+        'student_analytics': {
+            'latency_ms': _timed(student_analytics, repeat, before=cold),
+            'warm_latency_ms': _timed(student_analytics, repeat),
+            'queries': _queries(lambda: get_classroom_analytics(classroom, students[:1])),
+        },
+        'feature_extraction': {
+            'student_ms': _timed(lambda: collect_classroom_features(classroom, students[:1]), repeat),
+            'classroom_ms': _timed(lambda: collect_classroom_features(classroom), max(1, repeat // 4)),
+            'raw_classroom_ms': _timed(lambda: collect_classroom_features(classroom, use_store=False), max(1, repeat // 4)),
+            'queries': _queries(lambda: collect_classroom_features(classroom, students[:1])),
+        },
+        'inference': {
+            'single_row_ms': _timed(lambda: analytics_for_matrix(X_student), repeat, before=cold),
+            'classroom_ms': _timed(lambda: analytics_for_matrix(X_class), max(1, repeat // 4), before=cold),
+        },
+        'classroom_analytics': {
+            'latency_ms': _timed(lambda: get_classroom_analytics(classroom), max(1, repeat // 4), before=cold),
+            'queries': _queries(lambda: get_classroom_analytics(classroom)),
+        },
+    }
+    cold()
+    result['classroom_analytics']['peak_memory_kb'] = _peak_memory_kb(lambda: get_classroom_analytics(classroom))
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, n_assignments=DEFAULT_ASSIGNMENTS, repeat=DEFAULT_REPEAT, seed=0, log=None):
+    """Seed one classroom per size and benchmark it; returns the JSON-ready report."""
+    results = []
+    for size in sizes:
+        if log:
+            log(f'Seeding a classroom of {size} students...')
+        started = time.perf_counter()
+        classroom, student_ids = seed_classroom(size, n_assignments, seed)
+        seed_seconds = time.perf_counter() - started
+        if log:
+            log(f'Benchmarking {size} students...')
+        result = benchmark_classroom(classroom, student_ids, repeat, seed)
+        result['seed_seconds'] = round(seed_seconds, 3)
+        results.append(result)
+
+    metrics = model_metrics()
+    return {
+        'created_at': timezone.now().isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'database': connection.vendor,
+        'model_version': metrics['version'],
+        'model_engine': metrics.get('engine'),
+        'assignments': n_assignments,
+        'repeat': repeat,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        'results': results,
+    }
+
+
+def compare_reports(before, after):
+    """Median latency ratios (after / before) for the sizes both reports have."""
+    def medians(report):
+        rows = {}
+        for result in report['results']:
+            for section, values in result.items():
+                if isinstance(values, dict):
+                    for name, value in values.items():
+                        if isinstance(value, dict) and 'median' in value:
+                            rows[(result['students'], f'{section}.{name}')] = value['median']
+        return rows
+
+    old, new = medians(before), medians(after)
+    comparison = []
+    for students, metric in sorted(old.keys() & new.keys()):
+        was, now = old[students, metric], new[students, metric]
+        comparison.append((students, metric, was, now, round(now / was, 3) if was else None))
+    return comparison
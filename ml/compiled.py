@@ -0,0 +1,159 @@
+"""
+Tree models compiled to flat NumPy arrays, evaluated without scikit-learn.
+
+``ml/scripts/train_models.py`` exports the trained scalers, random forest and
+gradient boosting models to ``compiled_models.npz``; the classes here expose
+the ``transform``/``predict``/``predict_proba`` methods ``ml.predictions``
+uses, so a compiled bundle is a drop-in replacement for the pickled one.
+
+The arrays are memory-mapped read-only from the file, so every process
+serving the same export shares one copy of them in the page cache.
+"""
+import hashlib
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+COMPILED_FILE = 'compiled_models.npz'
+SOURCE_FILES = ['risk_model.pkl', 'risk_scaler.pkl', 'grade_model.pkl', 'grade_scaler.pkl']
+
+
+def source_digest(models_dir):
+    """Digest of the pickled models a compiled file was exported from."""
+    digest = hashlib.sha1()
+    for name in SOURCE_FILES:
+        with open(os.path.join(models_dir, name), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class CompiledScaler:
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+
+class CompiledTrees:
+    """
+    Any number of decision trees stored as one flat node table.
+
+    Leaves point to themselves, so walking ``max_depth`` levels from the
+    roots lands every sample on its leaf in every tree at once.
+    """
+
+    def __init__(self, feature, threshold, children, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        # children[node, 1] is the left child, taken when the split test holds;
+        # flattened (a view, so memory-mapped pages stay shared) for np.take
+        self.children = children.reshape(-1)
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    def leaves(self, X):
+        """Leaf index of every sample in every tree, shape ``(n_samples, n_trees)``."""
+        # Trees split on float32 features, as in scikit-learn
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_samples, n_features = X.shape
+        X = X.ravel()
+        offsets = (np.arange(n_samples) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_samples, len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = np.take(X, offsets + np.take(self.feature, nodes)) <= np.take(self.threshold, nodes)
+            nodes = np.take(self.children, 2 * nodes + go_left)
+        return nodes
+
+
+class CompiledForestClassifier:
+    def __init__(self, trees, values, classes):
+        self.trees = trees
+        self.values = values
+        self.classes_ = classes
+
+    def predict_proba(self, X):
+        # A running sum over the trees adds them in the same order as
+        # scikit-learn, so the probabilities match to the last bit
+        proba = np.cumsum(self.values[self.trees.leaves(X)], axis=1)[:, -1]
+        proba /= len(self.trees.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class CompiledBoostingRegressor:
+    def __init__(self, trees, values, init, learning_rate):
+        self.trees = trees
+        self.values = values
+        self.init = float(init)
+        self.learning_rate = float(learning_rate)
+
+    def predict(self, X):
+        leaves = self.trees.leaves(X)
+        steps = np.empty((len(leaves), leaves.shape[1] + 1))
+        steps[:, 0] = self.init
+        steps[:, 1:] = self.learning_rate * self.values[leaves]
+        return np.cumsum(steps, axis=1)[:, -1]
+
+
+def _trees(arrays, prefix):
+    return CompiledTrees(*(arrays[f'{prefix}_{name}'] for name in ('feature', 'threshold', 'children', 'roots', 'max_depth')))
+
+
+def mmap_npz(path):
+    """
+    Memory-map every array of an uncompressed ``.npz`` file (as written by
+    ``np.savez``) read-only. Scalars and empty arrays are read normally.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path}: {info.filename} is compressed and cannot be memory-mapped')
+            # Skip the zip local file header to the start of the .npy data
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-len('.npy')]
+            count = int(np.prod(shape))
+            if not shape or not count:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+            else:
+                arrays[name] = np.asarray(np.memmap(
+                    path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                    order='F' if fortran_order else 'C',
+                ))
+    return arrays
+
+
+def load_compiled(path, mmap=True):
+    """Load a compiled bundle: the two scalers and models plus the source digest."""
+    if mmap:
+        arrays = mmap_npz(path)
+    else:
+        with np.load(path) as archive:
+            arrays = {name: archive[name] for name in archive.files}
+    return {
+        'risk_scaler': CompiledScaler(arrays['risk_scaler_mean'], arrays['risk_scaler_scale']),
+        'risk_model': CompiledForestClassifier(_trees(arrays, 'risk'), arrays['risk_values'], arrays['risk_classes']),
+        'grade_scaler': CompiledScaler(arrays['grade_scaler_mean'], arrays['grade_scaler_scale']),
+        'grade_model': CompiledBoostingRegressor(
+            _trees(arrays, 'grade'), arrays['grade_values'], arrays['grade_init'], arrays['grade_learning_rate']
+        ),
+        'source': str(arrays['source']),
+    }
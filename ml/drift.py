@@ -0,0 +1,325 @@
+"""
+Feature drift monitoring: live feature histograms compared with the
+training distribution.
+
+Training saves ``feature_reference.json`` next to the models: decile bin
+edges for each feature and the training rows' counts in those bins. Served
+rows are counted into the same bins by a process-wide ``DriftMonitor`` and
+flushed into ``FeatureHistogram`` rows, one per (day, source, feature), so
+memory stays at a few integers per bin however much traffic there is.
+``drift_report`` sums recent days and scores each feature with the
+population stability index and the Kolmogorov-Smirnov distance.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, 'ml', 'models')
+REFERENCE_FILE = 'feature_reference.json'
+
+REFERENCE_BINS = 10
+SOURCES = ('serving', 'batch')
+
+# Pending counts are written out after this many rows or seconds
+FLUSH_ROWS = 1000
+FLUSH_SECONDS = 60
+DEFAULT_WINDOW_DAYS = 7
+RETENTION_DAYS = 90
+
+# Population stability index bands, and the share floor that keeps empty
+# bins from producing infinite terms
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+PSI_EPSILON = 1e-4
+# Kolmogorov-Smirnov critical value coefficient for a 5% significance level
+KS_ALPHA_COEFFICIENT = 1.358
+STATUS_ORDER = ['no data', 'stable', 'moderate', 'significant']
+
+
+def bin_counts(X, edges):
+    """Counts of each column of ``X`` in the bins between ``edges`` (plus both tails)."""
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(edges))
+    return [
+        np.bincount(np.searchsorted(feature_edges, X[:, i], side='right'), minlength=len(feature_edges) + 1)
+        for i, feature_edges in enumerate(edges)
+    ]
+
+
+def build_reference(X, n_bins=REFERENCE_BINS):
+    """
+    Reference histograms for the training feature matrix ``X``: bins at the
+    training deciles of each feature (merged where they coincide, as for
+    integer features), and the training counts in them.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    edges = [np.unique(np.quantile(X[:, i], quantiles)) for i in range(X.shape[1])]
+    edge_lists = [[float(edge) for edge in feature_edges] for feature_edges in edges]
+    return {
+        'id': hashlib.sha1(json.dumps(edge_lists).encode()).hexdigest()[:12],
+        'features': FEATURE_NAMES,
+        'samples': len(X),
+        'edges': edge_lists,
+        'counts': [[int(count) for count in counts] for counts in bin_counts(X, edges)],
+    }
+
+
+def save_reference(reference, models_dir=MODELS_DIR):
+    with open(os.path.join(models_dir, REFERENCE_FILE), 'w') as f:
+        json.dump(reference, f, indent=2)
+
+
+def load_reference(models_dir=MODELS_DIR):
+    """The saved reference histograms, or None if the models have none."""
+    try:
+        with open(os.path.join(models_dir, REFERENCE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def population_stability_index(expected, actual):
+    expected = np.maximum(np.asarray(expected, dtype=float) / max(sum(expected), 1), PSI_EPSILON)
+    actual = np.maximum(np.asarray(actual, dtype=float) / max(sum(actual), 1), PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_distance(expected, actual):
+    """Largest gap between the two cumulative distributions at the bin edges."""
+    expected = np.cumsum(expected) / max(sum(expected), 1)
+    actual = np.cumsum(actual) / max(sum(actual), 1)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def drift_status(psi):
+    if psi is None:
+        return 'no data'
+    if psi >= PSI_SIGNIFICANT:
+        return 'significant'
+    if psi >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def compare_feature(name, edges, expected, actual):
+    """PSI, KS and per-bin shares of one feature's live counts against the reference."""
+    n, m = sum(expected), sum(actual)
+    psi = population_stability_index(expected, actual) if m else None
+    bounds = [None] + list(edges) + [None]
+    return {
+        'feature': name,
+        'samples': m,
+        'psi': round(psi, 4) if psi is not None else None,
+        'ks': round(ks_distance(expected, actual), 4) if m else None,
+        'ks_critical': round(KS_ALPHA_COEFFICIENT * np.sqrt((n + m) / (n * m)), 4) if n and m else None,
+        'status': drift_status(psi),
+        'bins': [
+            {
+                'low': low,
+                'high': high,
+                'expected': round(e / n, 4) if n else 0.0,
+                'actual': round(a / m, 4) if m else 0.0,
+            }
+            for low, high, e, a in zip(bounds[:-1], bounds[1:], expected, actual)
+        ],
+    }
+
+
+def record_counts(counts, reference_id, source='serving', day=None, replace=False):
+    """
+    Add per-feature bin ``counts`` (aligned with FEATURE_NAMES) to the stored
+    histograms for ``day``, or replace them with ``replace``.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from grades.models import FeatureHistogram
+
+    day = day or timezone.localdate()
+    with transaction.atomic():
+        for name, feature_counts in zip(FEATURE_NAMES, counts):
+            feature_counts = [int(count) for count in feature_counts]
+            histogram, created = FeatureHistogram.objects.select_for_update().get_or_create(
+                day=day, source=source, feature=name, reference=reference_id,
+                defaults={'counts': feature_counts, 'total': sum(feature_counts)},
+            )
+            if created:
+                continue
+            if not replace and len(histogram.counts) == len(feature_counts):
+                feature_counts = [old + new for old, new in zip(histogram.counts, feature_counts)]
+            histogram.counts = feature_counts
+            histogram.total = sum(feature_counts)
+            histogram.save(update_fields=['counts', 'total', 'updated_at'])
+
+
+def live_counts(reference, days=DEFAULT_WINDOW_DAYS, source='serving'):
+    """Stored counts for the last ``days`` days, summed per feature (``source=None`` for all)."""
+    from django.utils import timezone
+    from grades.models import FeatureHistogram
+
+    totals = [np.zeros(len(edges) + 1, dtype=np.int64) for edges in reference['edges']]
+    histograms = FeatureHistogram.objects.filter(
+        reference=reference['id'], day__gt=timezone.localdate() - timedelta(days=days)
+    )
+    if source:
+        histograms = histograms.filter(source=source)
+    for feature, counts in histograms.values_list('feature', 'counts'):
+        i = FEATURE_NAMES.index(feature)
+        if len(counts) == len(totals[i]):
+            totals[i] += np.asarray(counts, dtype=np.int64)
+    return totals
+
+
+def drift_report(days=DEFAULT_WINDOW_DAYS, source='serving', models_dir=MODELS_DIR):
+    """
+    Drift of the live features over the last ``days`` days against the
+    reference histograms. Returns None when the models have no reference.
+    """
+    from django.utils import timezone
+
+    reference = load_reference(models_dir)
+    if reference is None:
+        return None
+    actual = live_counts(reference, days, source)
+    features = [
+        compare_feature(name, edges, expected, [int(count) for count in counts])
+        for name, edges, expected, counts in zip(FEATURE_NAMES, reference['edges'], reference['counts'], actual)
+    ]
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'reference': {'id': reference['id'], 'samples': reference['samples']},
+        'window_days': days,
+        'source': source or 'all',
+        'status': max((feature['status'] for feature in features), key=STATUS_ORDER.index),
+        'features': features,
+    }
+
+
+def collect_batch_counts(reference, classrooms=None):
+    """
+    Histogram the current features of every participant of ``classrooms``
+    (all classrooms by default) from the feature store, one classroom at a time.
+    """
+    from classes.models import ClassRoom
+    from ml.features import collect_classroom_features
+
+    edges = [np.asarray(feature_edges) for feature_edges in reference['edges']]
+    totals = [np.zeros(len(feature_edges) + 1, dtype=np.int64) for feature_edges in edges]
+    rows = 0
+    for classroom in (classrooms if classrooms is not None else ClassRoom.objects.order_by('id').iterator()):
+        _, X = collect_classroom_features(classroom)
+        if len(X):
+            for total, counts in zip(totals, bin_counts(X, edges)):
+                total += counts
+            rows += len(X)
+    return totals, rows
+
+
+def prune_histograms(keep_days=RETENTION_DAYS):
+    """Delete stored histograms older than ``keep_days`` days."""
+    from django.utils import timezone
+    from grades.models import FeatureHistogram
+
+    deleted, _ = FeatureHistogram.objects.filter(day__lte=timezone.localdate() - timedelta(days=keep_days)).delete()
+    return deleted
+
+
+class DriftMonitor:
+    """
+    Per-process accumulator of served feature rows.
+
+    Rows are counted into the reference bins in memory and added to the
+    stored histograms every ``flush_rows`` rows or ``flush_seconds``
+    seconds, whichever comes first. The reference is re-read when its file
+    changes, after the pending counts for the old one are written out.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.models_dir = models_dir
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._reference = None
+        self._edges = None
+        self._signature = None
+        self._pending = None
+        self._pending_rows = 0
+        self._flushed_at = time.monotonic()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(os.path.join(self.models_dir, REFERENCE_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _take_pending(self):
+        pending = (self._reference, self._pending) if self._pending_rows else None
+        if self._reference is not None:
+            self._pending = [np.zeros(len(edges) + 1, dtype=np.int64) for edges in self._reference['edges']]
+        self._pending_rows = 0
+        self._flushed_at = time.monotonic()
+        return pending
+
+    def _write(self, pending):
+        if pending is None:
+            return
+        reference, counts = pending
+        try:
+            record_counts(counts, reference['id'])
+        except Exception as e:
+            print(f"Error recording feature histograms: {e}")
+
+    def observe(self, X):
+        """Count the rows of the feature matrix ``X``. Never raises."""
+        if not len(X):
+            return
+        try:
+            with self._lock:
+                if self._reference is None:
+                    self._reload()
+                if self._reference is None:
+                    return
+                for pending, counts in zip(self._pending, bin_counts(X, self._edges)):
+                    pending += counts
+                self._pending_rows += len(X)
+                due = (
+                    self._pending_rows >= self.flush_rows
+                    or time.monotonic() - self._flushed_at >= self.flush_seconds
+                )
+            if due:
+                self.flush()
+        except Exception as e:
+            print(f"Error observing features for drift: {e}")
+
+    def _reload(self):
+        self._signature = self._file_signature()
+        self._reference = load_reference(self.models_dir)
+        if self._reference is not None:
+            self._edges = [np.asarray(edges) for edges in self._reference['edges']]
+        self._take_pending()
+
+    def flush(self):
+        """Write the pending counts out, and pick up a new reference if there is one."""
+        with self._lock:
+            pending = self._take_pending()
+            if self._file_signature() != self._signature:
+                self._reload()
+        self._write(pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reference': self._reference and self._reference['id'],
+                'pending_rows': self._pending_rows,
+            }
+
+
+drift_monitor = DriftMonitor()
@@ -0,0 +1,127 @@
+"""Persistent store of per-(student, classroom) feature counts."""
+from django.db import transaction
+from django.utils import timezone
+from ml.features import compute_feature_counts, participant_ids
+
+SNAPSHOT_FIELDS = [
+    'assignment_count',
+    'graded_count',
+    'score_sum',
+    'submitted_count',
+    'on_time_count',
+    'last_submission_at',
+]
+
+
+def refresh_feature_snapshots(classroom_id, student_ids=None):
+    """
+    Recompute and store snapshots for some students of a classroom, or for
+    every participant and existing snapshot when ``student_ids`` is None.
+    Returns the fresh counts by student id.
+    """
+    from classes.models import ClassRoom
+    from grades.models import StudentFeatureSnapshot
+    from users.models import CustomUser
+
+    if not ClassRoom.objects.filter(id=classroom_id).exists():
+        return {}
+    if student_ids is None:
+        existing = StudentFeatureSnapshot.objects.filter(classroom_id=classroom_id).values_list('student_id', flat=True)
+        student_ids = set(participant_ids(classroom_id)) | set(existing)
+    # Skip students deleted in the meantime
+    student_ids = list(CustomUser.objects.filter(id__in=list(student_ids)).values_list('id', flat=True))
+    if not student_ids:
+        return {}
+
+    counts = compute_feature_counts(classroom_id, student_ids)
+    now = timezone.now()
+    StudentFeatureSnapshot.objects.bulk_create(
+        [
+            StudentFeatureSnapshot(student_id=student_id, classroom_id=classroom_id, updated_at=now, **values)
+            for student_id, values in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'classroom'],
+        update_fields=SNAPSHOT_FIELDS + ['updated_at'],
+        batch_size=500,
+    )
+    return counts
+
+
+def load_feature_counts(classroom_id, student_ids):
+    """
+    Stored counts for the given students. Counts missing from the store are
+    computed but not written, so reading never writes; snapshots are stored
+    when grades, submissions or memberships change.
+    """
+    from grades.models import StudentFeatureSnapshot
+
+    counts = {
+        row['student_id']: row
+        for row in StudentFeatureSnapshot.objects.filter(
+            classroom_id=classroom_id, student_id__in=student_ids
+        ).values('student_id', *SNAPSHOT_FIELDS)
+    }
+    missing = [student_id for student_id in student_ids if student_id not in counts]
+    if missing:
+        counts.update(compute_feature_counts(classroom_id, missing))
+    return counts
+
+
+class PendingRefresh:
+    """
+    Snapshot refreshes queued by one atomic block, run when the transaction
+    commits. Django drops the callback if the block rolls back, and the
+    queued students with it.
+    """
+
+    def __init__(self):
+        self.classrooms = {}
+
+    def add(self, classroom_id, student_ids):
+        if student_ids is None:
+            self.classrooms[classroom_id] = None
+        elif self.classrooms.get(classroom_id, ()) is not None:
+            self.classrooms.setdefault(classroom_id, set()).update(student_ids)
+
+    def __call__(self):
+        from ml.analytics_queue import enqueue_analytics
+
+        for classroom_id, student_ids in self.classrooms.items():
+            counts = refresh_feature_snapshots(classroom_id, student_ids)
+            # The stored analytics of the same students are now out of date
+            enqueue_analytics(classroom_id, counts)
+
+
+def _queued_refresh():
+    """
+    The refresh already queued in the current atomic block, if any. Blocks
+    nested in it queue their own, so rolling one back drops exactly the
+    refreshes it queued.
+    """
+    connection = transaction.get_connection()
+    savepoints = set(connection.savepoint_ids)
+    for savepoint_ids, callback, _ in connection.run_on_commit:
+        if isinstance(callback, PendingRefresh) and savepoint_ids == savepoints:
+            return callback
+    return None
+
+
+def schedule_snapshot_refresh(classroom_id, student_ids=None):
+    """
+    Refresh snapshots once the current transaction commits, and queue the
+    analytics of the same students for recomputing. Repeated calls within an
+    atomic block are merged; ``student_ids=None`` means the whole classroom.
+    """
+    pending = _queued_refresh()
+    if pending is None:
+        pending = PendingRefresh()
+        pending.add(classroom_id, student_ids)
+        transaction.on_commit(pending)
+    else:
+        pending.add(classroom_id, student_ids)
+
+
+def rebuild_feature_snapshots(classrooms):
+    """Recompute every snapshot of the given classrooms; returns the row count."""
+    return sum(len(refresh_feature_snapshots(classroom.id)) for classroom in classrooms)
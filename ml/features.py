@@ -0,0 +1,149 @@
+"""Feature extraction for the student analytics models."""
+import numpy as np
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+FEATURE_NAMES = [
+    'avg_score',
+    'submission_rate',
+    'on_time_rate',
+    'participation',
+    'assignment_count',
+    'days_since_last',
+]
+
+# Days since last submission used when a student has never submitted
+NO_SUBMISSION_DAYS = 30
+
+
+def features_from_counts(total_assignments, graded_count, score_sum, submitted_count, on_time_count, latest_submission, now):
+    """Turn raw per-student counts into the feature dict used by the models."""
+    avg_score = score_sum / graded_count if graded_count > 0 else 0
+    submission_rate = (submitted_count / total_assignments * 100) if total_assignments > 0 else 0
+    on_time_rate = (on_time_count / submitted_count * 100) if submitted_count > 0 else 0
+
+    # Participation score (simplified)
+    participation = min(100, submission_rate + (on_time_rate * 0.5))
+
+    if latest_submission:
+        days_since_last = (now - latest_submission).days
+    else:
+        days_since_last = NO_SUBMISSION_DAYS
+
+    return {
+        'avg_score': avg_score,
+        'submission_rate': submission_rate,
+        'on_time_rate': on_time_rate,
+        'participation': participation,
+        'assignment_count': total_assignments,
+        'days_since_last': min(days_since_last, NO_SUBMISSION_DAYS),  # Cap at 30 days
+    }
+
+
+def participant_ids(classroom_id):
+    from classes.models import ClassMembership
+
+    return list(
+        ClassMembership.objects.filter(classroom_id=classroom_id, role='participant')
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+
+
+def compute_feature_counts(classroom_id, student_ids):
+    """
+    Raw counts behind the features for many students of a classroom, from
+    three queries whatever the number of students. Returns a dict of
+    student id -> counts (the StudentFeatureSnapshot fields).
+    """
+    from grades.models import Grade
+    from assignments.models import Assignment, Submission
+
+    total_assignments = Assignment.objects.filter(classroom_id=classroom_id).count()
+    counts = {
+        student_id: {
+            'assignment_count': total_assignments,
+            'graded_count': 0,
+            'score_sum': 0.0,
+            'submitted_count': 0,
+            'on_time_count': 0,
+            'last_submission_at': None,
+        }
+        for student_id in student_ids
+    }
+
+    # Grades are summed row by row in the model's default order so the
+    # averages match the per-student computation exactly
+    grade_rows = Grade.objects.filter(
+        classroom_id=classroom_id, student_id__in=student_ids
+    ).values_list('student_id', 'marks_obtained', 'total_marks')
+    for student_id, marks, total in grade_rows:
+        counts[student_id]['score_sum'] += float(marks) / float(total) * 100
+        counts[student_id]['graded_count'] += 1
+
+    submission_rows = Submission.objects.filter(
+        assignment__classroom_id=classroom_id, student_id__in=student_ids
+    ).values('student_id').annotate(
+        submitted=Count('id'),
+        on_time=Count('id', filter=Q(assignment__deadline__gte=F('submitted_at'))),
+        latest=Max('submitted_at'),
+    ).order_by()
+    for row in submission_rows:
+        counts[row['student_id']].update({
+            'submitted_count': row['submitted'],
+            'on_time_count': row['on_time'],
+            'last_submission_at': row['latest'],
+        })
+    return counts
+
+
+def features_from_snapshot(counts, now):
+    return features_from_counts(
+        counts['assignment_count'],
+        counts['graded_count'],
+        counts['score_sum'],
+        counts['submitted_count'],
+        counts['on_time_count'],
+        counts['last_submission_at'],
+        now,
+    )
+
+
+def collect_classroom_features(classroom, student_ids=None, use_store=True):
+    """
+    Features for many students of a classroom at once.
+
+    ``student_ids`` defaults to the classroom's participants. Counts are read
+    from the feature store (one indexed lookup, computing any missing
+    snapshots); ``use_store=False`` computes them from the raw tables
+    instead. Returns ``(student_ids, X)`` where row ``i`` of the ``(n, 6)``
+    matrix ``X`` holds the features of ``student_ids[i]`` in
+    ``FEATURE_NAMES`` order.
+    """
+    from ml.feature_store import load_feature_counts
+
+    classroom_id = getattr(classroom, 'pk', classroom)
+    if student_ids is None:
+        student_ids = participant_ids(classroom_id)
+    else:
+        student_ids = list(student_ids)
+
+    if use_store:
+        counts = load_feature_counts(classroom_id, student_ids)
+    else:
+        counts = compute_feature_counts(classroom_id, student_ids)
+
+    now = timezone.now()
+    X = np.zeros((len(student_ids), len(FEATURE_NAMES)))
+    for i, student_id in enumerate(student_ids):
+        features = features_from_snapshot(counts[student_id], now)
+        X[i] = [features[name] for name in FEATURE_NAMES]
+    return student_ids, X
+
+
+def feature_dict(row):
+    """Convert one row of a feature matrix back to the feature dict."""
+    features = dict(zip(FEATURE_NAMES, (float(value) for value in row)))
+    features['assignment_count'] = int(features['assignment_count'])
+    features['days_since_last'] = int(features['days_since_last'])
+    return features
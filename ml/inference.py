@@ -0,0 +1,325 @@
+"""
+Inference server shared by all web workers over a local Unix socket.
+
+``manage.py run_inference_server`` owns the models and scores feature
+matrices sent by ``InferenceClient``. Requests arriving together from any
+number of workers are merged into one batch (up to ``max_batch_rows`` rows,
+waiting at most ``max_wait`` seconds for company), so each model runs once
+per batch. With ``ML_INFERENCE_SOCKET`` set, ``ml.predictions`` scores
+through the server, and falls back to loading the models in process while
+the server is unreachable.
+
+Frames are a fixed header followed by little-endian float64 arrays:
+
+    request   op (b'P' predict, b'I' info), rows, columns | rows x columns features
+    response  JSON length, rows | JSON header | risk level index, risk score, grade score (rows each)
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES
+
+REQUEST = struct.Struct('<cII')
+RESPONSE = struct.Struct('<II')
+DTYPE = np.dtype('<f8')
+OUTPUTS = 3
+
+MAX_BATCH_ROWS = 4096
+MAX_WAIT_SECONDS = 0.002
+BATCH_WORKERS = 1
+
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 10.0
+# After a failure the client leaves the server alone for this long
+RETRY_SECONDS = 5.0
+INFO_TTL = 2.0
+
+
+class InferenceError(Exception):
+    pass
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _send_response(sock, header, arrays=()):
+    body = json.dumps(header).encode()
+    rows = len(arrays[0]) if arrays else 0
+    sock.sendall(
+        RESPONSE.pack(len(body), rows) + body
+        + b''.join(np.asarray(array, dtype=DTYPE).tobytes() for array in arrays)
+    )
+
+
+class MicroBatcher:
+    """Merges concurrent scoring requests into batches for the models."""
+
+    def __init__(self, max_batch_rows=MAX_BATCH_ROWS, max_wait=MAX_WAIT_SECONDS, workers=BATCH_WORKERS):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'rows': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+        self._threads = [
+            threading.Thread(target=self._run, name=f'inference-batcher-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, X):
+        """Queue a feature matrix; the future resolves to its three output arrays."""
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._score(batch, rows)
+
+    def _score(self, batch, rows):
+        from ml.predictions import grade_scores_batch, load_local_models, risk_indices_batch
+
+        try:
+            models = load_local_models()
+            if not models:
+                raise InferenceError('ML models not available')
+            X = np.vstack([X for X, _ in batch])
+            risk_index, risk_scores = risk_indices_batch(X, models)
+            grade_scores = grade_scores_batch(X, models)
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats['requests'] += len(batch)
+            self._stats['rows'] += rows
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], rows)
+        start = 0
+        for X, future in batch:
+            end = start + len(X)
+            future.set_result((
+                models['fingerprint'], risk_index[start:end], risk_scores[start:end], grade_scores[start:end]
+            ))
+            start = end
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['mean_batch_rows'] = round(stats['rows'] / stats['batches'], 1) if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                op, rows, columns = REQUEST.unpack(_recv_exact(self.request, REQUEST.size))
+                X = np.frombuffer(_recv_exact(self.request, rows * columns * DTYPE.itemsize), dtype=DTYPE)
+            except (EOFError, ConnectionError):
+                return
+            try:
+                if op == b'I':
+                    _send_response(self.request, server.info())
+                elif op == b'P' and columns != len(FEATURE_NAMES):
+                    # Rejected here, so it cannot fail the batch it would have joined
+                    _send_response(self.request, {'error': f'expected {len(FEATURE_NAMES)} feature columns, got {columns}'})
+                elif op == b'P':
+                    fingerprint, *outputs = server.batcher.submit(X.reshape(rows, columns)).result()
+                    _send_response(self.request, {'fingerprint': fingerprint}, outputs)
+                else:
+                    _send_response(self.request, {'error': f'unknown operation {op!r}'})
+            except ConnectionError:
+                return
+            except Exception as e:
+                _send_response(self.request, {'error': str(e)})
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, max_batch_rows=MAX_BATCH_ROWS, max_wait=MAX_WAIT_SECONDS, workers=BATCH_WORKERS):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _RequestHandler)
+        self.path = path
+        self.started_at = time.time()
+        self.batcher = MicroBatcher(max_batch_rows, max_wait, workers)
+
+    def info(self):
+        from ml.predictions import load_local_models, model_metrics
+
+        models = load_local_models()
+        return {
+            'fingerprint': models['fingerprint'] if models else None,
+            'version': models['version'] if models else None,
+            'engine': models['engine'] if models else None,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'batching': self.batcher.stats(),
+            'models': model_metrics(),
+        }
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class InferenceClient:
+    """
+    Client for an inference server, with one connection per thread. After a
+    failure ``bundle()`` returns None for RETRY_SECONDS so callers fall back
+    to in-process inference without waiting on the socket each time.
+    """
+
+    def __init__(self, path, timeout=REQUEST_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._info = None
+        self._info_at = 0.0
+        self._down_until = 0.0
+        self._counters = {'requests': 0, 'errors': 0}
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CONNECT_TIMEOUT)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(self.timeout)
+            self._local.sock = sock
+        return sock
+
+    def _request(self, op, X=None):
+        if X is None:
+            X = np.empty((0, 0))
+        X = np.ascontiguousarray(X, dtype=DTYPE)
+        try:
+            sock = self._connection()
+            sock.sendall(REQUEST.pack(op, X.shape[0], X.shape[1]) + X.tobytes())
+            length, rows = RESPONSE.unpack(_recv_exact(sock, RESPONSE.size))
+            header = json.loads(_recv_exact(sock, length))
+            outputs = np.frombuffer(_recv_exact(sock, OUTPUTS * rows * DTYPE.itemsize), dtype=DTYPE)
+        except (OSError, EOFError, ValueError, struct.error) as e:
+            self._close()
+            with self._lock:
+                self._counters['errors'] += 1
+                self._down_until = time.monotonic() + RETRY_SECONDS
+            raise InferenceError(f'inference server at {self.path}: {e}') from e
+        with self._lock:
+            self._counters['requests'] += 1
+        if 'error' in header:
+            raise InferenceError(header['error'])
+        return header, outputs.reshape(OUTPUTS, rows)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def info(self):
+        """The server's model version and batching counters (refreshed every INFO_TTL seconds)."""
+        now = time.monotonic()
+        if self._info is None or now - self._info_at >= INFO_TTL:
+            self._info, _ = self._request(b'I')
+            self._info_at = now
+        return self._info
+
+    def bundle(self):
+        """
+        A stand-in for the model bundle that scores through the server, or
+        None while the server is unreachable or has no models.
+        """
+        if not self.available():
+            return None
+        try:
+            info = self.info()
+        except InferenceError as e:
+            print(f"Inference server unavailable: {e}")
+            return None
+        if not info.get('fingerprint'):
+            return None
+        return {
+            'fingerprint': info['fingerprint'],
+            'version': info['version'],
+            'engine': 'inference-server',
+            'inference_client': self,
+        }
+
+    def predict(self, X):
+        """Returns ``(fingerprint, risk_index, risk_scores, grade_scores)`` for the rows of ``X``."""
+        header, (risk_index, risk_scores, grade_scores) = self._request(b'P', X)
+        return header['fingerprint'], risk_index.astype(int), risk_scores, grade_scores
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['socket'] = self.path
+        stats['available'] = self.available()
+        stats['server'] = self._info
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def inference_client():
+    """The client for ``settings.ML_INFERENCE_SOCKET``, or None when it is not set."""
+    global _client
+    from django.conf import settings
+
+    path = getattr(settings, 'ML_INFERENCE_SOCKET', None)
+    if not path:
+        return None
+    with _client_lock:
+        if _client is None or _client.path != path:
+            _client = InferenceClient(path)
+        return _client
@@ -0,0 +1,86 @@
+"""In-process cache of model outputs keyed by model version and feature vector."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PREDICTION_CACHE_SIZE = 10000
+PREDICTION_CACHE_TTL = 15 * 60
+
+# Features are rounded before hashing so float noise from the extraction
+# queries does not split otherwise identical rows
+KEY_DECIMALS = 6
+
+
+class PredictionCache:
+    """
+    LRU cache of per-row prediction results with a time-to-live.
+
+    Keys combine the model fingerprint with a digest of the feature row, so
+    entries computed by an older model can never be returned for a newer one;
+    the cache is also emptied whenever the registry loads new models.
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    @staticmethod
+    def keys(fingerprint, X):
+        """One cache key per row of the feature matrix ``X``."""
+        # Adding 0.0 turns -0.0 into 0.0 so both hash the same
+        rows = np.ascontiguousarray(np.round(np.asarray(X, dtype=np.float64), KEY_DECIMALS) + 0.0)
+        return [
+            f'{fingerprint}:{hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()}'
+            for row in rows
+        ]
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['maxsize'] = self.maxsize
+        stats['ttl'] = self.ttl
+        return stats
+
+
+prediction_cache = PredictionCache()
@@ -1,253 +1,364 @@
 """ML prediction functions for the LMS."""
 import os
 import numpy as np
-from datetime import datetime, timedelta
-from django.utils import timezone
 
-try:
-    import joblib
-except ImportError:
-    joblib = None
+from ml.drift import drift_monitor
+from ml.features import FEATURE_NAMES, collect_classroom_features, feature_dict
+from ml.inference import inference_client
+from ml.prediction_cache import prediction_cache
+from ml.registry import registry
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ML_DIR = os.path.join(BASE_DIR, 'ml')
 
 
 def load_models():
-    """Load trained models and scalers."""
-    if not joblib:
-        print("joblib not available")
-        return None
-        
-    models_dir = os.path.join(ML_DIR, 'models')
-    
+    """
+    Return the models to score with: a handle on the inference server when
+    ``ML_INFERENCE_SOCKET`` is set and the server is up, otherwise the
+    trained models and scalers, loaded once per process.
+    """
+    client = inference_client()
+    if client is not None:
+        bundle = client.bundle()
+        if bundle is not None:
+            return bundle
+    return load_local_models()
+
+
+def load_local_models():
+    """Return the trained models and scalers, loaded once per process."""
+    models = registry.get()
+    if not models:
+        print("ML models not available")
+    return models
+
+
+def warmup():
+    """
+    Load the models and score one row, so the first analytics request after
+    a deploy does not pay for loading them. With an inference server
+    configured the models are left to it. Never raises.
+    """
     try:
-        risk_model = joblib.load(os.path.join(models_dir, 'risk_model.pkl'))
-        risk_scaler = joblib.load(os.path.join(models_dir, 'risk_scaler.pkl'))
-        grade_model = joblib.load(os.path.join(models_dir, 'grade_model.pkl'))
-        grade_scaler = joblib.load(os.path.join(models_dir, 'grade_scaler.pkl'))
-        
-        return {
-            'risk_model': risk_model,
-            'risk_scaler': risk_scaler,
-            'grade_model': grade_model,
-            'grade_scaler': grade_scaler
-        }
+        if inference_client() is not None:
+            return None
+        models = load_models()
+        if models:
+            X = np.zeros((1, len(FEATURE_NAMES)))
+            predict_risk_batch(X, models)
+            predict_grade_batch(X, models)
+        return models
     except Exception as e:
-        print(f"Error loading models: {e}")
+        print(f"Error warming up ML models: {e}")
         return None
 
 
+@registry.on_reload
+def _clear_prediction_cache(bundle):
+    prediction_cache.clear()
+
+
+def model_metrics():
+    """
+    Model version and load timings from the registry, with prediction cache,
+    drift monitor and inference server counters.
+    """
+    metrics = registry.metrics()
+    metrics['prediction_cache'] = prediction_cache.stats()
+    metrics['drift_monitor'] = drift_monitor.stats()
+    client = inference_client()
+    if client is not None:
+        metrics['inference_server'] = client.stats()
+    return metrics
+
+
 def collect_student_features(student, classroom):
     """Collect features for a student in a classroom"""
-    from grades.models import Grade
-    from assignments.models import Submission, Assignment
-    
-    # Get student's grades in this classroom
-    grades = Grade.objects.filter(student=student, classroom=classroom)
-    submissions = Submission.objects.filter(
-        student=student, 
-        assignment__classroom=classroom
+    _, X = collect_classroom_features(classroom, [student.id])
+    return feature_dict(X[0])
+
+
+RISK_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+
+# (feature, comparison, threshold, recommendation), checked in order
+RECOMMENDATION_RULES = [
+    ('avg_score', np.less, 60, "Focus on improving assignment quality"),
+    ('submission_rate', np.less, 70, "Submit assignments more consistently"),
+    ('on_time_rate', np.less, 70, "Improve time management for deadlines"),
+    ('days_since_last', np.greater, 7, "Stay more engaged with recent assignments"),
+]
+NO_RECOMMENDATIONS = "Keep up the good work!"
+
+
+def _column(X, name):
+    return X[:, FEATURE_NAMES.index(name)]
+
+
+def letter_grades(scores):
+    """Vectorized letter grade for an array of percentages."""
+    from grades.models import GRADE_BANDS
+
+    bands = sorted(GRADE_BANDS)
+    thresholds = np.array([lower_bound for lower_bound, _ in bands[1:]])
+    letters = np.array([letter for _, letter in bands])
+    return letters[np.searchsorted(thresholds, scores, side='right')]
+
+
+def recommendations_for(X):
+    """Apply the recommendation rules to every row of a feature matrix."""
+    hits = np.column_stack([
+        compare(_column(X, name), threshold)
+        for name, compare, threshold, _ in RECOMMENDATION_RULES
+    ]) if len(X) else np.zeros((0, len(RECOMMENDATION_RULES)), dtype=bool)
+    messages = [message for *_, message in RECOMMENDATION_RULES]
+    return [
+        [message for message, hit in zip(messages, row) if hit] or [NO_RECOMMENDATIONS]
+        for row in hits
+    ]
+
+
+def performance_trends(X):
+    """Vectorized performance trend label for each row of a feature matrix."""
+    avg_score = _column(X, 'avg_score')
+    submission_rate = _column(X, 'submission_rate')
+    return np.select(
+        [
+            (avg_score >= 75) & (submission_rate >= 80),
+            (avg_score >= 60) & (submission_rate >= 70),
+            avg_score >= 50,
+        ],
+        ['Excellent', 'Good', 'Average'],
+        default='Needs Improvement',
     )
-    assignments = Assignment.objects.filter(classroom=classroom)
-    
-    # Calculate metrics
-    total_assignments = assignments.count()
-    submitted_count = submissions.count()
-    graded_count = grades.count()
-    
-    # Average score
-    if graded_count > 0:
-        avg_score = sum(float(g.marks_obtained) / float(g.total_marks) * 100 for g in grades)
-        avg_score = avg_score / graded_count
-    else:
-        avg_score = 0
-    
-    # Submission rate
-    submission_rate = (submitted_count / total_assignments * 100) if total_assignments > 0 else 0
-    
-    # On-time submission rate
-    on_time_count = 0
-    for submission in submissions:
-        if submission.assignment.deadline and submission.assignment.deadline >= submission.submitted_at:
-            on_time_count += 1
-    
-    on_time_rate = (on_time_count / submitted_count * 100) if submitted_count > 0 else 0
-    
-    # Participation score (simplified)
-    participation = min(100, submission_rate + (on_time_rate * 0.5))
-    
-    # Days since last submission
-    latest_submission = submissions.order_by('-submitted_at').first()
-    if latest_submission:
-        days_since_last = (timezone.now() - latest_submission.submitted_at).days
-    else:
-        days_since_last = 30  # Default for no submissions
-    
-    return {
-        'avg_score': avg_score,
-        'submission_rate': submission_rate,
-        'on_time_rate': on_time_rate,
-        'participation': participation,
-        'assignment_count': total_assignments,
-        'days_since_last': min(days_since_last, 30)  # Cap at 30 days
+
+
+def risk_indices_batch(X, models):
+    """Index into RISK_LEVELS and its probability for every row, in one model call."""
+    X_scaled = models['risk_scaler'].transform(X)
+    risk_model = models['risk_model']
+    # predict() is the argmax of predict_proba(), so evaluate the forest once
+    risk_proba = risk_model.predict_proba(X_scaled)
+    risk_pred = np.asarray(risk_model.classes_[np.argmax(risk_proba, axis=1)], dtype=int)
+
+    scores = risk_proba[np.arange(len(X)), np.minimum(risk_pred, risk_proba.shape[1] - 1)]
+    return np.minimum(risk_pred, len(RISK_LEVELS) - 1), scores
+
+
+def predict_risk_batch(X, models=None):
+    """
+    Score every row of a feature matrix with the risk model in one call.
+    Returns ``(risk_levels, risk_scores)`` arrays aligned with ``X``.
+    """
+    indices, scores = risk_indices_batch(X, models or load_local_models())
+    return np.array(RISK_LEVELS)[indices], scores
+
+
+def grade_scores_batch(X, models):
+    """Predicted final percentage for every row, in one model call."""
+    X_scaled = models['grade_scaler'].transform(X)
+    return np.clip(models['grade_model'].predict(X_scaled), 0, 100)
+
+
+def grade_outputs(X, scores):
+    """``(letters, scores, confidences)`` for predicted percentages of the rows of ``X``."""
+    # Simple confidence based on current performance
+    confidences = 0.7 + 0.3 * (_column(X, 'submission_rate') / 100)
+    return letter_grades(scores), scores, confidences
+
+
+def predict_grade_batch(X, models=None):
+    """
+    Predict final scores for every row of a feature matrix in one call.
+    Returns ``(letters, scores, confidences)`` arrays aligned with ``X``.
+    """
+    return grade_outputs(X, grade_scores_batch(X, models or load_local_models()))
+
+
+def _risk_fallback(message, features=None):
+    result = {
+        'risk_level': 'Medium',
+        'risk_score': 0.5,
+        'recommendations': [message],
     }
+    if features is not None:
+        result['features'] = features
+    return result
 
 
-def predict_student_risk(student, classroom):
-    """Predict risk level for a student"""
+def _grade_fallback(features=None):
+    result = {
+        'predicted_grade': 'B',
+        'predicted_score': 75.0,
+        'confidence': 0.5,
+    }
+    if features is not None:
+        result['features'] = features
+    return result
+
+
+def _risk_tuples(levels, scores):
+    return [(str(level), float(score)) for level, score in zip(levels, scores)]
+
+
+def _grade_tuples(letters, scores, confidences):
+    return [
+        (str(letter), float(score), float(confidence))
+        for letter, score, confidence in zip(letters, scores, confidences)
+    ]
+
+
+def _score_local(X, models):
     try:
-        models = load_models()
-        if not models:
-            return {
-                'risk_level': 'Medium',
-                'risk_score': 0.5,
-                'recommendations': ['ML models not available']
-            }
-        
-        # Collect features
-        features = collect_student_features(student, classroom)
-        
-        # Prepare input
-        feature_values = [
-            features['avg_score'],
-            features['submission_rate'], 
-            features['on_time_rate'],
-            features['participation'],
-            features['assignment_count'],
-            features['days_since_last']
-        ]
-        
-        X = np.array(feature_values).reshape(1, -1)
-        X_scaled = models['risk_scaler'].transform(X)
-        
-        # Make prediction
-        risk_pred = models['risk_model'].predict(X_scaled)[0]
-        risk_proba = models['risk_model'].predict_proba(X_scaled)[0]
-        
-        # Map to text
-        risk_levels = ['Low', 'Medium', 'High', 'Critical']
-        risk_level = risk_levels[min(risk_pred, len(risk_levels)-1)]
-        risk_score = float(risk_proba[min(risk_pred, len(risk_proba)-1)])
-        
-        # Generate recommendations
-        recommendations = []
-        if features['avg_score'] < 60:
-            recommendations.append("Focus on improving assignment quality")
-        if features['submission_rate'] < 70:
-            recommendations.append("Submit assignments more consistently")
-        if features['on_time_rate'] < 70:
-            recommendations.append("Improve time management for deadlines")
-        if features['days_since_last'] > 7:
-            recommendations.append("Stay more engaged with recent assignments")
-        
-        if not recommendations:
-            recommendations.append("Keep up the good work!")
-        
-        return {
-            'risk_level': risk_level,
-            'risk_score': risk_score,
-            'recommendations': recommendations,
-            'features': features
-        }
+        new_risks = _risk_tuples(*predict_risk_batch(X, models))
     except Exception as e:
-        print(f"Error in predict_student_risk: {e}")
-        return {
-            'risk_level': 'Medium',
-            'risk_score': 0.5,
-            'recommendations': ['Error calculating risk assessment'],
-            'features': {}
-        }
-
+        print(f"Error in predict_risk_batch: {e}")
+        new_risks = [None] * len(X)
 
-def predict_student_grade(student, classroom):
-    """Predict final grade for a student"""
     try:
-        models = load_models()
-        if not models:
-            return {
-                'predicted_grade': 'B',
-                'predicted_score': 75.0,
-                'confidence': 0.5
-            }
-        
-        # Collect features
-        features = collect_student_features(student, classroom)
-        
-        # Prepare input
-        feature_values = [
-            features['avg_score'],
-            features['submission_rate'],
-            features['on_time_rate'], 
-            features['participation'],
-            features['assignment_count'],
-            features['days_since_last']
+        new_grades = _grade_tuples(*predict_grade_batch(X, models))
+    except Exception as e:
+        print(f"Error in predict_grade_batch: {e}")
+        new_grades = [None] * len(X)
+    return new_risks, new_grades
+
+
+def _score_remote(X, client):
+    fingerprint, risk_index, risk_scores, grade_scores = client.predict(X)
+    new_risks = _risk_tuples(np.array(RISK_LEVELS)[risk_index], risk_scores)
+    new_grades = _grade_tuples(*grade_outputs(X, grade_scores))
+    return fingerprint, new_risks, new_grades
+
+
+def _score_rows(X, models):
+    """
+    Model outputs for each row of ``X``, as ``(risks, grades)`` lists holding
+    ``(risk_level, risk_score)`` and ``(letter, score, confidence)`` tuples, or
+    None where that model failed. Every row is counted by the drift monitor,
+    cached or not, so its histograms follow the live traffic. Rows already in
+    the prediction cache are not scored again; the rest go through each model
+    in one call. ``models`` may be an inference server handle; if the server
+    fails the rows are scored in process instead.
+    """
+    drift_monitor.observe(X)
+    keys = prediction_cache.keys(models['fingerprint'], X)
+    cached = [prediction_cache.get(key) for key in keys]
+    risks = [entry and entry[0] for entry in cached]
+    grades = [entry and entry[1] for entry in cached]
+    missing = [i for i, entry in enumerate(cached) if entry is None]
+    if not missing:
+        return risks, grades
+
+    X_missing = X[missing]
+    key_fingerprint = fingerprint = models['fingerprint']
+    client = models.get('inference_client')
+    if client is not None:
+        try:
+            fingerprint, new_risks, new_grades = _score_remote(X_missing, client)
+        except Exception as e:
+            print(f"Error in inference server, scoring in process: {e}")
+            client = None
+            models = load_local_models()
+    if client is None:
+        if models:
+            fingerprint = models['fingerprint']
+            new_risks, new_grades = _score_local(X_missing, models)
+        else:
+            new_risks = new_grades = [None] * len(missing)
+
+    # Results from other models than the keys were made for are not cached
+    cacheable = fingerprint == key_fingerprint
+    for i, risk, grade in zip(missing, new_risks, new_grades):
+        risks[i] = risk
+        grades[i] = grade
+        if cacheable and risk is not None and grade is not None:
+            prediction_cache.set(keys[i], (risk, grade))
+    return risks, grades
+
+
+def predict_batch(X):
+    """
+    Risk and grade analysis for every row of a feature matrix, scored with
+    one transform/predict/predict_proba call per model for the rows that are
+    not in the prediction cache.
+    """
+    feature_dicts = [feature_dict(row) for row in X]
+    models = load_models()
+    if not models:
+        return [
+            (_risk_fallback('ML models not available'), _grade_fallback())
+            for _ in feature_dicts
         ]
-        
-        X = np.array(feature_values).reshape(1, -1)
-        X_scaled = models['grade_scaler'].transform(X)
-        
-        # Make prediction
-        predicted_score = models['grade_model'].predict(X_scaled)[0]
-        predicted_score = np.clip(predicted_score, 0, 100)
-        
-        # Convert to letter grade
-        if predicted_score >= 90:
-            predicted_grade = 'A+'
-        elif predicted_score >= 80:
-            predicted_grade = 'A'
-        elif predicted_score >= 70:
-            predicted_grade = 'B+'
-        elif predicted_score >= 60:
-            predicted_grade = 'B'
-        elif predicted_score >= 50:
-            predicted_grade = 'C+'
-        elif predicted_score >= 40:
-            predicted_grade = 'C'
-        elif predicted_score >= 30:
-            predicted_grade = 'D'
+
+    risks, grades = _score_rows(X, models)
+    recommendations = recommendations_for(X)
+    results = []
+    for i, features in enumerate(feature_dicts):
+        if risks[i] is None:
+            risk_analysis = _risk_fallback('Error calculating risk assessment', {})
         else:
-            predicted_grade = 'F'
-        
-        # Simple confidence based on current performance
-        current_avg = features['avg_score']
-        confidence = 0.7 + 0.3 * (features['submission_rate'] / 100)
-        
-        return {
-            'predicted_grade': predicted_grade,
-            'predicted_score': round(float(predicted_score), 1),
-            'confidence': round(confidence, 2),
-            'features': features
-        }
-    except Exception as e:
-        print(f"Error in predict_student_grade: {e}")
-        return {
-            'predicted_grade': 'B',
-            'predicted_score': 75.0,
-            'confidence': 0.5,
-            'features': {}
-        }
+            risk_level, risk_score = risks[i]
+            risk_analysis = {
+                'risk_level': risk_level,
+                'risk_score': risk_score,
+                'recommendations': recommendations[i],
+                'features': features,
+            }
+        if grades[i] is None:
+            grade_analysis = _grade_fallback({})
+        else:
+            letter, score, confidence = grades[i]
+            grade_analysis = {
+                'predicted_grade': letter,
+                'predicted_score': round(score, 1),
+                'confidence': round(confidence, 2),
+                'features': features,
+            }
+        results.append((risk_analysis, grade_analysis))
+    return results
+
+
+def _student_matrix(student, classroom, features):
+    if features is None:
+        features = collect_student_features(student, classroom)
+    return np.array([[features[name] for name in FEATURE_NAMES]])
+
+
+def predict_student_risk(student, classroom, features=None):
+    """Predict risk level for a student"""
+    return predict_batch(_student_matrix(student, classroom, features))[0][0]
+
+
+def predict_student_grade(student, classroom, features=None):
+    """Predict final grade for a student"""
+    return predict_batch(_student_matrix(student, classroom, features))[0][1]
+
+
+def analytics_for_matrix(X):
+    """Complete analytics (risk, grade, trend) for each row of a feature matrix."""
+    trends = performance_trends(X) if len(X) else []
+    analytics = []
+    for (risk_analysis, grade_analysis), trend in zip(predict_batch(X), trends):
+        trend = str(trend)
+        analytics.append({
+            'risk_analysis': risk_analysis,
+            'grade_analysis': grade_analysis,
+            'performance_trend': trend,
+            'summary': f"Risk: {risk_analysis['risk_level']}, Predicted: {grade_analysis['predicted_grade']}, Trend: {trend}"
+        })
+    return analytics
+
+
+def get_classroom_analytics(classroom, student_ids=None):
+    """
+    Analytics for many students of a classroom at once: features come from
+    grouped queries and both models score the whole class in one call each.
+    Returns a dict of student id -> analytics.
+    """
+    student_ids, X = collect_classroom_features(classroom, student_ids)
+    return dict(zip(student_ids, analytics_for_matrix(X)))
 
 
 def get_student_analytics(student, classroom):
     """Get complete analytics for a student"""
-    risk_analysis = predict_student_risk(student, classroom)
-    grade_analysis = predict_student_grade(student, classroom)
-    
-    # Determine trend
-    features = risk_analysis['features']
-    if features['avg_score'] >= 75 and features['submission_rate'] >= 80:
-        trend = 'Excellent'
-    elif features['avg_score'] >= 60 and features['submission_rate'] >= 70:
-        trend = 'Good'
-    elif features['avg_score'] >= 50:
-        trend = 'Average'
-    else:
-        trend = 'Needs Improvement'
-    
-    return {
-        'risk_analysis': risk_analysis,
-        'grade_analysis': grade_analysis,
-        'performance_trend': trend,
-        'summary': f"Risk: {risk_analysis['risk_level']}, Predicted: {grade_analysis['predicted_grade']}, Trend: {trend}"
-    }
\ No newline at end of file
+    return get_classroom_analytics(classroom, [student.id])[student.id]
@@ -0,0 +1,186 @@
+"""Process-wide registry of the trained ML models."""
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import joblib
+except ImportError:
+    joblib = None
+
+from ml.compiled import COMPILED_FILE, load_compiled, source_digest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, 'ml', 'models')
+
+MODEL_FILES = {
+    'risk_model': 'risk_model.pkl',
+    'risk_scaler': 'risk_scaler.pkl',
+    'grade_model': 'grade_model.pkl',
+    'grade_scaler': 'grade_scaler.pkl',
+}
+METADATA_FILE = 'metadata.json'
+
+
+class ModelRegistry:
+    """
+    Loads the models once per process and reloads them when the files in
+    ``models_dir`` change.
+
+    File signatures (mtime and size) are checked at most once every
+    ``check_interval`` seconds. A reload builds a complete new bundle before
+    swapping it in, so callers always see a consistent set of models; if a
+    reload fails the previous bundle stays in service.
+
+    When ``compiled_models.npz`` was exported from the current pickles it is
+    loaded instead of them, so serving does not need scikit-learn; with
+    ``use_compiled=False``, or a stale compiled file, the pickles are used.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, check_interval=2.0, use_compiled=True):
+        self.models_dir = models_dir
+        self.check_interval = check_interval
+        self.use_compiled = use_compiled
+        self._lock = threading.Lock()
+        self._bundle = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._metrics = {
+            'version': None,
+            'fingerprint': None,
+            'engine': None,
+            'loaded_at': None,
+            'load_seconds': {},
+            'loads': 0,
+            'reload_failures': 0,
+            'last_error': None,
+        }
+
+    def _paths(self):
+        names = list(MODEL_FILES.values()) + [METADATA_FILE, COMPILED_FILE]
+        return [os.path.join(self.models_dir, name) for name in names]
+
+    def _current_signature(self):
+        signature = []
+        for path in self._paths():
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _read_metadata(self):
+        try:
+            with open(os.path.join(self.models_dir, METADATA_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_compiled(self):
+        path = os.path.join(self.models_dir, COMPILED_FILE)
+        if not self.use_compiled or not os.path.exists(path):
+            return None
+        models = load_compiled(path)
+        if models.pop('source') != source_digest(self.models_dir):
+            print("Compiled models are out of date, loading the pickled models")
+            return None
+        return models
+
+    def _load(self, signature):
+        timings = {}
+        started = time.perf_counter()
+        models = self._load_compiled()
+        if models is not None:
+            engine = 'compiled'
+            timings['compiled'] = round(time.perf_counter() - started, 6)
+        elif joblib is None:
+            raise RuntimeError('joblib is not installed and no compiled models are available')
+        else:
+            engine = 'sklearn'
+            models = {}
+            for name, filename in MODEL_FILES.items():
+                started = time.perf_counter()
+                models[name] = joblib.load(os.path.join(self.models_dir, filename))
+                timings[name] = round(time.perf_counter() - started, 6)
+
+        metadata = self._read_metadata()
+        fingerprint = hashlib.sha1(repr(signature).encode()).hexdigest()[:12]
+        models['metadata'] = metadata
+        models['version'] = str(metadata.get('version') or metadata.get('training_date') or fingerprint)
+        models['fingerprint'] = fingerprint
+        models['engine'] = engine
+        return models, timings
+
+    def get(self):
+        """Return the current model bundle, reloading it if the files changed."""
+        now = time.monotonic()
+        if self._bundle is not None and now - self._checked_at < self.check_interval:
+            return self._bundle
+
+        with self._lock:
+            if self._bundle is not None and now - self._checked_at < self.check_interval:
+                return self._bundle
+            signature = self._current_signature()
+            self._checked_at = now
+            if self._bundle is not None and signature == self._signature:
+                return self._bundle
+
+            try:
+                bundle, timings = self._load(signature)
+            except Exception as e:
+                print(f"Error loading models: {e}")
+                self._metrics['reload_failures'] += 1
+                self._metrics['last_error'] = str(e)
+                return self._bundle
+
+            self._bundle = bundle
+            self._signature = signature
+            self._metrics.update({
+                'version': bundle['version'],
+                'fingerprint': bundle['fingerprint'],
+                'engine': bundle['engine'],
+                'loaded_at': time.time(),
+                'load_seconds': timings,
+                'loads': self._metrics['loads'] + 1,
+                'last_error': None,
+            })
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener(bundle)
+        return bundle
+
+    def on_reload(self, listener):
+        """Call ``listener(bundle)`` every time a new bundle is loaded."""
+        self._listeners.append(listener)
+        return listener
+
+    def clear(self):
+        """Drop the loaded models; the next ``get`` loads them again."""
+        with self._lock:
+            self._bundle = None
+            self._signature = None
+            self._checked_at = 0.0
+
+    @property
+    def version(self):
+        return self._metrics['version']
+
+    @property
+    def fingerprint(self):
+        """Changes whenever any model file changes, even if metadata does not."""
+        return self._metrics['fingerprint']
+
+    def metrics(self):
+        metrics = dict(self._metrics)
+        metrics['load_seconds'] = dict(metrics['load_seconds'])
+        metrics['loaded'] = self._bundle is not None
+        metrics['models_dir'] = self.models_dir
+        return metrics
+
+
+registry = ModelRegistry()
@@ -1,221 +1,564 @@
 """
 Simple ML training script for student risk assessment and grade prediction.
 """
+import json
 import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import numpy as np
 import pandas as pd
 import joblib
 from datetime import datetime
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
+from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ParameterGrid, cross_val_score, train_test_split
 from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
 
 # Get the project base directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 ML_DIR = os.path.join(BASE_DIR, 'ml')
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
 
 
-def generate_synthetic_data(n_samples=2000):
-    """Generate synthetic student performance data"""
-    np.random.seed(42)
-    
-    data = []
-    for i in range(n_samples):
-        # Base academic ability (affects all metrics)
-        ability = np.random.normal(0.7, 0.2)
-        ability = np.clip(ability, 0.1, 1.0)
-        
-        # Motivation level
-        motivation = np.random.normal(0.75, 0.15)
-        motivation = np.clip(motivation, 0.2, 1.0)
-        
-        # Generate correlated features
-        avg_score = ability * 90 + np.random.normal(0, 5)
-        submission_rate = motivation * 95 + np.random.normal(0, 8)
-        on_time_rate = (ability + motivation) / 2 * 90 + np.random.normal(0, 10)
-        participation = motivation * 80 + np.random.normal(0, 10)
-        
-        # Clip values to reasonable ranges
-        avg_score = np.clip(avg_score, 0, 100)
-        submission_rate = np.clip(submission_rate, 0, 100)
-        on_time_rate = np.clip(on_time_rate, 0, 100)
-        participation = np.clip(participation, 0, 100)
-        
-        # Create risk level based on performance
-        risk_score = 0
-        if avg_score < 40: risk_score += 3
-        elif avg_score < 60: risk_score += 2
-        elif avg_score < 70: risk_score += 1
-        
-        if submission_rate < 50: risk_score += 2
-        elif submission_rate < 70: risk_score += 1
-        
-        if on_time_rate < 50: risk_score += 2
-        elif on_time_rate < 70: risk_score += 1
-        
-        # Map to risk levels
-        if risk_score == 0: risk_level = 0  # Low
-        elif risk_score <= 2: risk_level = 1  # Medium  
-        elif risk_score <= 4: risk_level = 2  # High
-        else: risk_level = 3  # Critical
-        
-        # Generate final grade
-        final_grade = (avg_score * 0.4 + submission_rate * 0.2 + 
-                      on_time_rate * 0.2 + participation * 0.2)
-        final_grade = np.clip(final_grade + np.random.normal(0, 5), 0, 100)
-        
-        data.append({
-            'avg_score': avg_score,
-            'submission_rate': submission_rate,
-            'on_time_rate': on_time_rate,
-            'participation': participation,
-            'assignment_count': np.random.randint(5, 20),
-            'days_since_last': np.random.exponential(5),
-            'risk_level': risk_level,
-            'final_grade': final_grade
-        })
-    
-    return pd.DataFrame(data)
-
-
-def train_risk_model(data):
-    """Train risk assessment model"""
-    print("Training risk assessment model...")
-    
-    # Prepare features
-    features = ['avg_score', 'submission_rate', 'on_time_rate', 'participation', 
-               'assignment_count', 'days_since_last']
-    X = data[features]
-    y = data['risk_level']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
+FEATURES = ['avg_score', 'submission_rate', 'on_time_rate', 'participation',
+            'assignment_count', 'days_since_last']
+COLUMNS = FEATURES + ['risk_level', 'final_grade']
+INT_COLUMNS = ('assignment_count', 'risk_level')
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_SEARCH_BUDGET = 300
+CV_FOLDS = 3
+
+# Estimator, target column, default hyperparameters and search grid per model.
+# The default hyperparameters are always the first search candidate.
+MODEL_SPECS = {
+    'risk': {
+        'estimator': RandomForestClassifier,
+        'target': 'risk_level',
+        'scoring': 'accuracy',
+        'defaults': {'n_estimators': 100, 'random_state': 42},
+        'grid': {
+            'n_estimators': [100, 200],
+            'max_depth': [None, 10, 20],
+            'min_samples_leaf': [1, 2, 5],
+        },
+    },
+    'grade': {
+        'estimator': GradientBoostingRegressor,
+        'target': 'final_grade',
+        'scoring': 'r2',
+        'defaults': {'n_estimators': 100, 'random_state': 42},
+        'grid': {
+            'n_estimators': [100, 200],
+            'learning_rate': [0.05, 0.1],
+            'max_depth': [2, 3, 4],
+            'subsample': [1.0, 0.8],
+        },
+    },
+}
+
+
+def _risk_points(values, thresholds):
+    """Points for each value below the ``(threshold, points)`` steps, highest first."""
+    conditions = [values < threshold for threshold, _ in thresholds]
+    return np.select(conditions, [points for _, points in thresholds], default=0)
+
+
+def risk_levels(avg_score, submission_rate, on_time_rate):
+    """Risk level (0 Low to 3 Critical) for arrays of performance metrics."""
+    risk_score = (
+        _risk_points(avg_score, [(40, 3), (60, 2), (70, 1)])
+        + _risk_points(submission_rate, [(50, 2), (70, 1)])
+        + _risk_points(on_time_rate, [(50, 2), (70, 1)])
+    )
+    # Low (0), Medium (1-2), High (3-4), Critical (5+)
+    return np.searchsorted([0, 2, 4], risk_score, side='left')
+
+
+def synthetic_chunk(rng, n_samples):
+    """Generate ``n_samples`` rows of synthetic student data as NumPy columns."""
+    # Base academic ability (affects all metrics) and motivation level
+    ability = np.clip(rng.normal(0.7, 0.2, n_samples), 0.1, 1.0)
+    motivation = np.clip(rng.normal(0.75, 0.15, n_samples), 0.2, 1.0)
+
+    # Generate correlated features, clipped to reasonable ranges
+    avg_score = np.clip(ability * 90 + rng.normal(0, 5, n_samples), 0, 100)
+    submission_rate = np.clip(motivation * 95 + rng.normal(0, 8, n_samples), 0, 100)
+    on_time_rate = np.clip((ability + motivation) / 2 * 90 + rng.normal(0, 10, n_samples), 0, 100)
+    participation = np.clip(motivation * 80 + rng.normal(0, 10, n_samples), 0, 100)
+
+    # Create risk level based on performance
+    risk_level = risk_levels(avg_score, submission_rate, on_time_rate)
+
+    # Generate final grade
+    final_grade = (avg_score * 0.4 + submission_rate * 0.2 +
+                   on_time_rate * 0.2 + participation * 0.2)
+    final_grade = np.clip(final_grade + rng.normal(0, 5, n_samples), 0, 100)
+
+    return {
+        'avg_score': avg_score,
+        'submission_rate': submission_rate,
+        'on_time_rate': on_time_rate,
+        'participation': participation,
+        'assignment_count': rng.integers(5, 20, n_samples),
+        'days_since_last': rng.exponential(5, n_samples),
+        'risk_level': risk_level,
+        'final_grade': final_grade,
+    }
+
+
+def iter_synthetic_chunks(n_samples, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield synthetic student performance data as DataFrames of up to
+    ``chunk_size`` rows. The same seed and chunk size always give the same
+    data.
+    """
+    rng = np.random.default_rng(seed)
+    chunk_size = max(1, chunk_size)
+    for start in range(0, n_samples, chunk_size):
+        yield pd.DataFrame(synthetic_chunk(rng, min(chunk_size, n_samples - start)), columns=COLUMNS)
+
+
+def generate_synthetic_data(n_samples=2000, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generate synthetic student performance data in memory, ``chunk_size``
+    rows at a time into preallocated columns.
+    """
+    columns = {
+        name: np.empty(n_samples, dtype=np.int64 if name in INT_COLUMNS else np.float64)
+        for name in COLUMNS
+    }
+    start = 0
+    for chunk in iter_synthetic_chunks(n_samples, seed, chunk_size):
+        stop = start + len(chunk)
+        for name in COLUMNS:
+            columns[name][start:stop] = chunk[name].to_numpy()
+        start = stop
+    return pd.DataFrame(columns, columns=COLUMNS, copy=False)
+
+
+def write_synthetic_data(path, n_samples=2000, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write synthetic data to a CSV file one chunk at a time, so memory stays
+    bounded by ``chunk_size`` whatever ``n_samples`` is. Gives the same rows
+    as ``generate_synthetic_data``; read them back with ``read_training_data``.
+    """
+    for i, chunk in enumerate(iter_synthetic_chunks(n_samples, seed, chunk_size)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    if n_samples <= 0:
+        pd.DataFrame(columns=COLUMNS).to_csv(path, index=False)
+    return n_samples
+
+
+def read_training_data(path):
+    """Load a CSV written by ``write_synthetic_data``, with the same values and dtypes."""
+    return pd.read_csv(
+        path,
+        dtype={name: np.int64 if name in INT_COLUMNS else np.float64 for name in COLUMNS},
+        float_precision='round_trip',
+    )
+
+
+def compile_trees(trees):
+    """Flatten fitted decision trees into one node table (see ml.compiled.CompiledTrees)."""
+    feature, threshold, left, right, values, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        tree = tree.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        values.append(tree.value[:, 0, :])
+        offset += tree.node_count
+    return {
+        'feature': np.concatenate(feature).astype(np.intp),
+        'threshold': np.concatenate(threshold),
+        'children': np.column_stack([np.concatenate(right), np.concatenate(left)]).astype(np.intp),
+        'roots': np.array(roots, dtype=np.intp),
+        'max_depth': np.array(max(tree.tree_.max_depth for tree in trees)),
+    }, np.concatenate(values)
+
+
+def compile_models(risk_model, risk_scaler, grade_model, grade_scaler):
+    """Flat arrays for the scalers, the random forest and the gradient boosting model."""
+    arrays = {}
+    for name, scaler in (('risk', risk_scaler), ('grade', grade_scaler)):
+        arrays[f'{name}_scaler_mean'] = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        arrays[f'{name}_scaler_scale'] = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+
+    trees, values = compile_trees(risk_model.estimators_)
+    # Per-leaf class probabilities, normalized as DecisionTreeClassifier does
+    totals = values.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1
+    arrays.update({f'risk_{key}': value for key, value in trees.items()})
+    arrays['risk_values'] = values / totals
+    arrays['risk_classes'] = risk_model.classes_
+
+    trees, values = compile_trees(grade_model.estimators_[:, 0])
+    arrays.update({f'grade_{key}': value for key, value in trees.items()})
+    arrays['grade_values'] = values[:, 0]
+    zero = np.zeros((1, grade_model.n_features_in_))
+    arrays['grade_init'] = np.array(0.0 if grade_model.init_ == 'zero' else float(grade_model.init_.predict(zero)[0]))
+    arrays['grade_learning_rate'] = np.array(grade_model.learning_rate)
+    return arrays
+
+
+def verify_compiled_models(models, compiled, X):
+    """
+    Compare the compiled models with scikit-learn on the feature matrix
+    ``X``. Returns the largest differences; ``matches`` is True when the
+    predicted classes are identical and every probability and score agrees
+    to within 1e-9.
+    """
+    report = {'rows': len(X)}
+    for name in ('risk', 'grade'):
+        expected = models[f'{name}_scaler'].transform(X)
+        actual = compiled[f'{name}_scaler'].transform(X)
+        report[f'{name}_scaler_max_diff'] = float(np.abs(expected - actual).max(initial=0))
+
+    X_scaled = models['risk_scaler'].transform(X)
+    report['risk_label_mismatches'] = int(
+        (models['risk_model'].predict(X_scaled) != compiled['risk_model'].predict(X_scaled)).sum()
+    )
+    report['risk_proba_max_diff'] = float(np.abs(
+        models['risk_model'].predict_proba(X_scaled) - compiled['risk_model'].predict_proba(X_scaled)
+    ).max(initial=0))
+
+    X_scaled = models['grade_scaler'].transform(X)
+    report['grade_max_diff'] = float(np.abs(
+        models['grade_model'].predict(X_scaled) - compiled['grade_model'].predict(X_scaled)
+    ).max(initial=0))
+
+    report['matches'] = report['risk_label_mismatches'] == 0 and max(
+        report['risk_scaler_max_diff'], report['grade_scaler_max_diff'],
+        report['risk_proba_max_diff'], report['grade_max_diff'],
+    ) <= 1e-9
+    return report
+
+
+def verification_matrix(data=None, n_random=5000, n_data=20000, seed=DEFAULT_SEED):
+    """
+    Features to verify compiled models on: up to ``n_data`` training rows plus
+    ``n_random`` random rows across the feature ranges.
+    """
+    rng = np.random.default_rng(seed)
+    random_rows = np.column_stack([
+        rng.uniform(0, 100, n_random),
+        rng.uniform(0, 120, n_random),
+        rng.uniform(0, 100, n_random),
+        rng.uniform(0, 100, n_random),
+        rng.integers(0, 40, n_random),
+        rng.integers(0, 31, n_random),
+    ])
+    if data is None:
+        return random_rows
+    sample = data[FEATURES].sample(min(len(data), n_data), random_state=seed)
+    return np.vstack([sample.to_numpy(dtype=np.float64), random_rows])
+
+
+def export_compiled_models(models_dir=None, X=None):
+    """
+    Compile the pickled models in ``models_dir`` to compiled_models.npz,
+    verified against scikit-learn on ``X`` (random rows by default). The file
+    is only written when the outputs match. Returns the verification report.
+    """
+    from ml.compiled import COMPILED_FILE, load_compiled, source_digest
+
+    models_dir = models_dir or os.path.join(ML_DIR, 'models')
+    models = {
+        name: joblib.load(os.path.join(models_dir, f'{name}.pkl'))
+        for name in ('risk_model', 'risk_scaler', 'grade_model', 'grade_scaler')
+    }
+    arrays = compile_models(**models)
+    arrays['source'] = np.array(source_digest(models_dir))
+
+    path = os.path.join(models_dir, COMPILED_FILE)
+    building = os.path.join(models_dir, f'building_{COMPILED_FILE}')
+    # Stored uncompressed so that the arrays can be memory-mapped when serving
+    np.savez(building, **arrays)
+    report = verify_compiled_models(models, load_compiled(building), verification_matrix() if X is None else X)
+    if not report['matches']:
+        os.remove(building)
+        raise ValueError(f'Compiled models do not match scikit-learn: {report}')
+    os.replace(building, path)
+    return report
+
+
+def _split(data, name):
+    X = data[FEATURES]
+    y = data[MODEL_SPECS[name]['target']]
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+def fit_model(name, X_train, X_test, y_train, y_test, params=None):
+    """
+    Fit one model and its scaler on the training split and score it on the
+    test split. Returns ``(model, scaler, scores, seconds)``.
+    """
+    spec = MODEL_SPECS[name]
+    started = time.perf_counter()
+
     # Scale features
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
-    
+
     # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = spec['estimator'](**{**spec['defaults'], **(params or {})})
     model.fit(X_train_scaled, y_train)
-    
+
     # Evaluate
     y_pred = model.predict(X_test_scaled)
-    accuracy = accuracy_score(y_test, y_pred)
-    print(f"Risk model accuracy: {accuracy:.3f}")
-    
-    # Save model and scaler
-    models_dir = os.path.join(ML_DIR, 'models')
-    joblib.dump(model, os.path.join(models_dir, 'risk_model.pkl'))
-    joblib.dump(scaler, os.path.join(models_dir, 'risk_scaler.pkl'))
-    
-    return model, scaler, accuracy
+    if name == 'risk':
+        scores = {'accuracy': float(accuracy_score(y_test, y_pred))}
+    else:
+        scores = {
+            'r2': float(r2_score(y_test, y_pred)),
+            'mse': float(mean_squared_error(y_test, y_pred)),
+        }
+    return model, scaler, scores, time.perf_counter() - started
+
+
+def save_model(name, model, scaler, models_dir=None):
+    models_dir = models_dir or os.path.join(ML_DIR, 'models')
+    joblib.dump(model, os.path.join(models_dir, f'{name}_model.pkl'))
+    joblib.dump(scaler, os.path.join(models_dir, f'{name}_scaler.pkl'))
+
+
+def train_risk_model(data, params=None):
+    """Train risk assessment model"""
+    print("Training risk assessment model...")
+    model, scaler, scores, _ = fit_model('risk', *_split(data, 'risk'), params)
+    print(f"Risk model accuracy: {scores['accuracy']:.3f}")
+    save_model('risk', model, scaler)
+    return model, scaler, scores['accuracy']
 
 
-def train_grade_model(data):
+def train_grade_model(data, params=None):
     """Train grade prediction model"""
     print("Training grade prediction model...")
-    
-    # Prepare features  
-    features = ['avg_score', 'submission_rate', 'on_time_rate', 'participation',
-               'assignment_count', 'days_since_last']
-    X = data[features]
-    y = data['final_grade']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
-    # Train model
-    model = GradientBoostingRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train_scaled, y_train)
-    
-    # Evaluate
-    y_pred = model.predict(X_test_scaled)
-    mse = mean_squared_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
-    print(f"Grade model R²: {r2:.3f}, MSE: {mse:.3f}")
-    
-    # Save model and scaler
+    model, scaler, scores, _ = fit_model('grade', *_split(data, 'grade'), params)
+    print(f"Grade model R²: {scores['r2']:.3f}, MSE: {scores['mse']:.3f}")
+    save_model('grade', model, scaler)
+    return model, scaler, scores['r2']
+
+
+# Training data of the current search, set once per worker process so that
+# candidates do not pickle the data with every task
+_search_data = {}
+
+
+def _init_search_worker(X, y):
+    _search_data['X'] = X
+    _search_data['y'] = y
+
+
+def _evaluate_candidate(name, params):
+    spec = MODEL_SPECS[name]
+    started = time.perf_counter()
+    pipeline = make_pipeline(StandardScaler(), spec['estimator'](**{**spec['defaults'], **params}))
+    scores = cross_val_score(pipeline, _search_data['X'], _search_data['y'], cv=CV_FOLDS, scoring=spec['scoring'])
+    return params, float(scores.mean()), time.perf_counter() - started
+
+
+def search_candidates(name):
+    """Search candidates for a model, starting with its default hyperparameters."""
+    spec = MODEL_SPECS[name]
+    base = {**spec['estimator']().get_params(), **spec['defaults']}
+    defaults = {key: base[key] for key in spec['grid']}
+    return [defaults] + [params for params in ParameterGrid(spec['grid']) if params != defaults]
+
+
+def search_hyperparameters(name, X_train, y_train, budget=DEFAULT_SEARCH_BUDGET, workers=None):
+    """
+    Cross-validated search over the model's grid, with candidates spread over
+    a pool of ``workers`` processes (all cores by default).
+
+    No candidate is started once ``budget`` seconds have passed; candidates
+    already running are allowed to finish, and at least the first round is
+    always evaluated. Returns a dict with the best parameters, their mean CV
+    score and how many candidates were evaluated.
+    """
+    workers = workers or os.cpu_count() or 1
+    deadline = time.monotonic() + budget
+    pending = iter(search_candidates(name))
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker, initargs=(X_train, y_train)) as pool:
+        running = set()
+        for params in pending:
+            running.add(pool.submit(_evaluate_candidate, name, params))
+            if len(running) >= workers:
+                break
+        while running:
+            done, running = wait(running, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if time.monotonic() >= deadline:
+                results.extend(future.result() for future in running)
+                break
+            for _ in done:
+                params = next(pending, None)
+                if params is not None:
+                    running.add(pool.submit(_evaluate_candidate, name, params))
+
+    best_params, best_score, _ = max(results, key=lambda result: result[1])
+    return {
+        'params': best_params,
+        'cv_score': best_score,
+        'scoring': MODEL_SPECS[name]['scoring'],
+        'candidates': len(results),
+        'total_candidates': len(search_candidates(name)),
+    }
+
+
+def _fit_model_task(name, data, params):
+    return fit_model(name, *_split(data, name), params)
+
+
+def fit_and_save_models(data, parallel=False, search=False, search_budget=DEFAULT_SEARCH_BUDGET, workers=None, extra_metadata=None, timings=None):
+    """
+    Train both models on ``data`` and save them with metadata.json.
+
+    ``search`` runs a cross-validated hyperparameter search for each model
+    first, sharing ``search_budget`` seconds between them; ``parallel`` fits
+    the two final models at the same time in separate processes. Returns the
+    metadata, including the wall-clock time of every stage (added to any
+    earlier stages passed in ``timings``).
+    """
+    timings = dict(timings or {})
+    params = {name: {} for name in MODEL_SPECS}
+    searches = {}
+
+    if search:
+        per_model_budget = search_budget / len(MODEL_SPECS)
+        for name in MODEL_SPECS:
+            print(f"Searching {name} model hyperparameters...")
+            started = time.perf_counter()
+            X_train, _, y_train, _ = _split(data, name)
+            searches[name] = search_hyperparameters(name, X_train, y_train, per_model_budget, workers)
+            params[name] = searches[name]['params']
+            timings[f'search_{name}'] = round(time.perf_counter() - started, 3)
+            print(
+                f"Best {name} parameters: {params[name]} "
+                f"(CV {searches[name]['scoring']} {searches[name]['cv_score']:.3f}, "
+                f"{searches[name]['candidates']}/{searches[name]['total_candidates']} candidates)"
+            )
+
+    print("Training models in parallel..." if parallel else "Training models...")
+    started = time.perf_counter()
+    if parallel:
+        with ProcessPoolExecutor(max_workers=len(MODEL_SPECS)) as pool:
+            futures = {name: pool.submit(_fit_model_task, name, data, params[name]) for name in MODEL_SPECS}
+            fitted = {name: future.result() for name, future in futures.items()}
+    else:
+        fitted = {name: _fit_model_task(name, data, params[name]) for name in MODEL_SPECS}
+    timings['train'] = round(time.perf_counter() - started, 3)
+    for name, (_, _, _, seconds) in fitted.items():
+        timings[f'fit_{name}'] = round(seconds, 3)
+
+    started = time.perf_counter()
     models_dir = os.path.join(ML_DIR, 'models')
-    joblib.dump(model, os.path.join(models_dir, 'grade_model.pkl'))
-    joblib.dump(scaler, os.path.join(models_dir, 'grade_scaler.pkl'))
-    
-    return model, scaler, r2
+    for name, (model, scaler, _, _) in fitted.items():
+        save_model(name, model, scaler, models_dir)
+    timings['save'] = round(time.perf_counter() - started, 3)
 
+    print("Compiling models for NumPy inference...")
+    started = time.perf_counter()
+    verification = export_compiled_models(models_dir, verification_matrix(data))
+    timings['compile'] = round(time.perf_counter() - started, 3)
+    print(f"Compiled models verified on {verification['rows']} rows")
 
-def train_and_save_models(samples=2000):
-    """Train and save ML models with specified number of samples."""
-    print(f"Starting ML model training with {samples} samples...")
-    
-    # Generate synthetic data
-    print("Generating synthetic data...")
-    data = generate_synthetic_data(samples)
-    
-    # Create data directory if it doesn't exist
-    data_dir = os.path.join(ML_DIR, 'data')
-    os.makedirs(data_dir, exist_ok=True)
-    
-    # Save data
-    data.to_csv(os.path.join(data_dir, 'training_data.csv'), index=False)
-    print(f"Data saved to {data_dir}/training_data.csv")
-    
-    # Train models
-    risk_model, risk_scaler, risk_acc = train_risk_model(data)
-    grade_model, grade_scaler, grade_r2 = train_grade_model(data)
-    
-    # Save metadata
+    # Reference histograms the drift monitor compares live features with
+    from ml.drift import build_reference, save_reference
+    reference = build_reference(data[FEATURES].to_numpy())
+    save_reference(reference, models_dir)
+
+    risk_scores = fitted['risk'][2]
+    grade_scores = fitted['grade'][2]
     metadata = {
         'training_date': datetime.now().isoformat(),
         'samples': len(data),
-        'risk_accuracy': float(risk_acc),
-        'grade_r2': float(grade_r2),
-        'features': ['avg_score', 'submission_rate', 'on_time_rate', 'participation',
-                    'assignment_count', 'days_since_last']
+        **(extra_metadata or {}),
+        'risk_accuracy': risk_scores['accuracy'],
+        'grade_r2': grade_scores['r2'],
+        'grade_mse': grade_scores['mse'],
+        'risk_params': {**MODEL_SPECS['risk']['defaults'], **params['risk']},
+        'grade_params': {**MODEL_SPECS['grade']['defaults'], **params['grade']},
+        'features': FEATURES,
+        'compiled': verification,
+        'feature_reference': reference['id'],
     }
-    
-    import json
-    models_dir = os.path.join(ML_DIR, 'models')
+    if searches:
+        metadata['search'] = {**searches, 'budget_seconds': search_budget}
+    metadata['timings'] = timings
+
     with open(os.path.join(models_dir, 'metadata.json'), 'w') as f:
         json.dump(metadata, f, indent=2)
-    
+
     print("\nTraining completed!")
-    print(f"Risk model accuracy: {risk_acc:.3f}")
-    print(f"Grade model R²: {grade_r2:.3f}")
+    print(f"Risk model accuracy: {risk_scores['accuracy']:.3f}")
+    print(f"Grade model R²: {grade_scores['r2']:.3f}")
     print(f"Models saved to: {models_dir}")
-    
-    return True
+    return metadata
+
+
+def train_and_save_models(samples=2000, seed=DEFAULT_SEED, chunk_size=DEFAULT_CHUNK_SIZE, **options):
+    """
+    Train and save ML models with specified number of samples. ``options``
+    are passed on to ``fit_and_save_models``.
+    """
+    print(f"Starting ML model training with {samples} samples...")
+
+    # Create data directory if it doesn't exist
+    data_dir = os.path.join(ML_DIR, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+
+    # Generate synthetic data straight to disk, chunk by chunk, then load
+    # the one copy the models are fitted on
+    print("Generating synthetic data...")
+    started = time.perf_counter()
+    path = os.path.join(data_dir, 'training_data.csv')
+    write_synthetic_data(path, samples, seed=seed, chunk_size=chunk_size)
+    generate_seconds = round(time.perf_counter() - started, 3)
+    print(f"Data saved to {path}")
+    data = read_training_data(path)
+
+    return fit_and_save_models(
+        data, extra_metadata={'source': 'synthetic', 'seed': seed}, timings={'generate': generate_seconds}, **options
+    )
 
 
 def main():
     """Main training function"""
-    train_and_save_models(2000)
-    
-    # Save metadata
-    metadata = {
-        'training_date': datetime.now().isoformat(),
-        'samples': len(data),
-        'risk_accuracy': risk_acc,
-        'grade_r2': grade_r2,
-        'features': ['avg_score', 'submission_rate', 'on_time_rate', 'participation',
-                    'assignment_count', 'days_since_last']
-    }
-    
-    import json
-    with open(os.path.join(ML_DIR, 'models', 'metadata.json'), 'w') as f:
-        json.dump(metadata, f, indent=2)
-    
-    print("\nTraining completed!")
-    print(f"Risk model accuracy: {risk_acc:.3f}")
-    print(f"Grade model R²: {grade_r2:.3f}")
-    print(f"Models saved to: {os.path.join(ML_DIR, 'models')}")
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--parallel', action='store_true')
+    parser.add_argument('--search', action='store_true')
+    parser.add_argument('--search-budget', type=float, default=DEFAULT_SEARCH_BUDGET)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    train_and_save_models(
+        args.samples,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        parallel=args.parallel,
+        search=args.search,
+        search_budget=args.search_budget,
+        workers=args.workers,
+    )
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,216 @@
+"""Training data extracted from the LMS history of completed classrooms."""
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from django.db.models import Count, FloatField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from ml.features import FEATURE_NAMES, NO_SUBMISSION_DAYS
+from ml.scripts.train_models import risk_levels
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPORT_DIR = os.path.join(BASE_DIR, 'ml', 'data', 'lms_export')
+MANIFEST_FILE = 'manifest.json'
+
+# Share of each classroom's assignments (ordered by deadline) that the
+# features are computed from; the outcome of the whole classroom is the label
+DEFAULT_CUTOFF = 0.5
+DB_CHUNK_SIZE = 20000
+CLASSROOMS_PER_PART = 200
+
+COLUMNS = ['classroom_id', 'student_id'] + FEATURE_NAMES + ['risk_level', 'final_grade']
+INT_COLUMNS = ('classroom_id', 'student_id', 'assignment_count', 'days_since_last', 'risk_level')
+
+
+def completed_classroom_ids(using='default'):
+    """Classrooms with at least two assignments, all past their deadline."""
+    from assignments.models import Assignment
+
+    return (
+        Assignment.objects.using(using)
+        .values('classroom_id')
+        .annotate(n=Count('id'), last_deadline=Max('deadline'))
+        .filter(n__gte=2, last_deadline__lt=timezone.now())
+        .order_by('classroom_id')
+        .values_list('classroom_id', flat=True)
+    )
+
+
+def _frame(queryset, columns, chunk_size, datetimes=()):
+    """Read a values_list queryset with a server-side cursor into a DataFrame."""
+    frame = pd.DataFrame.from_records(
+        queryset.iterator(chunk_size=chunk_size), columns=columns, coerce_float=True
+    )
+    for column in datetimes:
+        # Naive UTC so the timestamps compare and subtract as datetime64
+        frame[column] = pd.to_datetime(frame[column], utc=True).dt.tz_convert(None)
+    return frame
+
+
+def classroom_rows(classroom_ids, using='default', cutoff=DEFAULT_CUTOFF, chunk_size=DB_CHUNK_SIZE):
+    """
+    One row per (student, classroom) pair with a grade in the given
+    classrooms: features as they stood after the first ``cutoff`` share of the
+    assignments, and the final grade and risk level over the whole classroom
+    as labels. Returns a dict of column name -> array.
+    """
+    from assignments.models import Assignment, Submission
+    from grades.models import Grade
+
+    pair = ['classroom_id', 'student_id']
+    assignments = _frame(
+        Assignment.objects.using(using).filter(classroom_id__in=classroom_ids)
+        .order_by('classroom_id', 'deadline', 'id')
+        .values_list('id', 'classroom_id', 'deadline'),
+        ['assignment_id', 'classroom_id', 'deadline'], chunk_size, datetimes=['deadline'],
+    )
+    # Percentages are computed by the database so no Decimal is built per row
+    grades = _frame(
+        Grade.objects.using(using).filter(classroom_id__in=classroom_ids)
+        .annotate(percentage=Cast('marks_obtained', FloatField()) * 100.0 / Cast('total_marks', FloatField()))
+        .order_by().values_list('classroom_id', 'student_id', 'assignment_id', 'percentage'),
+        pair + ['assignment_id', 'percentage'], chunk_size,
+    )
+    submissions = _frame(
+        Submission.objects.using(using).filter(assignment__classroom_id__in=classroom_ids)
+        .order_by().values_list('assignment__classroom_id', 'student_id', 'assignment_id', 'submitted_at'),
+        pair + ['assignment_id', 'submitted_at'], chunk_size, datetimes=['submitted_at'],
+    )
+    if assignments.empty or grades.empty:
+        return {name: np.empty(0) for name in COLUMNS}
+
+    # Feature window: the first `cutoff` share of each classroom's assignments,
+    # always leaving at least one assignment after it
+    by_classroom = assignments.groupby('classroom_id')
+    totals = by_classroom['assignment_id'].transform('size')
+    window_sizes = np.clip(np.ceil(totals * cutoff), 1, totals - 1)
+    assignments['in_window'] = by_classroom.cumcount() < window_sizes
+    classrooms = pd.DataFrame({
+        'total': by_classroom.size(),
+        'window': assignments[assignments['in_window']].groupby('classroom_id').size(),
+        'cutoff_at': assignments[assignments['in_window']].groupby('classroom_id')['deadline'].max(),
+    })
+    assignments = assignments.set_index('assignment_id')
+
+    grades['in_window'] = grades['assignment_id'].map(assignments['in_window']).eq(True)
+    final_grade = grades.groupby(pair)['percentage'].mean()
+    window_score = grades[grades['in_window']].groupby(pair)['percentage'].mean()
+
+    submissions['deadline'] = submissions['assignment_id'].map(assignments['deadline'])
+    submissions['in_window'] = (
+        submissions['assignment_id'].map(assignments['in_window']).eq(True)
+        & (submissions['submitted_at'] <= submissions['classroom_id'].map(classrooms['cutoff_at']))
+    )
+    submissions['on_time'] = submissions['deadline'] >= submissions['submitted_at']
+    window_submissions = submissions[submissions['in_window']].groupby(pair)
+    all_submissions = submissions.groupby(pair)
+
+    rows = pd.DataFrame(index=final_grade.index)
+    rows['final_grade'] = final_grade
+    rows['avg_score'] = window_score.reindex(rows.index).fillna(0.0)
+    for prefix, grouped in (('window', window_submissions), ('final', all_submissions)):
+        rows[f'{prefix}_submitted'] = grouped.size().reindex(rows.index).fillna(0)
+        rows[f'{prefix}_on_time'] = grouped['on_time'].sum().reindex(rows.index).fillna(0)
+    rows['last_submission_at'] = window_submissions['submitted_at'].max().reindex(rows.index)
+
+    classroom_index = rows.index.get_level_values('classroom_id')
+    window_count = classrooms['window'].reindex(classroom_index).to_numpy(dtype=float)
+    total_count = classrooms['total'].reindex(classroom_index).to_numpy(dtype=float)
+    cutoff_at = classrooms['cutoff_at'].reindex(classroom_index).to_numpy()
+
+    def rates(submitted, on_time, assignment_count):
+        submission_rate = submitted / assignment_count * 100
+        on_time_rate = np.divide(on_time * 100, submitted, out=np.zeros(len(submitted)), where=submitted > 0)
+        return submission_rate, on_time_rate
+
+    submission_rate, on_time_rate = rates(
+        rows['window_submitted'].to_numpy(float), rows['window_on_time'].to_numpy(float), window_count
+    )
+    final_submission_rate, final_on_time_rate = rates(
+        rows['final_submitted'].to_numpy(float), rows['final_on_time'].to_numpy(float), total_count
+    )
+    idle = (cutoff_at - rows['last_submission_at'].to_numpy()) / np.timedelta64(1, 'D')
+    days_since_last = np.where(np.isnan(idle), NO_SUBMISSION_DAYS, np.floor(idle))
+
+    return {
+        'classroom_id': classroom_index.to_numpy(),
+        'student_id': rows.index.get_level_values('student_id').to_numpy(),
+        'avg_score': rows['avg_score'].to_numpy(float),
+        'submission_rate': submission_rate,
+        'on_time_rate': on_time_rate,
+        'participation': np.minimum(100, submission_rate + on_time_rate * 0.5),
+        'assignment_count': window_count,
+        'days_since_last': np.minimum(days_since_last, NO_SUBMISSION_DAYS),
+        'risk_level': risk_levels(rows['final_grade'].to_numpy(float), final_submission_rate, final_on_time_rate),
+        'final_grade': rows['final_grade'].to_numpy(float),
+    }
+
+
+def export_training_data(path=EXPORT_DIR, using='default', cutoff=DEFAULT_CUTOFF,
+                         chunk_size=DB_CHUNK_SIZE, classrooms_per_part=CLASSROOMS_PER_PART):
+    """
+    Write training rows for every completed classroom to ``path``.
+
+    Classrooms are processed ``classrooms_per_part`` at a time, reading rows
+    through server-side cursors, and each batch is written as one compressed
+    ``part-NNNNN.npz`` file of columns; only one batch is held in memory. The
+    export is built next to ``path`` and swapped in when complete. Returns
+    the manifest.
+    """
+    building = f'{path}.building'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    parts, rows = [], 0
+    classroom_ids = completed_classroom_ids(using).iterator(chunk_size=chunk_size)
+    while True:
+        batch = [classroom_id for _, classroom_id in zip(range(classrooms_per_part), classroom_ids)]
+        if not batch:
+            break
+        columns = classroom_rows(batch, using, cutoff, chunk_size)
+        count = len(columns['final_grade'])
+        if not count:
+            continue
+        name = f'part-{len(parts):05d}.npz'
+        np.savez_compressed(os.path.join(building, name), **{
+            column: np.asarray(columns[column], dtype=np.int64 if column in INT_COLUMNS else np.float64)
+            for column in COLUMNS
+        })
+        parts.append(name)
+        rows += count
+
+    manifest = {
+        'columns': COLUMNS,
+        'rows': rows,
+        'parts': parts,
+        'cutoff': cutoff,
+        'database': using,
+        'exported_at': datetime.now().isoformat(),
+    }
+    with open(os.path.join(building, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(building, path)
+    return manifest
+
+
+def load_training_data(path=EXPORT_DIR, columns=None):
+    """Read an export back as a DataFrame, optionally only some columns."""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    columns = columns or manifest['columns']
+
+    chunks = {column: [] for column in columns}
+    for name in manifest['parts']:
+        with np.load(os.path.join(path, name)) as part:
+            for column in columns:
+                chunks[column].append(part[column])
+    return pd.DataFrame({
+        column: np.concatenate(arrays) if arrays else np.empty(0)
+        for column, arrays in chunks.items()
+    }, columns=columns)
@@ -1,7 +1,20 @@
 from django.contrib import admin
-from .models import Notification
+from .models import ClassNotification, Notification, NotificationFanOut
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('recipient', 'message', 'created_at', 'read')
     search_fields = ('recipient__username', 'message')
+
+
+@admin.register(ClassNotification)
+class ClassNotificationAdmin(admin.ModelAdmin):
+    list_display = ('classroom', 'title', 'sender', 'created_at')
+    search_fields = ('classroom__name', 'title', 'message')
+
+
+@admin.register(NotificationFanOut)
+class NotificationFanOutAdmin(admin.ModelAdmin):
+    list_display = ('classroom', 'title', 'status', 'delivered', 'recipients', 'attempts', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('classroom__name', 'title')
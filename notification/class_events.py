@@ -0,0 +1,133 @@
+"""Read side of class notifications that are stored once per class (fan-out on read)."""
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Exists, Max, OuterRef, Q, Value, When
+from classes.models import ClassMembership
+from classes.scope import get_classroom_scope
+from .models import ClassNotification, ClassNotificationCursor, ClassNotificationReceipt
+from .pubsub import cache_is_shared, publish_changes
+
+LATEST_CACHE_TIMEOUT = 60 * 60 * 24
+UNREAD_CACHE_TIMEOUT = 60 * 60
+
+
+def _latest_key(classroom_id):
+    return f'notification:class-latest:{classroom_id}'
+
+
+def _unread_key(user_id):
+    return f'notification:class-unread:{user_id}'
+
+
+def invalidate_class_unread(*user_ids):
+    cache.delete_many([_unread_key(user_id) for user_id in user_ids if user_id])
+    publish_changes(user_ids)
+
+
+def announce_class_notification(notification):
+    """Record a new class notification as the latest of its class, so cached counts go stale."""
+    cache.set(_latest_key(notification.classroom_id), notification.id, LATEST_CACHE_TIMEOUT)
+    publish_changes(classroom_ids=[notification.classroom_id])
+
+
+def latest_class_notification_ids(classroom_ids):
+    """
+    Id of the newest class notification of each classroom that has any.
+    Served from the cache only when it is shared, since notifications are
+    announced from other processes.
+    """
+    shared = cache_is_shared()
+    latest = {}
+    if shared:
+        keys = {_latest_key(classroom_id): classroom_id for classroom_id in classroom_ids}
+        latest = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [classroom_id for classroom_id in classroom_ids if classroom_id not in latest]
+    if missing:
+        found = dict.fromkeys(missing, 0)
+        found.update(
+            ClassNotification.objects.filter(classroom_id__in=missing).order_by()
+            .values('classroom_id').annotate(latest=Max('id')).values_list('classroom_id', 'latest')
+        )
+        if shared:
+            cache.set_many({_latest_key(classroom_id): value for classroom_id, value in found.items()}, LATEST_CACHE_TIMEOUT)
+        latest.update(found)
+    return {classroom_id: value for classroom_id, value in latest.items() if value}
+
+
+def visible_class_notifications(user):
+    """
+    Class notifications a user can see (sent by someone else to a class they
+    had joined), annotated with ``read`` from their cursors and receipts.
+    """
+    memberships = list(ClassMembership.objects.filter(user=user).values_list('classroom_id', 'joined_at'))
+    if not memberships:
+        return ClassNotification.objects.annotate(read=Value(True, output_field=BooleanField())).none()
+
+    visible = Q()
+    for classroom_id, joined_at in memberships:
+        visible |= Q(classroom_id=classroom_id, created_at__gte=joined_at)
+    read = Exists(ClassNotificationReceipt.objects.filter(user=user, notification=OuterRef('pk')))
+    for classroom_id, read_through in ClassNotificationCursor.objects.filter(user=user).values_list('classroom_id', 'read_through'):
+        read |= Q(classroom_id=classroom_id, id__lte=read_through)
+    return (
+        ClassNotification.objects.filter(visible).exclude(sender=user)
+        .annotate(read=Case(When(read, then=Value(True)), default=Value(False), output_field=BooleanField()))
+    )
+
+
+def class_unread_count(user):
+    """
+    Unread class notifications of a user. With a shared cache the count is
+    cached along with the newest notification id of each of the user's
+    classes, and recounted only when one of those changes or the user reads
+    some; otherwise it is counted on every call.
+    """
+    classroom_ids = sorted(get_classroom_scope(user).classroom_ids)
+    if not classroom_ids:
+        return 0
+    if not cache_is_shared():
+        return visible_class_notifications(user).filter(read=False).count()
+
+    versions = latest_class_notification_ids(classroom_ids)
+    if not versions:
+        return 0
+    key = _unread_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None and cached['versions'] == versions:
+        return cached['count']
+
+    count = visible_class_notifications(user).filter(read=False).count()
+    cache.set(key, {'versions': versions, 'count': count}, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def read_class_notification(user, notification):
+    """Record that the user read one class notification; returns whether it was unread."""
+    unread = visible_class_notifications(user).filter(id=notification.id, read=False).exists()
+    if unread:
+        ClassNotificationReceipt.objects.get_or_create(user=user, notification=notification)
+        invalidate_class_unread(user.pk)
+    return unread
+
+
+def read_class_notifications(user):
+    """
+    Move the user's cursor in every class to its newest notification, and
+    drop the receipts that covers. Returns how many were unread.
+    """
+    unread = visible_class_notifications(user).filter(read=False).count()
+    latest = (
+        ClassNotification.objects.filter(classroom__classmembership__user=user).order_by()
+        .values('classroom_id').annotate(latest=Max('id')).values_list('classroom_id', 'latest')
+    )
+    cursors = [ClassNotificationCursor(user=user, classroom_id=classroom_id, read_through=read_through)
+               for classroom_id, read_through in latest]
+    if cursors:
+        ClassNotificationCursor.objects.bulk_create(
+            cursors,
+            update_conflicts=True,
+            unique_fields=['user', 'classroom'],
+            update_fields=['read_through'],
+        )
+        ClassNotificationReceipt.objects.filter(user=user).delete()
+    invalidate_class_unread(user.pk)
+    return unread
@@ -1,11 +1,10 @@
-from .models import Notification
+from django.core.handlers.asgi import ASGIRequest
+from .unread import unread_count
 
 def notification_context(request):
-    """Add unread notification count to template context"""
-    if request.user.is_authenticated:
-        unread_count = Notification.objects.filter(
-            recipient=request.user, 
-            read=False
-        ).count()
-        return {'unread_notifications_count': unread_count}
-    return {'unread_notifications_count': 0}
\ No newline at end of file
+    """Add unread notification count to template context, from the cache"""
+    return {
+        'unread_notifications_count': unread_count(request.user),
+        # Pages served over ASGI keep the count live through the event stream
+        'notification_stream_enabled': isinstance(request, ASGIRequest),
+    }
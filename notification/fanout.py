@@ -0,0 +1,192 @@
+"""
+Background fan-out of class notifications to one Notification per member.
+
+``create_notifications_for_class`` queues a ``NotificationFanOut`` and
+returns; ``run_worker`` claims queued jobs and walks the class memberships in
+id order, inserting each chunk of notifications, bumping the recipients'
+unread counts and recording its progress in one transaction. A job that
+fails or whose worker dies is picked up again from the last committed chunk,
+and the unique (fan_out, recipient) constraint keeps a recipient from ever
+getting the same notification twice.
+"""
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from classes.models import ClassMembership
+from .models import Notification, NotificationFanOut
+from .unread import increment_unread
+
+CHUNK_SIZE = 1000
+INSERT_BATCH_SIZE = 100
+LOCK_SECONDS = 120
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 5
+RETRY_SECONDS = 30
+
+
+def _claimable(now):
+    return NotificationFanOut.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        status='queued',
+        available_at__lte=now,
+    )
+
+
+def claim_fan_out(worker_id, lock_seconds=LOCK_SECONDS):
+    """Claim the oldest due job, or return None when there is none."""
+    now = timezone.now()
+    for job_id in _claimable(now).order_by('available_at', 'id').values_list('id', flat=True)[:10]:
+        # Only one worker's conditional UPDATE can match
+        if _claimable(now).filter(id=job_id).update(
+            claimed_by=worker_id, locked_until=now + timedelta(seconds=lock_seconds)
+        ):
+            return NotificationFanOut.objects.get(id=job_id)
+    return None
+
+
+def membership_chunks(job, chunk_size=CHUNK_SIZE):
+    """
+    Stream ``(membership_id, user_id)`` chunks of the job's class after its
+    last processed membership, one keyset query per chunk, so no query spans
+    the transactions the chunks are written in.
+    """
+    after = job.last_membership_id
+    while True:
+        chunk = list(
+            ClassMembership.objects.filter(classroom_id=job.classroom_id, id__gt=after)
+            .exclude(user_id=job.sender_id)
+            .order_by('id').values_list('id', 'user_id')[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1][0]
+
+
+class ClaimLost(Exception):
+    """The job's lock expired and another worker claimed it."""
+
+
+def deliver_chunk(job, chunk, worker_id, lock_seconds=LOCK_SECONDS):
+    """
+    Create the notifications for one chunk of memberships, skipping
+    recipients that already have one from this job. Returns how many were
+    created. Raises ClaimLost, writing nothing, if the worker no longer
+    holds the job.
+    """
+    user_ids = [user_id for _, user_id in chunk]
+    with transaction.atomic():
+        # Renew the claim before writing. The row stays locked until commit,
+        # so no other worker can take the job over while the chunk is written
+        if not NotificationFanOut.objects.filter(id=job.id, claimed_by=worker_id).update(
+            locked_until=timezone.now() + timedelta(seconds=lock_seconds),
+        ):
+            raise ClaimLost(job.id)
+        delivered = set(
+            Notification.objects.filter(fan_out=job, recipient_id__in=user_ids).values_list('recipient_id', flat=True)
+        )
+        after = Notification.objects.filter(fan_out=job).order_by('-id').values_list('id', flat=True).first() or 0
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    recipient_id=user_id,
+                    sender_id=job.sender_id,
+                    classroom_id=job.classroom_id,
+                    notification_type=job.notification_type,
+                    title=job.title,
+                    message=job.message,
+                    content_type_id=job.content_type_id,
+                    object_id=job.object_id,
+                    fan_out=job,
+                )
+                for user_id in user_ids
+                if user_id not in delivered
+            ],
+            batch_size=INSERT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # Count only the rows this insert created, not those it skipped as conflicts
+        created = list(
+            Notification.objects.filter(fan_out=job, recipient_id__in=user_ids, id__gt=after)
+            .values_list('recipient_id', flat=True)
+        )
+        increment_unread(created)
+        job.last_membership_id = chunk[-1][0]
+        job.delivered += len(created)
+        NotificationFanOut.objects.filter(id=job.id).update(
+            last_membership_id=job.last_membership_id,
+            delivered=F('delivered') + len(created),
+        )
+    return len(created)
+
+
+def process_fan_out(job, worker_id, chunk_size=CHUNK_SIZE, lock_seconds=LOCK_SECONDS):
+    """Deliver a claimed job to the rest of its class; on failure queue it again later."""
+    jobs = NotificationFanOut.objects.filter(id=job.id, claimed_by=worker_id)
+    try:
+        for chunk in membership_chunks(job, chunk_size):
+            deliver_chunk(job, chunk, worker_id, lock_seconds)
+    except ClaimLost:
+        print(f"Lost the claim on notification {job.id}, leaving it to the other worker")
+        return False
+    except Exception as e:
+        print(f"Error fanning out notification {job.id}: {e}")
+        jobs.update(
+            status='failed' if job.attempts + 1 >= MAX_ATTEMPTS else 'queued',
+            attempts=F('attempts') + 1,
+            last_error=traceback.format_exc()[-2000:],
+            available_at=timezone.now() + timedelta(seconds=RETRY_SECONDS),
+            claimed_by='',
+            locked_until=None,
+        )
+        return False
+
+    jobs.update(status='done', completed_at=timezone.now(), claimed_by='', locked_until=None)
+    return True
+
+
+def _work_once(worker_id, chunk_size, lock_seconds, log):
+    """Claim and deliver one job; returns whether it completed, or None when nothing is due."""
+    close_old_connections()
+    job = claim_fan_out(worker_id, lock_seconds)
+    if job is None:
+        return None
+    started = time.perf_counter()
+    completed = process_fan_out(job, worker_id, chunk_size, lock_seconds)
+    if log:
+        job.refresh_from_db()
+        log(f'Notification {job.id}: {job.delivered}/{job.recipients} delivered, '
+            f'{job.status} in {time.perf_counter() - started:.3f}s')
+    return completed
+
+
+def run_worker(poll_interval=POLL_SECONDS, once=False, chunk_size=CHUNK_SIZE, lock_seconds=LOCK_SECONDS, log=None):
+    """
+    Deliver queued jobs until stopped, or with ``once`` until none are due.
+    Returns the number of jobs completed. Errors (e.g. the database going
+    away) are logged and retried after ``poll_interval``; with ``once`` they
+    are raised.
+    """
+    worker_id = uuid.uuid4().hex
+    completed = 0
+    while True:
+        try:
+            done = _work_once(worker_id, chunk_size, lock_seconds, log)
+        except Exception as e:
+            if once:
+                raise
+            print(f"Error in notification worker, retrying: {e}")
+            time.sleep(poll_interval)
+            continue
+        if done is None:
+            if once:
+                return completed
+            time.sleep(poll_interval)
+            continue
+        completed += done
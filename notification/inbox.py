@@ -0,0 +1,111 @@
+"""
+One page of a user's inbox: their own notifications and those of their large
+classes, newest first.
+
+Pages are cut with a keyset cursor rather than an offset, so the inbox costs
+the same on the first page and the thousandth. Both kinds are ordered by
+``(created_at, kind, id)``, descending, with own notifications ranked after
+class notifications created at the same instant; a cursor is the position of
+the last notification shown, and the next page is what comes after it in
+that order. Own notifications are read through the ``notification_inbox``
+index on ``(recipient, created_at, id)``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Q
+from django.contrib.contenttypes.models import ContentType
+from .class_events import visible_class_notifications
+from .models import ClassNotification, Notification
+
+INBOX_PAGE_SIZE = 20
+READ_STATES = ('unread', 'read')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Rank of each kind within the same created_at
+_KINDS = {'c': (0, ClassNotification), 'p': (1, Notification)}
+
+
+def encode_cursor(notification):
+    """URL-safe position of a notification in the inbox order."""
+    kind = 'c' if isinstance(notification, ClassNotification) else 'p'
+    micros = (notification.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{kind}-{notification.id}'
+
+
+def decode_cursor(value):
+    """``(created_at, rank, id)`` of a cursor, or None if it is missing or malformed."""
+    try:
+        micros, kind, notification_id = value.split('-')
+        return _EPOCH + timedelta(microseconds=int(micros)), _KINDS[kind][0], int(notification_id)
+    except (AttributeError, KeyError, ValueError, OverflowError):
+        return None
+
+
+def _after(cursor, rank):
+    """Rows of the given kind that come after the cursor."""
+    created_at, cursor_rank, notification_id = cursor
+    if rank < cursor_rank:
+        return Q(created_at__lte=created_at)
+    if rank > cursor_rank:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+
+
+def prefetch_content_objects(notifications):
+    """
+    Load the content objects of notifications of either kind with one query
+    per content type, and cache them on the notifications.
+    """
+    wanted = {}
+    for notification in notifications:
+        if notification.content_type_id and notification.object_id:
+            wanted.setdefault(notification.content_type_id, set()).add(notification.object_id)
+
+    objects = {}
+    for content_type_id, object_ids in wanted.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        for obj in model._base_manager.filter(pk__in=object_ids):
+            objects[content_type_id, obj.pk] = obj
+
+    for notification in notifications:
+        field = type(notification)._meta.get_field('content_object')
+        field.set_cached_value(
+            notification, objects.get((notification.content_type_id, notification.object_id))
+        )
+
+
+def inbox_page(user, cursor=None, notification_type=None, classroom_id=None, read_state=None, page_size=INBOX_PAGE_SIZE):
+    """
+    Up to ``page_size`` notifications of the user after ``cursor`` (a value
+    from ``encode_cursor``), optionally only of one type, one classroom or
+    one read state. Returns ``(notifications, next_cursor)``, with
+    ``next_cursor`` None on the last page.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    streams = [
+        (1, Notification.objects.filter(recipient=user)),
+        (0, visible_class_notifications(user)),
+    ]
+
+    rows = []
+    for rank, queryset in streams:
+        if position:
+            queryset = queryset.filter(_after(position, rank))
+        if notification_type:
+            queryset = queryset.filter(notification_type=notification_type)
+        if classroom_id:
+            queryset = queryset.filter(classroom_id=classroom_id)
+        if read_state:
+            queryset = queryset.filter(read=read_state == 'read')
+        # page_size + 1 of each kind tells whether there is a next page
+        rows.extend(
+            (rank, notification) for notification in
+            queryset.select_related('sender', 'classroom').order_by('-created_at', '-id')[:page_size + 1]
+        )
+
+    rows.sort(key=lambda row: (row[1].created_at, row[0], row[1].id), reverse=True)
+    notifications = [notification for _, notification in rows[:page_size]]
+    prefetch_content_objects(notifications)
+    next_cursor = encode_cursor(notifications[-1]) if len(rows) > page_size else None
+    return notifications, next_cursor
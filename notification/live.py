@@ -0,0 +1,104 @@
+"""
+Server-sent event stream of a user's unread count and new notifications.
+
+A stream sends an ``unread`` event when it opens and whenever the count may
+have changed, preceded by a ``notification`` event for each notification
+that arrived meanwhile. It sleeps until ``notification.pubsub`` wakes it or
+CHECK_SECONDS pass, and then compares the user's cached notification state
+before touching the database, so an idle stream costs no queries.
+"""
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import reverse
+from classes.scope import get_classroom_scope
+from .class_events import visible_class_notifications
+from .models import Notification
+from .pubsub import broker, classroom_channel, notification_state, user_channel
+from .unread import unread_count
+
+CHECK_SECONDS = 5
+KEEPALIVE_SECONDS = 25
+# Streams end after this long and the browser reconnects, picking up
+# classes joined in the meantime
+STREAM_SECONDS = 60 * 30
+RECONNECT_MILLISECONDS = 5000
+NEW_NOTIFICATIONS_LIMIT = 20
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'kind': 'personal' if isinstance(notification, Notification) else 'class',
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'classroom': notification.classroom.name if notification.classroom else None,
+        'created_at': notification.created_at.isoformat(),
+        'mark_read_url': notification.get_mark_read_url(),
+        'url': reverse('notification_list'),
+    }
+
+
+def latest_ids(user):
+    """Newest own and class notification ids of the user; later notifications are new."""
+    personal = Notification.objects.filter(recipient=user).order_by('-id').values_list('id', flat=True).first()
+    shared = visible_class_notifications(user).order_by('-id').values_list('id', flat=True).first()
+    return personal or 0, shared or 0
+
+
+def new_notifications(user, since):
+    """Notifications of the user after ``since`` (from ``latest_ids``), oldest first, and the new ``since``."""
+    personal_id, class_id = since
+    personal = list(
+        Notification.objects.filter(recipient=user, id__gt=personal_id)
+        .select_related('classroom').order_by('-id')[:NEW_NOTIFICATIONS_LIMIT]
+    )
+    shared = list(
+        visible_class_notifications(user).filter(id__gt=class_id)
+        .select_related('classroom').order_by('-id')[:NEW_NOTIFICATIONS_LIMIT]
+    )
+    since = (personal[0].id if personal else personal_id, shared[0].id if shared else class_id)
+    notifications = sorted(personal + shared, key=lambda notification: notification.created_at)
+    return notifications[-NEW_NOTIFICATIONS_LIMIT:], since
+
+
+def _open(user):
+    close_old_connections()
+    channels = [user_channel(user.pk)] + [
+        classroom_channel(classroom_id) for classroom_id in get_classroom_scope(user).classroom_ids
+    ]
+    return channels, notification_state(user), latest_ids(user), unread_count(user)
+
+
+def _refresh(user, state, since):
+    """The new state, and the events to send if it changed."""
+    close_old_connections()
+    current = notification_state(user)
+    if current == state:
+        return state, since, []
+    notifications, since = new_notifications(user, since)
+    events = [format_event('notification', notification_payload(notification)) for notification in notifications]
+    events.append(format_event('unread', {'count': unread_count(user)}))
+    return current, since, events
+
+
+async def event_stream(user):
+    channels, state, since, count = await sync_to_async(_open)(user)
+    with broker.subscribe(channels) as subscription:
+        yield f'retry: {RECONNECT_MILLISECONDS}\n' + format_event('unread', {'count': count})
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < STREAM_SECONDS:
+            await subscription.wait(CHECK_SECONDS)
+            state, since, events = await sync_to_async(_refresh)(user, state, since)
+            if events:
+                yield ''.join(events)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
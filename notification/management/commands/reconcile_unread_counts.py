@@ -0,0 +1,27 @@
+"""Management command to recount the stored unread notification counts."""
+from django.core.management.base import BaseCommand
+from notification.models import UnreadNotificationCount
+from notification.unread import reconcile_unread_counts
+
+class Command(BaseCommand):
+    help = 'Recount unread notifications and fix the stored per-user counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help='Only reconcile this user id (may be given more than once)'
+        )
+
+    def handle(self, *args, **options):
+        stored = UnreadNotificationCount.objects.all()
+        if options['user']:
+            stored = stored.filter(user_id__in=options['user'])
+        before = dict(stored.values_list('user_id', 'unread'))
+
+        counts = reconcile_unread_counts(options['user'])
+        corrected = sum(1 for user_id, n in counts.items() if before.get(user_id, 0) != n)
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled {len(counts)} unread counts, {corrected} were wrong.')
+        )
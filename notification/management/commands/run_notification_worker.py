@@ -0,0 +1,45 @@
+"""Management command to deliver queued class notifications."""
+from django.core.management.base import BaseCommand
+from notification.fanout import CHUNK_SIZE, LOCK_SECONDS, POLL_SECONDS, run_worker
+
+class Command(BaseCommand):
+    help = 'Create the notifications of queued class fan-out jobs, a chunk of members at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no jobs are due instead of waiting for more'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Number of class members notified per transaction'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=POLL_SECONDS,
+            help='Seconds to wait between checks of an empty queue'
+        )
+        parser.add_argument(
+            '--lock-seconds',
+            type=int,
+            default=LOCK_SECONDS,
+            help='Seconds without progress before a job claimed by a stopped worker can be claimed again'
+        )
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        try:
+            completed = run_worker(
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                chunk_size=options['chunk_size'],
+                lock_seconds=options['lock_seconds'],
+                log=log,
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Delivered {completed} class notifications.'))
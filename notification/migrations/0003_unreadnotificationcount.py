@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def populate_counts(apps, schema_editor):
+    Notification = apps.get_model('notification', 'Notification')
+    UnreadNotificationCount = apps.get_model('notification', 'UnreadNotificationCount')
+
+    now = timezone.now()
+    counts = (
+        Notification.objects.filter(read=False).order_by()
+        .values('recipient_id').annotate(n=Count('id')).values_list('recipient_id', 'n')
+    )
+    UnreadNotificationCount.objects.bulk_create(
+        [UnreadNotificationCount(user_id=user_id, unread=n, reconciled_at=now) for user_id, n in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_alter_notification_options_notification_classroom_and_more'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_notification_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0006_remove_classroom_slug'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notification', '0005_notification_fan_out'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox'),
+        ),
+    ]
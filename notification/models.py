@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
+from django.utils import timezone
 from users.models import CustomUser
 from classes.models import ClassRoom, ClassMembership
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+# Classes with at least this many members get one ClassNotification per post
+# instead of a Notification row per member
+FAN_OUT_ON_READ_MIN_MEMBERS = 200
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('assignment', 'New Assignment'),
@@ -27,33 +35,190 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    # The background job that created this notification, if any
+    fan_out = models.ForeignKey('NotificationFanOut', on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the inbox (see notification.inbox)
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fan_out', 'recipient'],
+                condition=models.Q(fan_out__isnull=False),
+                name='notification_unique_fan_out_recipient',
+            ),
+        ]
 
     def __str__(self):
         return f"To {self.recipient.username}: {self.title}"
 
+    def get_mark_read_url(self):
+        return reverse('mark_as_read', args=[self.id])
+
     @staticmethod
     def create_notifications_for_class(classroom, sender, notification_type, title, message, content_object=None):
         """
-        Create notifications for all members of a class
+        Notify all members of a class. Classes with at least
+        NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS members get one ClassNotification
+        that members read through their cursors; for smaller classes a
+        NotificationFanOut job is queued that creates a Notification row per
+        member in the background. Returns the number of members notified or
+        queued.
         """
         # Get all class members except the sender
         members = ClassMembership.objects.filter(classroom=classroom).exclude(user=sender)
         
-        notifications = []
-        for membership in members:
-            notification = Notification(
-                recipient=membership.user,
-                sender=sender,
+        member_count = members.count()
+        if not member_count:
+            return 0
+        if member_count >= fan_out_on_read_min_members():
+            from .class_events import announce_class_notification
+
+            notification = ClassNotification.objects.create(
                 classroom=classroom,
+                sender=sender,
                 notification_type=notification_type,
                 title=title,
                 message=message,
                 content_object=content_object
             )
-            notifications.append(notification)
-        
-        # Bulk create for efficiency
-        Notification.objects.bulk_create(notifications)
-        return len(notifications)
\ No newline at end of file
+            announce_class_notification(notification)
+            return member_count
+
+        NotificationFanOut.objects.create(
+            classroom=classroom,
+            sender=sender,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            content_object=content_object,
+            recipients=member_count,
+        )
+        return member_count
+
+
+def fan_out_on_read_min_members():
+    return getattr(settings, 'NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS', FAN_OUT_ON_READ_MIN_MEMBERS)
+
+
+class ClassNotification(models.Model):
+    """
+    One notification for every member of a (large) class, stored once. A
+    member sees it if they joined the class before it was sent; whether they
+    have read it comes from their ClassNotificationCursor, or a
+    ClassNotificationReceipt for one read past the cursor.
+    """
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='class_notifications')
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_class_notifications', null=True, blank=True)
+
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, default='announcement')
+    title = models.CharField(max_length=255, default='')
+    message = models.TextField(default='')
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['classroom', 'id'], name='notification_class_events'),
+        ]
+
+    def __str__(self):
+        return f"To {self.classroom.name}: {self.title}"
+
+    def get_mark_read_url(self):
+        return reverse('mark_class_notification_read', args=[self.id])
+
+
+class ClassNotificationCursor(models.Model):
+    """Every ClassNotification of the class up to ``read_through`` (an id) is read by the user."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='class_notification_cursors')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE)
+    read_through = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'classroom']
+
+    def __str__(self):
+        return f"{self.user.username} read {self.classroom.name} through {self.read_through}"
+
+
+class ClassNotificationReceipt(models.Model):
+    """A ClassNotification past the user's cursor that the user has read."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='class_notification_receipts')
+    notification = models.ForeignKey(ClassNotification, on_delete=models.CASCADE, related_name='receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'notification']
+
+    def __str__(self):
+        return f"{self.user.username} read {self.notification_id}"
+
+
+class NotificationFanOut(models.Model):
+    """
+    A class notification being copied to a Notification per member by the
+    fan-out worker (see notification.fanout). ``last_membership_id`` records
+    how far through the class memberships it has got, so a retried job
+    carries on where it stopped.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='notification_fan_outs')
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notification_fan_outs', null=True, blank=True)
+
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, default='announcement')
+    title = models.CharField(max_length=255, default='')
+    message = models.TextField(default='')
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    recipients = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    last_membership_id = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='notification_fan_out_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} to {self.classroom.name} ({self.status})"
+
+
+class UnreadNotificationCount(models.Model):
+    """
+    Denormalized number of unread notifications of a user, kept in step with
+    notification writes and reconciled against the real count now and then
+    (see notification.unread).
+    """
+    user = models.OneToOneField(
+        CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='unread_notification_count'
+    )
+    unread = models.PositiveIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread} unread"
\ No newline at end of file
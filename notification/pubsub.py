@@ -0,0 +1,157 @@
+"""
+In-process publish/subscribe of notification changes, for the event stream.
+
+Write paths call ``publish_changes`` with the users (and classrooms) whose
+notifications or unread counts changed. Once the transaction commits, that
+bumps a per-user version in the cache and wakes every stream of this process
+subscribed to one of those channels. Changes made in other processes (other
+web workers, the fan-out worker) reach the streams through the cached
+versions, which each stream checks every few seconds without touching the
+database; the same versions make the ETag of the polled unread count.
+Those versions only reach other processes through a shared cache
+(``CACHE_DIR``); with a process-local one the user's own notifications are
+checked in the database instead.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cache_is_shared():
+    """Whether the default cache is seen by every process, not just this one."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def classroom_channel(classroom_id):
+    return f'classroom:{classroom_id}'
+
+
+def _version_key(user_id):
+    return f'notification:version:{user_id}'
+
+
+class Subscription:
+    """Wakes one stream, running on an event loop, from any thread."""
+
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # The loop has closed under a stream that was not unsubscribed
+            pass
+
+    async def wait(self, timeout):
+        """Wait until notified or ``timeout`` seconds pass; returns whether notified."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    @contextmanager
+    def subscribe(self, channels):
+        """Subscribe the running event loop to the channels for the ``with`` block."""
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                for channel in subscription.channels:
+                    subscribers = self._subscribers.get(channel)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._subscribers[channel]
+
+    def publish(self, channels):
+        with self._lock:
+            subscriptions = set()
+            for channel in channels:
+                subscriptions.update(self._subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values())) if self._subscribers else 0
+
+
+broker = Broker()
+
+
+def publish_changes(user_ids=(), classroom_ids=()):
+    """
+    Announce that the notifications of some users, or of every member of
+    some classrooms, changed. Runs after the current transaction commits so
+    that woken streams see the new rows.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id]
+    classroom_ids = list(classroom_ids)
+    if not user_ids and not classroom_ids:
+        return
+
+    def publish():
+        if user_ids:
+            version = time.time_ns()
+            cache.set_many({_version_key(user_id): version for user_id in user_ids}, VERSION_CACHE_TIMEOUT)
+        broker.publish(
+            [user_channel(user_id) for user_id in user_ids]
+            + [classroom_channel(classroom_id) for classroom_id in classroom_ids]
+        )
+
+    transaction.on_commit(publish)
+
+
+def notification_state(user):
+    """
+    A value that changes whenever the user's notifications or unread count
+    may have: their own version and the newest class notification of each of
+    their classes. Read from the cache only, as long as it is shared.
+    """
+    from classes.scope import get_classroom_scope
+    from .class_events import class_unread_count, latest_class_notification_ids
+    from .models import Notification, UnreadNotificationCount
+
+    latest = latest_class_notification_ids(sorted(get_classroom_scope(user).classroom_ids))
+    if cache_is_shared():
+        personal = cache.get(_version_key(user.pk))
+    else:
+        # Other processes (e.g. the fan-out worker) bump versions this
+        # process cannot see; class reads only show in the class count
+        personal = (
+            UnreadNotificationCount.objects.filter(user_id=user.pk).values_list('unread', flat=True).first(),
+            Notification.objects.filter(recipient_id=user.pk).order_by('-id').values_list('id', flat=True).first(),
+            class_unread_count(user),
+        )
+    return personal, tuple(sorted(latest.items()))
+
+
+def notification_etag(user):
+    return hashlib.sha1(repr(notification_state(user)).encode()).hexdigest()[:16]
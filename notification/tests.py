@@ -1,3 +1,454 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from classes.models import ClassMembership, ClassRoom
+from users.models import CustomUser
+from . import fanout, live
+from .inbox import inbox_page
+from .class_events import class_unread_count, read_class_notification, read_class_notifications, visible_class_notifications
+from .models import (
+    ClassNotification, ClassNotificationCursor, ClassNotificationReceipt, Notification, NotificationFanOut,
+    UnreadNotificationCount,
+)
+from .pubsub import cache_is_shared, notification_etag
+from .unread import decrement_unread, increment_unread, personal_unread_count, reconcile_unread_counts, unread_count
 
-# Create your tests here.
+
+class UnreadCountTests(TestCase):
+    """Stored per-user unread counters, kept in step with the notifications."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.other = CustomUser.objects.create_user('other', password=None)
+        # Start from checked counts, so reads use the counters rather than a recount
+        reconcile_unread_counts([self.student.id, self.other.id])
+
+    def notify(self, *recipients):
+        notifications = Notification.objects.bulk_create([
+            Notification(recipient=recipient, sender=self.teacher, title='Hello') for recipient in recipients
+        ])
+        increment_unread([recipient.id for recipient in recipients])
+        return notifications
+
+    def stored(self, user):
+        return UnreadNotificationCount.objects.get(user=user).unread
+
+    def test_increment_and_decrement(self):
+        self.notify(self.student, self.student, self.other, self.student)
+        self.assertEqual((self.stored(self.student), self.stored(self.other)), (3, 1))
+        self.assertEqual(unread_count(self.student), 3)
+
+        decrement_unread(self.student.id)
+        self.assertEqual(unread_count(self.student), 2)
+        decrement_unread(self.student.id, 5)
+        self.assertEqual(unread_count(self.student), 0)
+        self.assertEqual(unread_count(self.other), 1)
+
+    def test_first_increment_creates_the_counter(self):
+        newcomer = CustomUser.objects.create_user('newcomer', password=None)
+        self.notify(newcomer, newcomer)
+        self.assertEqual(self.stored(newcomer), 2)
+        self.assertEqual(unread_count(newcomer), 2)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_marking_read_decrements_once(self):
+        first, *_ = self.notify(self.student, self.student, self.student)
+        self.client.force_login(self.student)
+        for _ in range(2):
+            self.client.get(reverse('mark_as_read', args=[first.id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(self.stored(self.student), 2)
+
+        response = self.client.post(reverse('mark_all_as_read'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(self.stored(self.student), 0)
+
+    def test_shared_cache_is_invalidated_by_changes(self):
+        self.notify(self.student)
+        with mock.patch('notification.unread.cache_is_shared', return_value=True):
+            self.assertEqual(personal_unread_count(self.student), 1)
+            with self.assertNumQueries(0):
+                self.assertEqual(personal_unread_count(self.student), 1)
+            self.notify(self.student)
+            self.assertEqual(personal_unread_count(self.student), 2)
+            decrement_unread(self.student.id, 2)
+            self.assertEqual(personal_unread_count(self.student), 0)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        self.notify(self.student, self.student)
+        UnreadNotificationCount.objects.filter(user=self.student).update(unread=7)
+        with mock.patch('notification.unread.publish_changes') as publish:
+            self.assertEqual(reconcile_unread_counts([self.student.id, self.other.id]), {self.student.id: 2, self.other.id: 0})
+        # Only the count that changed is pushed to open pages
+        publish.assert_called_once_with([self.student.id])
+        self.assertEqual(self.stored(self.student), 2)
+
+
+@override_settings(NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS=1)
+class ClassNotificationTests(TestCase):
+    """Notifications of large classes, stored once and read through cursors and receipts."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        self.membership = ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        ClassMembership.objects.filter(id=self.membership.id).update(joined_at=timezone.now() - timedelta(days=1))
+
+    def announce(self, title):
+        Notification.create_notifications_for_class(self.classroom, self.teacher, 'announcement', title, '')
+        return ClassNotification.objects.get(title=title)
+
+    def read_ids(self):
+        return {notification.id: notification.read for notification in visible_class_notifications(self.student)}
+
+    def test_member_does_not_see_posts_from_before_joining(self):
+        earlier = self.announce('Before')
+        ClassNotification.objects.filter(id=earlier.id).update(created_at=timezone.now() - timedelta(days=2))
+        later = self.announce('After')
+
+        self.assertEqual(set(self.read_ids()), {later.id})
+        self.assertEqual(class_unread_count(self.student), 1)
+        # Nor are a sender's own posts shown to them
+        self.assertFalse(visible_class_notifications(self.teacher).exists())
+
+    def test_receipt_past_the_cursor_counts_as_read(self):
+        first, second, third = (self.announce(title) for title in ('One', 'Two', 'Three'))
+        ClassNotificationCursor.objects.create(user=self.student, classroom=self.classroom, read_through=first.id)
+        self.assertTrue(read_class_notification(self.student, third))
+        self.assertFalse(read_class_notification(self.student, third))
+
+        self.assertEqual(self.read_ids(), {first.id: True, second.id: False, third.id: True})
+        self.assertEqual(class_unread_count(self.student), 1)
+
+    def test_mark_all_moves_cursors_and_clears_receipts(self):
+        first, second = self.announce('One'), self.announce('Two')
+        read_class_notification(self.student, first)
+
+        self.assertEqual(read_class_notifications(self.student), 1)
+        cursor = ClassNotificationCursor.objects.get(user=self.student, classroom=self.classroom)
+        self.assertEqual(cursor.read_through, second.id)
+        self.assertFalse(ClassNotificationReceipt.objects.filter(user=self.student).exists())
+        self.assertEqual(class_unread_count(self.student), 0)
+
+    @mock.patch('notification.class_events.cache_is_shared', return_value=True)
+    def test_cached_count_is_recomputed_for_new_notifications(self, _):
+        self.announce('One')
+        self.assertEqual(class_unread_count(self.student), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(class_unread_count(self.student), 1)
+
+        self.announce('Two')
+        self.assertEqual(class_unread_count(self.student), 2)
+
+    def test_process_local_cache_is_not_used(self):
+        # Reads and announcements in other processes never reach a local cache
+        notification = self.announce('One')
+        self.assertEqual(class_unread_count(self.student), 1)
+        ClassNotificationReceipt.objects.create(user=self.student, notification=notification)
+        self.assertEqual(class_unread_count(self.student), 0)
+        self.announce('Two')
+        self.assertEqual(class_unread_count(self.student), 1)
+
+
+class FanOutTests(TestCase):
+    """Per-member notifications created by the background worker, a chunk at a time."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        self.students = [CustomUser.objects.create_user(f'student{i}', password=None) for i in range(7)]
+        ClassMembership.objects.create(user=self.teacher, classroom=self.classroom, role='owner')
+        for student in self.students:
+            ClassMembership.objects.create(user=student, classroom=self.classroom)
+
+    def announce(self):
+        queued = Notification.create_notifications_for_class(self.classroom, self.teacher, 'announcement', 'Hello', '')
+        self.assertEqual(queued, len(self.students))
+        self.assertFalse(Notification.objects.exists())
+        return NotificationFanOut.objects.get()
+
+    def assertDeliveredOnce(self):
+        recipients = list(Notification.objects.values_list('recipient_id', flat=True))
+        self.assertEqual(sorted(recipients), sorted(student.id for student in self.students))
+        for student in self.students:
+            self.assertEqual(unread_count(student), 1)
+        # The stored counters agree with a recount
+        self.assertEqual(set(reconcile_unread_counts([student.id for student in self.students]).values()), {1})
+
+    def test_delivers_in_chunks(self):
+        job = self.announce()
+        self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.delivered, job.recipients), ('done', 7, 7))
+        self.assertDeliveredOnce()
+        self.assertEqual(unread_count(self.teacher), 0)
+
+    def test_failed_job_resumes_after_the_last_chunk(self):
+        job = self.announce()
+        deliver_chunk = fanout.deliver_chunk
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise OperationalError('connection lost')
+            return deliver_chunk(*args, **kwargs)
+
+        with mock.patch.object(fanout, 'deliver_chunk', side_effect=fail_second_chunk):
+            self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.delivered, job.attempts), ('queued', 3, 1))
+        self.assertTrue(job.last_error)
+        self.assertEqual(Notification.objects.count(), 3)
+
+        # Not due until the retry delay has passed
+        self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 0)
+        NotificationFanOut.objects.update(available_at=timezone.now())
+        self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.delivered), ('done', 7))
+        self.assertDeliveredOnce()
+
+    def test_chunk_replayed_after_a_lost_progress_update_is_not_duplicated(self):
+        job = self.announce()
+        self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 1)
+        # As if the worker died after inserting rows but before recording them
+        NotificationFanOut.objects.update(status='queued', last_membership_id=0, delivered=0)
+
+        self.assertEqual(fanout.run_worker(once=True, chunk_size=3), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.delivered, 0)
+        self.assertDeliveredOnce()
+
+    def test_worker_that_lost_its_claim_writes_nothing(self):
+        job = self.announce()
+        self.assertEqual(fanout.claim_fan_out('worker-a').id, job.id)
+        # worker-a stalls past its lock and worker-b takes the job over
+        NotificationFanOut.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(fanout.claim_fan_out('worker-b').id, job.id)
+
+        self.assertFalse(fanout.process_fan_out(job, 'worker-a', chunk_size=3))
+        self.assertFalse(Notification.objects.exists())
+        job.refresh_from_db()
+        self.assertEqual((job.claimed_by, job.status, job.attempts), ('worker-b', 'queued', 0))
+
+        self.assertTrue(fanout.process_fan_out(job, 'worker-b', chunk_size=3))
+        self.assertDeliveredOnce()
+
+    def test_process_local_cache_sees_the_workers_changes(self):
+        # The worker's cache invalidations and version bumps happen in its
+        # own process; without a shared cache the web process must not
+        # serve a count or ETag from before them
+        self.assertFalse(cache_is_shared())
+        student = self.students[0]
+        self.assertEqual(unread_count(student), 0)
+        etag = notification_etag(student)
+
+        self.announce()
+        with mock.patch('notification.pubsub.transaction.on_commit'), \
+                mock.patch('notification.unread.invalidate_unread_count'):
+            fanout.run_worker(once=True)
+        self.assertEqual(unread_count(student), 1)
+        self.assertNotEqual(notification_etag(student), etag)
+
+    def test_claimed_job_is_skipped_until_its_lock_expires(self):
+        job = self.announce()
+        self.assertEqual(fanout.claim_fan_out('worker-a').id, job.id)
+        self.assertIsNone(fanout.claim_fan_out('worker-b'))
+
+        NotificationFanOut.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(fanout.claim_fan_out('worker-b').id, job.id)
+
+    def test_gives_up_after_max_attempts(self):
+        job = self.announce()
+        NotificationFanOut.objects.update(attempts=fanout.MAX_ATTEMPTS - 1)
+        with mock.patch.object(fanout, 'deliver_chunk', side_effect=OperationalError('connection lost')):
+            fanout.run_worker(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        NotificationFanOut.objects.update(available_at=timezone.now())
+        self.assertIsNone(fanout.claim_fan_out('worker-a'))
+
+    def test_run_worker_survives_database_errors(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(fanout, 'claim_fan_out', side_effect=[OperationalError('gone'), None]) as claim, \
+                mock.patch.object(fanout.time, 'sleep', side_effect=[None, Stop]):
+            with self.assertRaises(Stop):
+                fanout.run_worker(poll_interval=0)
+        self.assertEqual(claim.call_count, 2)
+
+
+class InboxTests(TestCase):
+    """Keyset pages of own and class notifications merged newest first."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classrooms = [
+            ClassRoom.objects.create(name=f'Class {i}', owner=self.teacher, invite_code=f'class{i}')
+            for i in range(2)
+        ]
+        for classroom in self.classrooms:
+            ClassMembership.objects.create(user=self.student, classroom=classroom)
+        ClassMembership.objects.update(joined_at=timezone.now() - timedelta(days=1))
+
+        # Three notifications of each kind share each created_at, so pages
+        # split inside runs of ties
+        base = timezone.now() - timedelta(hours=1)
+        types = [value for value, _ in Notification.NOTIFICATION_TYPES]
+        for i in range(30):
+            personal = Notification.objects.create(
+                recipient=self.student, sender=self.teacher, classroom=self.classrooms[i % 2],
+                notification_type=types[i % 3], title=f'p{i}', read=i % 4 == 0,
+            )
+            shared = ClassNotification.objects.create(
+                classroom=self.classrooms[i % 2], sender=self.teacher, notification_type=types[(i + 1) % 3],
+                title=f'c{i}',
+            )
+            created_at = base + timedelta(seconds=i // 3)
+            Notification.objects.filter(id=personal.id).update(created_at=created_at)
+            ClassNotification.objects.filter(id=shared.id).update(created_at=created_at)
+            if i % 5 == 0:
+                ClassNotificationReceipt.objects.create(user=self.student, notification=shared)
+
+    def expected(self, notification_type=None, classroom_id=None, read_state=None):
+        rows = [(n.created_at, 1, n.id, n) for n in Notification.objects.filter(recipient=self.student)]
+        rows += [(n.created_at, 0, n.id, n) for n in visible_class_notifications(self.student)]
+        rows = [
+            row for row in rows
+            if (not notification_type or row[3].notification_type == notification_type)
+            and (not classroom_id or row[3].classroom_id == classroom_id)
+            and (not read_state or row[3].read == (read_state == 'read'))
+        ]
+        rows.sort(key=lambda row: row[:3], reverse=True)
+        return [(row[1], row[2]) for row in rows]
+
+    def pages(self, page_size, **filters):
+        seen, cursor, pages = [], None, 0
+        while True:
+            notifications, cursor = inbox_page(self.student, cursor, page_size=page_size, **filters)
+            seen += [(int(isinstance(n, Notification)), n.id) for n in notifications]
+            pages += 1
+            if cursor is None:
+                return seen, pages
+            self.assertEqual(len(notifications), page_size)
+
+    def test_pages_cover_every_notification_once_in_order(self):
+        filter_sets = [
+            {},
+            {'notification_type': 'assignment'},
+            {'classroom_id': self.classrooms[1].id},
+            {'read_state': 'unread'},
+            {'read_state': 'read'},
+            {'notification_type': 'material', 'classroom_id': self.classrooms[0].id, 'read_state': 'unread'},
+        ]
+        for filters in filter_sets:
+            expected = self.expected(**filters)
+            self.assertTrue(expected)
+            for page_size in (1, 4, 7, 100):
+                with self.subTest(filters=filters, page_size=page_size):
+                    seen, pages = self.pages(page_size, **filters)
+                    self.assertEqual(seen, expected)
+                    self.assertEqual(pages, max(1, -(-len(expected) // page_size)))
+
+    def test_page_query_count_does_not_grow_with_depth(self):
+        cursor = inbox_page(self.student, page_size=5)[1]
+        for _ in range(5):
+            with self.assertNumQueries(4):
+                cursor = inbox_page(self.student, cursor, page_size=5)[1]
+
+    def test_malformed_cursor_starts_from_the_newest(self):
+        self.assertEqual(
+            [n.id for n in inbox_page(self.student, 'not-a-cursor')[0]],
+            [n.id for n in inbox_page(self.student)[0]],
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_FAN_OUT_ON_READ_MIN_MEMBERS=1)
+class LiveNotificationTests(TestCase):
+    """The unread count endpoint answers 304 while unchanged; ASGI pages get an event stream."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user('teacher', password=None)
+        self.student = CustomUser.objects.create_user('student', password=None)
+        self.classroom = ClassRoom.objects.create(name='Maths', owner=self.teacher, invite_code='maths')
+        membership = ClassMembership.objects.create(user=self.student, classroom=self.classroom)
+        ClassMembership.objects.filter(id=membership.id).update(joined_at=timezone.now() - timedelta(days=1))
+
+    def notify(self, title):
+        notification = Notification.objects.create(recipient=self.student, sender=self.teacher, title=title)
+        increment_unread([self.student.id])
+        return notification
+
+    def poll(self, etag=None):
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(reverse('get_unread_count'), **headers)
+
+    def test_unread_count_is_not_modified_until_it_changes(self):
+        self.client.force_login(self.student)
+        self.notify('One')
+        response = self.poll()
+        self.assertEqual(response.json(), {'unread_count': 1})
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        self.assertEqual(self.poll(etag).status_code, 304)
+
+        self.notify('Two')
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'unread_count': 2})
+        etag = response['ETag']
+
+        # Reading a class notification changes only the class count
+        Notification.create_notifications_for_class(self.classroom, self.teacher, 'announcement', 'Class', '')
+        response = self.poll(etag)
+        self.assertEqual(response.json(), {'unread_count': 3})
+        etag = response['ETag']
+        self.client.get(
+            reverse('mark_class_notification_read', args=[ClassNotification.objects.get().id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        response = self.poll(etag)
+        self.assertEqual(response.json(), {'unread_count': 2})
+
+    def test_stream_is_not_served_under_wsgi(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 204)
+
+    @mock.patch('notification.live.CHECK_SECONDS', 0.01)
+    async def test_stream_sends_the_count_then_new_notifications(self):
+        await self.async_client.aforce_login(self.student)
+        await sync_to_async(self.notify)('One')
+        response = await self.async_client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        try:
+            first = (await asyncio.wait_for(anext(stream), 5)).decode()
+            self.assertTrue(first.startswith(f'retry: {live.RECONNECT_MILLISECONDS}\n'))
+            self.assertIn('event: unread\ndata: {"count": 1}', first)
+
+            notification = await sync_to_async(self.notify)('Two')
+            events = (await asyncio.wait_for(anext(stream), 5)).decode()
+            self.assertIn(f'event: notification\ndata: {{"id": {notification.id}', events)
+            self.assertTrue(events.endswith('event: unread\ndata: {"count": 2}\n\n'))
+        finally:
+            await stream.aclose()
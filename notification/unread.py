@@ -0,0 +1,119 @@
+"""Per-user unread notification counts, served from the cache."""
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .class_events import class_unread_count
+from .models import Notification, UnreadNotificationCount
+from .pubsub import cache_is_shared, publish_changes
+
+UNREAD_CACHE_TIMEOUT = 60 * 60
+# A count not checked against the notifications for this long is recounted
+# the next time it is read from the database
+RECONCILE_AFTER = timedelta(hours=24)
+RECONCILE_BATCH_SIZE = 1000
+
+
+def _cache_key(user_id):
+    return f'notification:unread:{user_id}'
+
+
+def invalidate_unread_count(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids if user_id])
+    publish_changes(user_ids)
+
+
+def unread_count(user):
+    """
+    Unread notifications of a user, both their own and those of their large
+    classes (see notification.class_events). No query while cached.
+    """
+    if not user.is_authenticated:
+        return 0
+    return personal_unread_count(user) + class_unread_count(user)
+
+
+def personal_unread_count(user):
+    """
+    Unread Notification rows of a user: one primary key lookup when not
+    cached. Only a shared cache is used, since the fan-out worker changes
+    counts from another process.
+    """
+    shared = cache_is_shared()
+    key = _cache_key(user.pk)
+    count = cache.get(key) if shared else None
+    if count is not None:
+        return count
+
+    row = UnreadNotificationCount.objects.filter(user_id=user.pk).values_list('unread', 'reconciled_at').first()
+    if row is None or row[1] is None or row[1] < timezone.now() - RECONCILE_AFTER:
+        count = reconcile_unread_counts([user.pk])[user.pk]
+    else:
+        count = row[0]
+        if shared:
+            cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def increment_unread(user_ids):
+    """Count one new unread notification for each user id (repeat ids for more)."""
+    counts = {}
+    for user_id in user_ids:
+        counts[user_id] = counts.get(user_id, 0) + 1
+    if not counts:
+        return
+
+    UnreadNotificationCount.objects.bulk_create(
+        [UnreadNotificationCount(user_id=user_id) for user_id in counts], ignore_conflicts=True
+    )
+    by_amount = {}
+    for user_id, n in counts.items():
+        by_amount.setdefault(n, []).append(user_id)
+    for n, ids in by_amount.items():
+        UnreadNotificationCount.objects.filter(user_id__in=ids).update(unread=F('unread') + n)
+    invalidate_unread_count(*counts)
+
+
+def decrement_unread(user_id, n=1):
+    """Count ``n`` notifications of a user as read."""
+    if n:
+        UnreadNotificationCount.objects.filter(user_id=user_id).update(unread=Greatest(F('unread') - n, Value(0)))
+        invalidate_unread_count(user_id)
+
+
+def reconcile_unread_counts(user_ids=None):
+    """
+    Recount the unread notifications of the given users (every user with a
+    stored count or an unread notification by default), store and cache the
+    counts. Returns the counts by user id.
+    """
+    if user_ids is None:
+        user_ids = set(UnreadNotificationCount.objects.values_list('user_id', flat=True)) | set(
+            Notification.objects.filter(read=False).values_list('recipient_id', flat=True).distinct()
+        )
+    user_ids = sorted(set(user_ids))
+
+    counts = {}
+    for start in range(0, len(user_ids), RECONCILE_BATCH_SIZE):
+        batch = user_ids[start:start + RECONCILE_BATCH_SIZE]
+        batch_counts = dict.fromkeys(batch, 0)
+        batch_counts.update(
+            Notification.objects.filter(recipient_id__in=batch, read=False)
+            .values('recipient_id').annotate(n=Count('id')).values_list('recipient_id', 'n')
+        )
+        stored = dict(UnreadNotificationCount.objects.filter(user_id__in=batch).values_list('user_id', 'unread'))
+        now = timezone.now()
+        UnreadNotificationCount.objects.bulk_create(
+            [
+                UnreadNotificationCount(user_id=user_id, unread=n, reconciled_at=now)
+                for user_id, n in batch_counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['unread', 'reconciled_at'],
+        )
+        cache.set_many({_cache_key(user_id): n for user_id, n in batch_counts.items()}, UNREAD_CACHE_TIMEOUT)
+        publish_changes([user_id for user_id, n in batch_counts.items() if stored.get(user_id, 0) != n])
+        counts.update(batch_counts)
+    return counts
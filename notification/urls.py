@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.notification_list, name='notification_list'),
     path('mark-read/<int:notification_id>/', views.mark_as_read, name='mark_as_read'),
+    path('mark-read/class/<int:notification_id>/', views.mark_class_notification_read, name='mark_class_notification_read'),
     path('mark-all-read/', views.mark_all_as_read, name='mark_all_as_read'),
     path('unread-count/', views.get_unread_count, name='get_unread_count'),
+    path('stream/', views.notification_stream, name='notification_stream'),
 ]
\ No newline at end of file
@@ -1,18 +1,53 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.contrib import messages
+from classes.scope import get_classroom_scope
+from .class_events import read_class_notification, read_class_notifications, visible_class_notifications
+from .inbox import READ_STATES, inbox_page
+from .live import event_stream
 from .models import Notification
+from .pubsub import notification_etag
+from .unread import decrement_unread, unread_count
 
 @login_required
 def notification_list(request):
-    """Display all notifications for the current user"""
-    notifications = Notification.objects.filter(recipient=request.user)
-    unread_count = notifications.filter(read=False).count()
+    """Display a page of the current user's notifications, with those of large classes merged in"""
+    notification_type = request.GET.get('type', '')
+    if notification_type not in dict(Notification.NOTIFICATION_TYPES):
+        notification_type = ''
+    classroom = request.GET.get('classroom', '')
+    classroom = int(classroom) if classroom.isdigit() else None
+    read_state = request.GET.get('state', '')
+    if read_state not in READ_STATES:
+        read_state = ''
+
+    notifications, next_cursor = inbox_page(
+        request.user,
+        cursor=request.GET.get('before'),
+        notification_type=notification_type,
+        classroom_id=classroom,
+        read_state=read_state,
+    )
+
+    # Filters carried over to the next page
+    filters = request.GET.copy()
+    filters.pop('before', None)
     
     context = {
         'notifications': notifications,
-        'unread_count': unread_count,
+        'unread_count': unread_count(request.user),
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
+        'filter_query': filters.urlencode(),
+        'notification_types': Notification.NOTIFICATION_TYPES,
+        'classrooms': get_classroom_scope(request.user).classrooms().order_by('name').only('id', 'name'),
+        'selected_type': notification_type,
+        'selected_classroom': classroom,
+        'selected_state': read_state,
     }
     return render(request, 'notification/notification_list.html', context)
 
@@ -20,8 +55,23 @@ def notification_list(request):
 def mark_as_read(request, notification_id):
     """Mark a single notification as read"""
     notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-    notification.read = True
-    notification.save()
+    # Only the request that flips the flag counts it as read
+    if Notification.objects.filter(id=notification.id, read=False).update(read=True):
+        decrement_unread(request.user.id)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': True})
+    
+    messages.success(request, 'Notification marked as read.')
+    return redirect('notification_list')
+
+@login_required
+def mark_class_notification_read(request, notification_id):
+    """Mark a single class notification as read for the current user"""
+    notification = get_object_or_404(
+        visible_class_notifications(request.user), id=notification_id
+    )
+    read_class_notification(request.user, notification)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -37,6 +87,8 @@ def mark_all_as_read(request):
             recipient=request.user, 
             read=False
         ).update(read=True)
+        decrement_unread(request.user.id, updated_count)
+        updated_count += read_class_notifications(request.user)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': True, 'count': updated_count})
@@ -45,11 +97,29 @@ def mark_all_as_read(request):
     
     return redirect('notification_list')
 
+def _unread_count_etag(request):
+    return notification_etag(request.user)
+
 @login_required
+@condition(etag_func=_unread_count_etag)
 def get_unread_count(request):
-    """AJAX endpoint to get unread notification count"""
+    """AJAX endpoint to get unread notification count, answered with 304 while it is unchanged"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        count = Notification.objects.filter(recipient=request.user, read=False).count()
-        return JsonResponse({'unread_count': count})
+        response = JsonResponse({'unread_count': unread_count(request.user)})
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
+
+@login_required
+async def notification_stream(request):
+    """Server-sent events with the unread count and new notifications (ASGI only)"""
+    if not isinstance(request, ASGIRequest):
+        # A stream would hold a WSGI worker for good; 204 tells the browser
+        # not to reconnect, and it polls get_unread_count instead
+        return HttpResponse(status=204)
+    
+    response = StreamingHttpResponse(event_stream(await request.auser()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -224,6 +224,65 @@ function copyToClipboard(text) {
     }
 }
 
+// Live unread notification count
+const NOTIFICATION_POLL_INTERVAL = 60000;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function setUnreadCount(count) {
+    const badge = document.getElementById('notification-badge');
+    if (!badge) return;
+    badge.textContent = count;
+    badge.classList.toggle('d-none', count === 0);
+}
+
+function pollUnreadCount(url) {
+    // The browser revalidates with If-None-Match and gets a 304 while the
+    // count is unchanged
+    fetch(url, {
+        cache: 'no-cache',
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+    .then(response => response.ok ? response.json() : null)
+    .then(data => {
+        if (data && data.unread_count !== undefined) setUnreadCount(data.unread_count);
+    })
+    .catch(() => {});
+}
+
+function startNotificationUpdates() {
+    const link = document.getElementById('notification-link');
+    if (!link) return;
+    
+    let pollTimer = null;
+    const startPolling = () => {
+        if (pollTimer === null) {
+            pollTimer = setInterval(() => pollUnreadCount(link.dataset.unreadCountUrl), NOTIFICATION_POLL_INTERVAL);
+        }
+    };
+    
+    if (!link.dataset.streamUrl || typeof EventSource === 'undefined') {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource(link.dataset.streamUrl);
+    source.addEventListener('unread', event => setUnreadCount(JSON.parse(event.data).count));
+    source.addEventListener('notification', event => {
+        const notification = JSON.parse(event.data);
+        showNotification(`<strong>${escapeHtml(notification.title)}</strong>`, 'info');
+        document.dispatchEvent(new CustomEvent('lms:notification', { detail: notification }));
+    });
+    source.addEventListener('error', () => {
+        // The browser retries on its own unless the stream was refused
+        if (source.readyState === EventSource.CLOSED) startPolling();
+    });
+}
+
 // Initialize common functionality
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize tooltips
@@ -240,6 +299,8 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    startNotificationUpdates();
+    
     // Add smooth scrolling to anchor links
     document.querySelectorAll('a[href^="#"]').forEach(anchor => {
         anchor.addEventListener('click', function (e) {
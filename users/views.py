@@ -8,6 +8,7 @@ from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import update_session_auth_hash
 from classes.models import ClassRoom, ClassMembership
+from classes.scope import classroom_scope
 
 # handles user login part 
 
@@ -30,7 +31,7 @@ def dashboard(request):
         invite_code = request.POST.get('invite_code')
         try:
             classroom = ClassRoom.objects.get(invite_code=invite_code)
-            if classroom.owner == request.user or ClassMembership.objects.filter(user=request.user, classroom=classroom).exists():
+            if classroom_scope(request).has_access(classroom):
                 messages.info(request, "You are already a member of this class.")
             else:
                 ClassMembership.objects.create(user=request.user, classroom=classroom)
@@ -38,10 +39,7 @@ def dashboard(request):
         except ClassRoom.DoesNotExist:
             messages.error(request, "Invalid class code.")
         return redirect('dashboard')
-    owned_classes = ClassRoom.objects.filter(owner=request.user)
-    memberships = ClassMembership.objects.filter(user=request.user)
-    joined_classes = ClassRoom.objects.filter(id__in=memberships.values_list('classroom_id', flat=True))
-    all_classes = (owned_classes | joined_classes).distinct()
+    all_classes = classroom_scope(request).classrooms()
     return render(request, 'base/dashboard.html', {'all_classes': all_classes})
 
 #handles the registration.